@@ -0,0 +1,15 @@
+from flask import Response
+from security.analyzers.results import encode_json
+
+def json_response(data, status=200):
+    """
+    JSON response for data that may hold analysis results
+
+    Args:
+        data: Data to serialize
+        status (int): HTTP status code
+
+    Returns:
+        Response: Compact JSON response
+    """
+    return Response(encode_json(data), status=status, mimetype="application/json")
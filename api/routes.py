@@ -0,0 +1,154 @@
+import os
+import json
+import logging
+from flask import Blueprint, Response, jsonify, current_app, request
+from core.stats_timeseries import StatsTimeSeries, RESOLUTIONS
+from api.models import json_response
+from utils.pac_file import PAC_CONTENT_TYPE
+from utils.system_utils import get_rss_bytes
+
+logger = logging.getLogger(__name__)
+
+api_bp = Blueprint("api", __name__)
+
+# Served at the root, where browsers and OS proxy settings expect it
+pac_bp = Blueprint("pac", __name__)
+
+def _read_json(path, default):
+    """Read a JSON file written by the proxy process"""
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except Exception as e:
+        logger.error(f"Failed to read {path}: {str(e)}")
+        return default
+
+@api_bp.route("/health")
+def health():
+    """Readiness probe"""
+    return jsonify({"status": "ok"})
+
+def _proxy_addon():
+    """The proxy addon when it runs in this process, else None"""
+    proxy = current_app.config.get("EMBEDDED_PROXY")
+    return proxy.addon if proxy else None
+
+@api_bp.route("/stats")
+def stats():
+    """Proxy statistics"""
+    addon = _proxy_addon()
+    if addon:
+        stats = dict(addon.stats)
+        stats["rss_bytes"] = get_rss_bytes()
+        stats["tiers"] = addon.cascade.report()
+        stats["sessions"] = len(addon.sessions)
+        if addon.verdict_cache:
+            stats["verdict_cache"] = addon.verdict_cache.report()
+        return jsonify(stats)
+    stats_dir = current_app.config["STATS_DIR"]
+    return jsonify(_read_json(os.path.join(stats_dir, "promptshield_stats.json"), {}))
+
+@api_bp.route("/detections")
+def detections():
+    """Most recent detections"""
+    addon = _proxy_addon()
+    if addon:
+        return json_response(list(addon.recent_detections))
+    stats_dir = current_app.config["STATS_DIR"]
+    return jsonify(_read_json(os.path.join(stats_dir, "promptshield_detections.json"), []))
+
+@api_bp.route("/timeseries")
+def timeseries():
+    """Request, detection and latency counters over time"""
+    resolution = request.args.get("resolution", "second")
+    if resolution not in (name for name, _, _ in RESOLUTIONS):
+        return jsonify({"error": f"Unknown resolution: {resolution}"}), 400
+    # Unparseable timestamps are ignored like missing ones
+    since = request.args.get("since", type=float)
+    until = request.args.get("until", type=float)
+    
+    addon = _proxy_addon()
+    if addon:
+        series = addon.timeseries
+    else:
+        path = os.path.join(current_app.config["STATS_DIR"], "promptshield_timeseries.json")
+        try:
+            series = StatsTimeSeries.load(path)
+        except FileNotFoundError:
+            series = StatsTimeSeries()
+        except Exception as e:
+            logger.error(f"Failed to read {path}: {str(e)}")
+            series = StatsTimeSeries()
+    return jsonify(series.query(resolution, since, until))
+
+@api_bp.route("/profile", methods=["GET"])
+def profile_status():
+    """Running profiling sessions and the latest profile"""
+    addon = _proxy_addon()
+    if addon:
+        return jsonify(addon.profiler.status())
+    stats = _read_json(os.path.join(current_app.config["STATS_DIR"], "promptshield_stats.json"), {})
+    return jsonify(stats.get("profiler") or {})
+
+@api_bp.route("/profile", methods=["POST"])
+def start_profile():
+    """
+    Start profiling the proxy
+
+    Body: {"mode": "sample", "seconds": N, "interval_ms": 5} samples every
+    thread for N seconds, {"mode": "requests", "every": K, "count": M}
+    traces the analysis of one request in every K until M were traced.
+    Profiles are written in flame graph folded format to data/profiles.
+    """
+    params = request.get_json(silent=True) or {}
+    mode = params.get("mode", "sample")
+    if mode not in ("sample", "requests"):
+        return jsonify({"error": f"Unknown profiling mode: {mode}"}), 400
+    try:
+        if mode == "sample":
+            params = {
+                "mode": mode,
+                "seconds": min(float(params.get("seconds", 10)), 300),
+                "interval_ms": max(float(params.get("interval_ms", 5)), 1),
+            }
+        else:
+            params = {
+                "mode": mode,
+                "every": max(int(params.get("every", 10)), 1),
+                "count": max(int(params.get("count", 100)), 1),
+            }
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid profiling parameters"}), 400
+
+    addon = _proxy_addon()
+    if addon:
+        path = addon.start_profiling(params)
+        if path is None:
+            return jsonify({"error": "A sampling session is already running"}), 409
+        return jsonify({"status": "started", "profile": path})
+
+    # The proxy runs in another process and picks the request up within a second
+    path = os.path.join(current_app.config["STATS_DIR"], "promptshield_profile_request.json")
+    try:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(params, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.error(f"Failed to request profiling: {str(e)}")
+        return jsonify({"error": "Failed to reach the proxy"}), 500
+    return jsonify({"status": "requested"}), 202
+
+@pac_bp.route("/proxy.pac")
+def proxy_pac():
+    """Proxy auto-config file routing only AI domains through the proxy"""
+    try:
+        with open(current_app.config["PAC_FILE"], "r") as f:
+            content = f.read()
+    except OSError:
+        return Response("PAC file not available\n", status=404, mimetype="text/plain")
+    response = Response(content, mimetype=PAC_CONTENT_TYPE)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
@@ -0,0 +1,103 @@
+import os
+import sys
+import argparse
+import signal
+import logging
+import threading
+
+# The service starts this file by path, make the project packages importable
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from flask import Flask
+from flask_cors import CORS
+from api.routes import api_bp, pac_bp
+
+logger = logging.getLogger(__name__)
+
+def create_app(stats_dir="data/stats", embedded_proxy=None, pac_file="data/run/promptshield.pac"):
+    """
+    Create the control panel API application
+
+    Args:
+        stats_dir (str): Directory the proxy writes its statistics to
+        embedded_proxy (EmbeddedProxy, optional): In-process proxy whose
+            addon state is served directly instead of from stats files
+        pac_file (str): Proxy auto-config file to serve at /proxy.pac
+
+    Returns:
+        Flask: The application
+    """
+    app = Flask(__name__)
+    CORS(app)
+    app.config["STATS_DIR"] = stats_dir
+    app.config["EMBEDDED_PROXY"] = embedded_proxy
+    app.config["PAC_FILE"] = pac_file
+    app.register_blueprint(api_bp, url_prefix="/api")
+    app.register_blueprint(pac_bp)
+    return app
+
+class ApiServerThread(threading.Thread):
+    """Serve the API from a thread of the current process"""
+
+    def __init__(self, host, port, app):
+        """
+        Args:
+            host (str): Host to bind to
+            port (int): Port to listen on
+            app (Flask): Application to serve
+        """
+        super().__init__(name="promptshield-api", daemon=True)
+        from werkzeug.serving import make_server
+        self.server = make_server(host, port, app, threaded=True)
+
+    def run(self):
+        self.server.serve_forever()
+
+    def shutdown(self):
+        """Stop serving and close the socket"""
+        self.server.shutdown()
+        self.server.server_close()
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="PromptShield API server")
+    parser.add_argument("--host", default="127.0.0.1", help="Host to bind to")
+    parser.add_argument("--port", type=int, default=3001, help="Port to listen on")
+    parser.add_argument("--stats-dir", default="data/stats", help="Proxy statistics directory")
+    parser.add_argument("--pac-file", default="data/run/promptshield.pac", help="PAC file to serve")
+    parser.add_argument("--listen-fd", type=int, help="Inherited listening socket to serve")
+    parser.add_argument("--ready-file", help="File to create once the server is serving")
+    return parser.parse_args()
+
+def main():
+    """Run the API server"""
+    args = parse_args()
+    app = create_app(stats_dir=args.stats_dir, pac_file=args.pac_file)
+
+    from werkzeug.serving import make_server
+    server = make_server(args.host, args.port, app, threaded=True, fd=args.listen_fd)
+
+    # Let in-flight requests finish when stopping, a replacement server may
+    # already be accepting on the same socket
+    server.daemon_threads = False
+    server.block_on_close = True
+    signal.signal(
+        signal.SIGTERM,
+        lambda sig, frame: threading.Thread(target=server.shutdown).start()
+    )
+
+    if args.ready_file:
+        with open(args.ready_file, "w") as f:
+            f.write(str(os.getpid()))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -6,15 +6,185 @@ logger = logging.getLogger(__name__)
 
 DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'default_config.json')
 
-def load_config(config_path=None):
+# AI domains to intercept when the configuration does not list any
+DEFAULT_AI_DOMAINS = [
+    "claude.ai",
+    "chat.openai.com",
+    "api.openai.com",
+    "api.anthropic.com",
+    "bard.google.com"
+]
+
+class ConfigError(ValueError):
+    """Raised when a configuration does not validate"""
+
+class Setting:
+    """Type and constraints of one configuration key"""
+
+    __slots__ = ("type", "choices", "minimum", "maximum", "live")
+
+    def __init__(self, type_, choices=None, minimum=None, maximum=None, live=False):
+        """
+        Args:
+            type_ (type): Expected type, int is accepted for float
+            choices (tuple, optional): Allowed values
+            minimum (float, optional): Smallest allowed value
+            maximum (float, optional): Largest allowed value
+            live (bool): Whether running proxy workers can apply a new
+                value, otherwise changing it needs new workers
+        """
+        self.type = type_
+        self.choices = choices
+        self.minimum = minimum
+        self.maximum = maximum
+        self.live = live
+
+    def check(self, key, value):
+        """
+        Validate and normalize a value
+
+        Returns:
+            tuple: (normalized value, error message or None)
+        """
+        # bool is an int subclass, it is only accepted where bool is expected
+        if isinstance(value, bool) and self.type is not bool:
+            return value, f"{key} must be of type {self.type.__name__}, got a boolean"
+        if self.type is float and isinstance(value, int):
+            value = float(value)
+        if not isinstance(value, self.type):
+            return value, f"{key} must be of type {self.type.__name__}, got {type(value).__name__}"
+        if self.choices is not None and value not in self.choices:
+            return value, f"{key} must be one of {', '.join(map(str, self.choices))}"
+        if self.minimum is not None and value < self.minimum:
+            return value, f"{key} must be at least {self.minimum}"
+        if self.maximum is not None and value > self.maximum:
+            return value, f"{key} must be at most {self.maximum}"
+        return value, None
+
+# Known configuration keys. Live settings are pushed to running proxy
+# workers, changing any other one hands off to new workers.
+SETTINGS = {
+    "proxy_host": Setting(str),
+    "proxy_port": Setting(int, minimum=1, maximum=65535),
+    "api_port": Setting(int, minimum=1, maximum=65535),
+    "proxy_mode": Setting(str, choices=("subprocess", "embedded")),
+    "system_proxy_mode": Setting(str),
+    "pac_file": Setting(str),
+    "intercepted_domains": Setting(list, live=True),
+    "block_mode": Setting(str, choices=("alert", "block"), live=True),
+    "block_min_confidence": Setting(float, minimum=0.0, maximum=1.0, live=True),
+    "secret_detection": Setting(bool, live=True),
+    "similarity_corpus": Setting(str),
+    "similarity_index": Setting(str),
+    "similarity_threshold": Setting(float, minimum=0.0, maximum=1.0, live=True),
+    "ml_classifier": Setting(bool),
+    "ml_training_corpus": Setting(str),
+    "ml_model": Setting(str),
+    "ml_threshold": Setting(float, minimum=0.0, maximum=1.0, live=True),
+    "ml_clean_below": Setting(float, minimum=0.0, maximum=1.0, live=True),
+    "pattern_decisive_confidence": Setting(float, minimum=0.0, maximum=1.0, live=True),
+    "byte_prefilter": Setting(str, choices=("auto", "on", "off"), live=True),
+    "cascade_budgets_ms": Setting(dict, live=True),
+    "session_max": Setting(int, minimum=1),
+    "session_ttl": Setting(float, minimum=0.0),
+    "session_risk_half_life": Setting(float, minimum=0.0),
+    "session_risk_threshold": Setting(float, minimum=0.0, live=True),
+    "session_max_turns": Setting(int, minimum=0),
+    "websocket_inspection": Setting(bool, live=True),
+    "websocket_carry_chars": Setting(int, minimum=0, live=True),
+    "verdict_cache": Setting(str, choices=("sqlite", "memory", "none")),
+    "verdict_cache_path": Setting(str),
+    "verdict_cache_max_entries": Setting(int, minimum=1),
+    "verdict_cache_ttl": Setting(float, minimum=0.0),
+    "max_request_bytes": Setting(int, minimum=1, live=True),
+    "max_decompressed_bytes": Setting(int, minimum=1, live=True),
+    "max_compression_ratio": Setting(float, minimum=1.0, live=True),
+    "analysis_window_bytes": Setting(int, minimum=1, live=True),
+    "max_pending_analyses": Setting(int, minimum=1, live=True),
+    "analysis_workers": Setting(int, minimum=1),
+    "overload_policy": Setting(str, choices=("fail_open", "fail_closed"), live=True),
+    "cert_dir": Setting(str),
+    "log_dir": Setting(str),
+    "startup_timeout": Setting(float, minimum=0.0),
+    "health_check_interval": Setting(float, minimum=0.1),
+    "health_check_failures": Setting(int, minimum=1),
+    "restart_backoff_initial": Setting(float, minimum=0.0),
+    "restart_backoff_max": Setting(float, minimum=0.0),
+    "drain_timeout": Setting(float, minimum=0.0),
+}
+
+def validate_config(config):
+    """
+    Check a configuration against SETTINGS
+
+    Unknown keys are kept as they are.
+
+    Args:
+        config (dict): Configuration dictionary
+
+    Returns:
+        dict: A copy with numbers normalized to their setting's type
+
+    Raises:
+        ConfigError: Listing every invalid setting
+    """
+    if not isinstance(config, dict):
+        raise ConfigError("Configuration must be a JSON object")
+
+    validated = dict(config)
+    errors = []
+    for key, setting in SETTINGS.items():
+        if key not in config:
+            continue
+        value, error = setting.check(key, config[key])
+        if error:
+            errors.append(error)
+        validated[key] = value
+
+    domains = validated.get("intercepted_domains")
+    if isinstance(domains, list) and not all(isinstance(domain, str) and domain for domain in domains):
+        errors.append("intercepted_domains must be a list of domain names")
+    budgets = validated.get("cascade_budgets_ms")
+    if isinstance(budgets, dict) and not all(
+            isinstance(budget, (int, float)) and not isinstance(budget, bool) and budget > 0
+            for budget in budgets.values()):
+        errors.append("cascade_budgets_ms must map tier names to positive numbers")
+
+    if errors:
+        raise ConfigError("; ".join(errors))
+    return validated
+
+def restart_required(old, new):
+    """
+    Settings whose change running proxy workers cannot apply
+
+    Args:
+        old (dict): Configuration the workers run with
+        new (dict): New configuration
+
+    Returns:
+        list: Names of the changed settings that need new workers
+    """
+    return sorted(
+        key for key, setting in SETTINGS.items()
+        if not setting.live and old.get(key) != new.get(key)
+    )
+
+def load_config(config_path=None, strict=False):
     """
     Load configuration from file
 
     Args:
         config_path (str, optional): Path to configuration file
+        strict (bool): Raise instead of falling back to the defaults when
+            the user configuration cannot be read
 
     Returns:
         dict: Configuration dictionary
+
+    Raises:
+        ConfigError: If strict and the user configuration is unreadable
+            or not valid JSON
     """
 
     # Load default configuration
@@ -32,6 +202,8 @@ def load_config(config_path=None):
                 user_config = json.load(f)
                 config.update(user_config)
         except Exception as e:
+            if strict:
+                raise ConfigError(f"Failed to load {config_path}: {str(e)}")
             logger.error(f"Failed to load user configuration: {str(e)}")
 
     return config
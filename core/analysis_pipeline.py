@@ -0,0 +1,133 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Overload policies
+FAIL_OPEN = "fail_open"
+FAIL_CLOSED = "fail_closed"
+
+class PipelineOverloaded(Exception):
+    """Raised when the analysis queue is full"""
+
+class AnalysisPipeline:
+    """Bounded analysis stage between the proxy hooks and the analyzers"""
+
+    def __init__(self, config=None, stats=None):
+        """
+        Initialize the pipeline
+
+        Args:
+            config (dict, optional): Configuration dictionary
+            stats (dict, optional): Statistics dictionary to count shed
+                requests in
+        """
+        self.stats = stats if stats is not None else {}
+        self.stats.setdefault("shed_requests", 0)
+
+        config = config or {}
+        self.executor = ThreadPoolExecutor(
+            max_workers=config.get("analysis_workers", 2),
+            thread_name_prefix="promptshield-analysis"
+        )
+        self.pending = 0
+        self.update(config)
+
+    def update(self, config):
+        """
+        Apply budget and overload settings from the configuration
+
+        Args:
+            config (dict): Configuration dictionary
+        """
+        self.max_request_bytes = config.get("max_request_bytes", 1024 * 1024)
+        self.window_bytes = config.get("analysis_window_bytes", 16 * 1024)
+        self.max_pending = config.get("max_pending_analyses", 32)
+        self.overload_policy = config.get("overload_policy", FAIL_OPEN)
+        if self.overload_policy not in (FAIL_OPEN, FAIL_CLOSED):
+            logger.warning(f"Unknown overload policy {self.overload_policy}, using {FAIL_OPEN}")
+            self.overload_policy = FAIL_OPEN
+
+    @property
+    def fail_closed(self):
+        """Whether requests are blocked when they cannot be analyzed"""
+        return self.overload_policy == FAIL_CLOSED
+
+    def is_oversized(self, content):
+        """Whether a request body is too large to be decoded in full"""
+        return len(content) > self.max_request_bytes
+
+    def clip_prompt(self, prompt):
+        """
+        Reduce a prompt to its head and tail windows if it exceeds the budget
+
+        Windows are measured in UTF-8 bytes, a character cut at a window
+        edge is dropped.
+
+        Args:
+            prompt (str): Prompt text
+
+        Returns:
+            tuple: (text to analyze, whether it was truncated)
+        """
+        window = self.window_bytes
+        if prompt.isascii():
+            if len(prompt) <= 2 * window:
+                return prompt, False
+            return prompt[:window] + "\n" + prompt[-window:], True
+
+        # A character takes at most 4 bytes
+        if len(prompt) * 4 <= 2 * window:
+            return prompt, False
+        encoded = prompt.encode("utf-8", errors="surrogatepass")
+        if len(encoded) <= 2 * window:
+            return prompt, False
+        head = encoded[:window].decode("utf-8", errors="ignore")
+        tail = encoded[-window:].decode("utf-8", errors="ignore")
+        return head + "\n" + tail, True
+
+    def clip_body(self, content):
+        """
+        Reduce an oversized raw body to text from its head and tail windows
+
+        Args:
+            content (bytes): Raw request body
+
+        Returns:
+            str: Text to analyze
+        """
+        window = self.window_bytes
+        head = content[:window].decode("utf-8", errors="ignore")
+        tail = content[-window:].decode("utf-8", errors="ignore")
+        return head + "\n" + tail
+
+    async def run(self, func, *args):
+        """
+        Run an analysis function on the worker pool
+
+        Args:
+            func (callable): Analysis function
+            *args: Arguments for the function
+
+        Returns:
+            Result of the function
+
+        Raises:
+            PipelineOverloaded: If too many analyses are already pending
+        """
+        # Hooks run on the event loop thread, so no lock is needed here
+        if self.pending >= self.max_pending:
+            self.stats["shed_requests"] += 1
+            raise PipelineOverloaded(f"{self.pending} analyses pending")
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        """Stop the worker pool"""
+        self.executor.shutdown(wait=False)
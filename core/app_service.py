@@ -1,21 +1,32 @@
 import os
 import sys
 import logging
-import subprocess
 import threading
 import time
 import json
-import signal
-import platform
+from concurrent.futures import ThreadPoolExecutor
 from utils.cert_manager import CertificateManager
 from utils.proxy_config import SystemProxyConfig
+from utils.pac_file import write_pac
+from config.settings import DEFAULT_AI_DOMAINS, ConfigError, load_config, validate_config, restart_required
+from core.control_channel import CONFIG
+from core.supervisor import WorkerSupervisor
+from utils.system_utils import probe_http
+from utils.profiling import startup_profiler
 
 logger = logging.getLogger(__name__)
 
+# Seconds to wait for a started process to become ready
+STARTUP_TIMEOUT = 10
+
+# Settings of the listening sockets, new workers inherit the open ones
+LISTENER_SETTINGS = ("proxy_host", "proxy_port", "api_port")
+
 class AISecurityProxyService:
     """Main application service that manages the proxy and related components"""
     
-    def __init__(self, proxy_host="127.0.0.1", proxy_port=8080, api_port=3001, config=None):
+    def __init__(self, proxy_host="127.0.0.1", proxy_port=8080, api_port=3001, config=None,
+                 config_path=None):
         """
         Initialize the service
         
@@ -24,20 +35,36 @@ class AISecurityProxyService:
             proxy_port (int): Port for the proxy server
             api_port (int): Port for the API server
             config (dict, optional): Configuration dictionary
+            config_path (str, optional): Path to the user configuration file,
+                passed on to the proxy process
         """
         self.proxy_host = proxy_host
         self.proxy_port = proxy_port
         self.api_port = api_port
         self.config = config or {}
+        self.config_path = config_path
         
         # Initialize components
         cert_dir = self.config.get("cert_dir", "data/certs")
         self.cert_manager = CertificateManager(cert_dir=cert_dir)
-        self.proxy_config = SystemProxyConfig(proxy_host, proxy_port)
+        
+        # In "pac" mode the system only sends AI domains to the proxy, using
+        # an auto-config file served by the API server
+        self.pac_file = self.config.get("pac_file", "data/run/promptshield.pac")
+        pac_url = None
+        if self.config.get("system_proxy_mode", "pac") == "pac":
+            pac_url = f"http://{proxy_host}:{api_port}/proxy.pac"
+        self.proxy_config = SystemProxyConfig(proxy_host, proxy_port, pac_url=pac_url)
+        
+        # "subprocess" runs mitmproxy and the API server as child processes,
+        # "embedded" runs both in this process and shares the proxy addon
+        self.proxy_mode = self.config.get("proxy_mode", "subprocess")
         
         # Process handles
-        self.proxy_process = None
-        self.api_server_process = None
+        self.proxy_supervisor = None
+        self.api_supervisor = None
+        self.embedded_proxy = None
+        self.api_server_thread = None
         self.running = False
     
     def start(self):
@@ -46,72 +73,111 @@ class AISecurityProxyService:
             logger.warning("Service is already running")
             return False
         
+        started = time.monotonic()
+        pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="promptshield-start")
         try:
-            # Step 1: Ensure certificates are generated
-            logger.info("Generating certificates...")
-            if not self.cert_manager.generate_certificates():
-                logger.error("Failed to generate certificates")
-                return False
+            # Reading the current system proxy settings shells out on macOS
+            # and Linux, overlap it with the rest of startup
+            pool.submit(self._profiled, "capture proxy settings", self.proxy_config.capture_settings)
             
-            # Step 2: Install certificate to system trust store
-            logger.info("Installing certificate...")
-            if not self.cert_manager.install_certificate():
-                logger.warning("Failed to install certificate. User may need to install manually.")
+            if self.proxy_mode == "embedded":
+                # Built up front so the API server can share its addon
+                with startup_profiler.phase("load proxy addon"):
+                    from core.embedded_proxy import EmbeddedProxy
+                    self.embedded_proxy = EmbeddedProxy(self.proxy_host, self.proxy_port, self.config)
             
-            # Step 3: Configure system proxy
-            logger.info("Configuring system proxy...")
-            if not self.proxy_config.enable_proxy():
-                logger.warning("Failed to configure system proxy. User may need to configure manually.")
+            # The API server only needs the PAC file it serves
+            with startup_profiler.phase("write PAC file"):
+                self.write_pac()
+            logger.info("Starting API server...")
+            api_started = pool.submit(self._profiled, "start API server", self._start_api_server)
             
-            # Step 4: Start the proxy
+            # Certificates must exist before the proxy starts, otherwise
+            # mitmproxy would create its own CA concurrently
+            install_done = None
+            with startup_profiler.phase("check certificate"):
+                cert_current = self.cert_manager.is_current()
+            if cert_current:
+                logger.info("Certificate already installed, skipping generation")
+            else:
+                logger.info("Generating certificates...")
+                with startup_profiler.phase("generate certificates"):
+                    generated = self.cert_manager.generate_certificates()
+                if not generated:
+                    logger.error("Failed to generate certificates")
+                    pool.shutdown(wait=True)
+                    self.stop()
+                    return False
+                
+                logger.info("Installing certificate...")
+                install_done = pool.submit(
+                    self._profiled, "install certificate", self.cert_manager.install_certificate
+                )
+            
+            # System proxy settings only point at the proxy once it accepts connections
             logger.info("Starting proxy server...")
-            self._start_proxy_server()
+            proxy_configured = pool.submit(self._start_proxy_and_configure, api_started)
             
-            # Step 5: Start API server for the control panel
-            logger.info("Starting API server...")
-            self._start_api_server()
+            api_started.result()
+            if not proxy_configured.result():
+                logger.warning("Failed to configure system proxy. User may need to configure manually.")
+            if install_done and not install_done.result():
+                logger.warning("Failed to install certificate. User may need to install manually.")
             
             self.running = True
-            logger.info("AI Security Proxy Service started successfully")
+            elapsed = (time.monotonic() - started) * 1000
+            logger.info(f"AI Security Proxy Service started successfully in {elapsed:.0f} ms")
             return True
             
         except Exception as e:
             logger.error(f"Failed to start service: {str(e)}")
+            pool.shutdown(wait=True)
             self.stop()  # Clean up any partial setup
             return False
+        finally:
+            pool.shutdown(wait=False)
+    
+    def _start_proxy_and_configure(self, api_started):
+        """Start the proxy, then point the system proxy settings at it"""
+        with startup_profiler.phase("start proxy server"):
+            self._start_proxy_server()
+        if self.proxy_config.pac_url:
+            # The auto-config file is served by the API server
+            api_started.result()
+        logger.info("Configuring system proxy...")
+        with startup_profiler.phase("configure system proxy"):
+            return self.proxy_config.enable_proxy()
+    
+    def _profiled(self, name, func):
+        """Run a startup step on a pool thread as a named profile phase"""
+        with startup_profiler.phase(name):
+            return func()
     
     def stop(self):
         """Stop the proxy service"""
         logger.info("Stopping AI Security Proxy Service...")
         self.running = False
         
-        # Stop the proxy process
-        if self.proxy_process:
+        # Stop the in-process proxy and API server
+        if self.api_server_thread:
+            logger.info("Stopping embedded API server...")
+            self.api_server_thread.shutdown()
+            self.api_server_thread = None
+        if self.embedded_proxy:
+            logger.info("Stopping embedded proxy server...")
+            self.embedded_proxy.stop()
+            self.embedded_proxy = None
+        
+        # Stop the supervised worker processes
+        if self.proxy_supervisor:
             logger.info("Terminating proxy server...")
-            try:
-                if platform.system() == 'Windows':
-                    self.proxy_process.send_signal(signal.CTRL_C_EVENT)
-                else:
-                    self.proxy_process.terminate()
-                self.proxy_process.wait(timeout=5)
-            except:
-                self.proxy_process.kill()
-            finally:
-                self.proxy_process = None
-        
-        # Stop the API server
-        if self.api_server_process:
+            self.proxy_supervisor.stop()
+            self.proxy_supervisor = None
+        
+        if self.api_supervisor:
             logger.info("Terminating API server...")
-            try:
-                if platform.system() == 'Windows':
-                    self.api_server_process.send_signal(signal.CTRL_C_EVENT)
-                else:
-                    self.api_server_process.terminate()
-                self.api_server_process.wait(timeout=5)
-            except:
-                self.api_server_process.kill()
-            finally:
-                self.api_server_process = None
+            self.api_supervisor.stop()
+            self.api_supervisor = None
         
         # Restore original proxy settings
         logger.info("Restoring system proxy settings...")
@@ -137,69 +203,170 @@ class AISecurityProxyService:
     
     def _start_proxy_server(self):
         """Start the mitmproxy server"""
-        # Create proxy server command
+        if self.embedded_proxy:
+            self.embedded_proxy.start(self.config.get("startup_timeout", STARTUP_TIMEOUT))
+            return
+        
+        self.proxy_supervisor = WorkerSupervisor(
+            "proxy", self.proxy_host, self.proxy_port,
+            self._proxy_worker_command, self._proxy_healthy, self.config, control=True
+        )
+        self.proxy_supervisor.start()
+    
+    def _proxy_worker_command(self, listen_fd, ready_file):
+        """Command line for a proxy worker process"""
         cmd = [
             sys.executable,
-            "-m", "mitmproxy.tools.main",
+            os.path.join(os.path.dirname(__file__), "proxy_worker.py"),
             "--listen-host", self.proxy_host,
             "--listen-port", str(self.proxy_port),
-            "-s", os.path.join(os.path.dirname(__file__), "proxy_server.py")
+            "--ready-file", ready_file,
+            "--drain-timeout", str(self.config.get("drain_timeout", 30)),
+            "--control-stdin"
         ]
-        
-        # Start the proxy as a subprocess
-        self.proxy_process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        
-        # Give it a moment to start
-        time.sleep(1)
-        
-        # Check if process is still running
-        if self.proxy_process.poll() is not None:
-            err = self.proxy_process.stderr.read().decode('utf-8')
-            logger.error(f"Proxy server failed to start: {err}")
-            self.proxy_process = None
-            raise RuntimeError("Failed to start proxy server")
+        if listen_fd is not None:
+            cmd += ["--listen-fd", str(listen_fd)]
+        if self.config_path:
+            cmd += ["--config", os.path.abspath(self.config_path)]
+        return cmd
+    
+    def _proxy_healthy(self):
+        """Any HTTP answer from the proxy shows its event loop is responsive"""
+        return probe_http(f"http://{self.proxy_host}:{self.proxy_port}/") is not None
     
     def _start_api_server(self):
         """Start the API server for the control panel"""
-        # Create API server command
+        if self.embedded_proxy:
+            from api.server import create_app, ApiServerThread
+            app = create_app(embedded_proxy=self.embedded_proxy, pac_file=self.pac_file)
+            self.api_server_thread = ApiServerThread(self.proxy_host, self.api_port, app)
+            self.api_server_thread.start()
+            return
+        
+        self.api_supervisor = WorkerSupervisor(
+            "api", self.proxy_host, self.api_port,
+            self._api_worker_command, self._api_healthy, self.config
+        )
+        self.api_supervisor.start()
+    
+    def _api_worker_command(self, listen_fd, ready_file):
+        """Command line for an API server process"""
         cmd = [
             sys.executable,
             os.path.join(os.path.dirname(os.path.dirname(__file__)), "api", "server.py"),
             "--host", self.proxy_host,
-            "--port", str(self.api_port)
+            "--port", str(self.api_port),
+            "--pac-file", os.path.abspath(self.pac_file),
+            "--ready-file", ready_file
         ]
+        if listen_fd is not None:
+            cmd += ["--listen-fd", str(listen_fd)]
+        return cmd
+    
+    def _api_healthy(self):
+        """The API server is healthy when its health route answers"""
+        return probe_http(f"http://{self.proxy_host}:{self.api_port}/api/health") == 200
+    
+    def write_pac(self, config=None):
+        """
+        Regenerate the PAC file from the configured AI domains
         
-        # Start the API server as a subprocess
-        self.api_server_process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
+        Args:
+            config (dict, optional): Configuration to take the domains
+                from, defaults to the current one
+        
+        Returns:
+            bool: Whether the file changed
+        """
+        config = config if config is not None else self.config
+        domains = config.get("intercepted_domains") or DEFAULT_AI_DOMAINS
+        return write_pac(self.pac_file, domains, self.proxy_host, self.proxy_port)
+    
+    def reload(self):
+        """
+        Reload the configuration file and apply it
+        
+        Settings the proxy can change at runtime are pushed to the running
+        worker. If other settings changed, or the push fails, the worker
+        processes are replaced without dropping connections. Listener
+        settings need a restart of the service, the workers keep serving
+        the sockets they inherited.
+        
+        Returns:
+            bool: Success or failure, False if a setting was not applied
+        """
+        if not self.running:
+            return False
+        try:
+            # A file that does not parse must not fall back to the defaults
+            config = validate_config(load_config(self.config_path, strict=True))
+        except ConfigError as e:
+            logger.error(f"Invalid configuration, keeping the current one: {str(e)}")
+            return False
+        
+        # The listening sockets stay open across reloads, the configuration
+        # keeps describing them until the service restarts
+        listeners = [key for key in LISTENER_SETTINGS if config.get(key) != self.config.get(key)]
+        if listeners:
+            logger.warning(f"Restart the service to apply: {', '.join(listeners)}")
+            for key in listeners:
+                if key in self.config:
+                    config[key] = self.config[key]
+                else:
+                    config.pop(key, None)
         
-        # Give it a moment to start
-        time.sleep(1)
+        # The new configuration is only kept once it is applied, a failed
+        # hand-off is retried on the next reload
+        changed = restart_required(self.config, config)
+        self.write_pac(config)
+        if self.embedded_proxy:
+            # The proxy shares this process, live settings apply in place
+            self._push_config(config)
+            self.config = config
+            if changed:
+                logger.warning(f"Restart the service to apply: {', '.join(changed)}")
+            return not changed and not listeners
         
-        # Check if process is still running
-        if self.api_server_process.poll() is not None:
-            err = self.api_server_process.stderr.read().decode('utf-8')
-            logger.error(f"API server failed to start: {err}")
-            self.api_server_process = None
-            raise RuntimeError("Failed to start API server")
+        if not changed:
+            if self._push_config(config):
+                logger.info("Configuration pushed to the running proxy")
+                self.config = config
+                return not listeners
+            logger.warning("Failed to push the configuration to the proxy")
+        else:
+            logger.info(f"Changed settings need new workers: {', '.join(changed)}")
+        logger.info("Handing off to new worker processes...")
+        success = True
+        for supervisor in (self.proxy_supervisor, self.api_supervisor):
+            if supervisor and not supervisor.reload():
+                success = False
+        if success:
+            self.config = config
+        return success and not listeners
+    
+    def _push_config(self, config):
+        """Send a configuration to the running proxy"""
+        if self.embedded_proxy:
+            self.embedded_proxy.apply_config(config)
+            return True
+        if self.proxy_supervisor:
+            return self.proxy_supervisor.send({"type": CONFIG, "config": config})
+        return False
     
     def run_forever(self):
         """Keep the service running until interrupted"""
+        interval = self.config.get("health_check_interval", 5)
         while self.running:
-            # Check if processes are still running
-            if self.proxy_process and self.proxy_process.poll() is not None:
-                logger.error("Proxy server crashed, restarting...")
-                self._start_proxy_server()
+            # Health-check the workers, restarting them with backoff
+            for supervisor in (self.proxy_supervisor, self.api_supervisor):
+                if supervisor:
+                    supervisor.check()
             
-            if self.api_server_process and self.api_server_process.poll() is not None:
-                logger.error("API server crashed, restarting...")
-                self._start_api_server()
+            if self.embedded_proxy and not self.embedded_proxy.is_alive():
+                logger.error("Embedded proxy server stopped, restarting...")
+                try:
+                    self._start_proxy_server()
+                except RuntimeError as e:
+                    logger.error(str(e))
             
-            time.sleep(5)
\ No newline at end of file
+            time.sleep(interval)
@@ -0,0 +1,210 @@
+"""
+Bounded decompression of encoded request bodies
+
+mitmproxy decodes a body in full the first time .content is read, however
+large it inflates to. Encoded bodies are instead decompressed here from
+the raw bytes in steps, and decoding stops as soon as the output passes
+the size cap or the compression ratio cap. gzip, deflate and zstd produce
+at most CHUNK_SIZE bytes per step, so a decompression bomb costs no more
+than the cap in memory and time. Brotli only bounds its steps from
+release 1.2, see _brotli() for the bound with older releases.
+"""
+import io
+import zlib
+import logging
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Output produced per decompression step
+CHUNK_SIZE = 64 * 1024
+
+# Brotli releases before 1.2 cannot bound their output, input is fed to
+# them in small pieces instead
+BROTLI_INPUT_CHUNK = 64
+
+# Bodies are allowed this much output whatever their ratio
+RATIO_FLOOR = 1024 * 1024
+
+class DecompressionBomb(ValueError):
+    """Raised when a body inflates past the configured limits"""
+
+class UnsupportedEncoding(ValueError):
+    """Raised for a content encoding that cannot be decoded here"""
+
+class CorruptBody(ValueError):
+    """Raised when a body is not valid in its content encoding"""
+
+class BodyDecoder:
+    """Decode Content-Encoding of request bodies within output limits"""
+
+    def __init__(self, config=None):
+        """
+        Args:
+            config (dict, optional): Configuration dictionary
+        """
+        self.update(config or {})
+
+    def update(self, config):
+        """
+        Apply limits from the configuration
+
+        Args:
+            config (dict): Configuration dictionary
+        """
+        self.max_output = config.get("max_decompressed_bytes", 8 * 1024 * 1024)
+        self.max_ratio = config.get("max_compression_ratio", 100)
+
+    def decode(self, content, encoding):
+        """
+        Decode a body with one or more content encodings
+
+        Args:
+            content (bytes): Raw request body
+            encoding (str): Content-Encoding header value
+
+        Returns:
+            bytes: The decoded body
+
+        Raises:
+            DecompressionBomb: If the output exceeds the limits
+            UnsupportedEncoding: If an encoding is unknown or its module
+                is not installed
+            CorruptBody: If the body is not valid in its encoding
+        """
+        # Encodings are listed in the order they were applied
+        codings = [coding.strip().lower() for coding in encoding.split(",") if coding.strip()]
+        limit = min(self.max_output, max(len(content) * self.max_ratio, RATIO_FLOOR))
+        for coding in reversed(codings):
+            if coding in ("identity", "none"):
+                continue
+            decoder = DECODERS.get(coding)
+            if decoder is None:
+                raise UnsupportedEncoding(f"Unsupported content encoding: {coding}")
+            content = decoder(content, limit)
+        return content
+
+def _check(size, limit):
+    """Stop decoding once the output passes the limit"""
+    if size > limit:
+        raise DecompressionBomb(f"Body inflates past {limit} bytes")
+
+def _inflate(content, limit, wbits, members=False):
+    """
+    zlib-family decompression with bounded output
+
+    Args:
+        content (bytes): Compressed data
+        limit (int): Largest output allowed
+        wbits (int): zlib window bits selecting the container format
+        members (bool): Decode further streams following the first one,
+            like the members of a multi-member gzip file
+    """
+    output = []
+    size = 0
+    data = content
+    try:
+        while data:
+            decompressor = zlib.decompressobj(wbits)
+            while not decompressor.eof:
+                chunk = decompressor.decompress(data, CHUNK_SIZE)
+                data = decompressor.unconsumed_tail
+                if not chunk and not data:
+                    raise CorruptBody("Compressed stream is truncated")
+                size += len(chunk)
+                _check(size, limit)
+                output.append(chunk)
+            # Trailing zero bytes pad some gzip files, they start no member
+            data = decompressor.unused_data.lstrip(b"\0")
+            if not members or not decompressor.eof:
+                break
+    except zlib.error as e:
+        raise CorruptBody(str(e))
+    return b"".join(output)
+
+def _gzip(content, limit):
+    return _inflate(content, limit, 16 + zlib.MAX_WBITS, members=True)
+
+def _deflate(content, limit):
+    # Clients send both zlib-wrapped and raw deflate streams
+    wrapped = len(content) >= 2 and content[0] & 0x0F == 8 and (content[0] << 8 | content[1]) % 31 == 0
+    return _inflate(content, limit, zlib.MAX_WBITS if wrapped else -zlib.MAX_WBITS)
+
+def _brotli(content, limit):
+    """
+    Brotli decompression
+
+    From Brotli 1.2 every step produces about CHUNK_SIZE bytes. Older
+    releases return all the output of the input they are given, which the
+    format only bounds per command (copies of up to 16 MiB), so with them
+    input is fed BROTLI_INPUT_CHUNK bytes at a time and memory may exceed
+    the limit by what one such piece inflates to before it is checked.
+    """
+    if brotli is None:
+        raise UnsupportedEncoding("Brotli is not installed")
+    decompressor = brotli.Decompressor()
+    output = []
+    size = 0
+    try:
+        if hasattr(decompressor, "can_accept_more_data"):
+            chunks = _brotli_bounded(decompressor, content)
+        else:
+            chunks = (
+                decompressor.process(content[start:start + BROTLI_INPUT_CHUNK])
+                for start in range(0, len(content), BROTLI_INPUT_CHUNK)
+            )
+        for chunk in chunks:
+            size += len(chunk)
+            _check(size, limit)
+            output.append(chunk)
+    except brotli.error as e:
+        raise CorruptBody(str(e))
+    if not decompressor.is_finished():
+        raise CorruptBody("Compressed stream is truncated")
+    return b"".join(output)
+
+def _brotli_bounded(decompressor, content):
+    """Output of a Brotli 1.2+ decompressor in steps of about CHUNK_SIZE"""
+    chunk = decompressor.process(content, output_buffer_limit=CHUNK_SIZE)
+    yield chunk
+    # All input went in at once, what is left is output held back. A step
+    # without output before the end means the stream is truncated
+    while chunk and not decompressor.is_finished():
+        chunk = decompressor.process(b"", output_buffer_limit=CHUNK_SIZE)
+        yield chunk
+
+def _zstd(content, limit):
+    if zstandard is None:
+        raise UnsupportedEncoding("zstandard is not installed")
+    output = []
+    size = 0
+    try:
+        reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(content), read_across_frames=True)
+        with reader:
+            while True:
+                chunk = reader.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                _check(size, limit)
+                output.append(chunk)
+    except zstandard.ZstdError as e:
+        raise CorruptBody(str(e))
+    return b"".join(output)
+
+DECODERS = {
+    "gzip": _gzip,
+    "x-gzip": _gzip,
+    "deflate": _deflate,
+    "br": _brotli,
+    "zstd": _zstd,
+}
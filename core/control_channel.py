@@ -0,0 +1,71 @@
+"""
+Control channel between the service and its proxy workers
+
+The supervisor starts each worker with a pipe on its standard input and
+writes one JSON message per line to it. The pipe is private to the two
+processes, needs no port or socket file, and closes by itself when either
+side exits. Messages are objects with a "type" key, the worker dispatches
+them to the handler registered for that type.
+"""
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Message types
+CONFIG = "config"
+
+def send_message(stream, message):
+    """
+    Write a message to a worker's control pipe
+
+    Args:
+        stream (file): Binary stream, the worker process's stdin
+        message (dict): Message with a "type" key
+
+    Returns:
+        bool: Whether the message was written
+    """
+    if stream is None:
+        return False
+    try:
+        stream.write(json.dumps(message).encode("utf-8") + b"\n")
+        stream.flush()
+        return True
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to send {message.get('type')} message: {str(e)}")
+        return False
+
+class ControlListener(threading.Thread):
+    """Read control messages in a worker and dispatch them"""
+
+    def __init__(self, stream, handlers):
+        """
+        Args:
+            stream (file): Binary stream to read messages from
+            handlers (dict): Callables taking the message, by message type
+        """
+        super().__init__(name="promptshield-control", daemon=True)
+        self.stream = stream
+        self.handlers = handlers
+
+    def run(self):
+        for line in self.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                message = json.loads(line)
+                handler = self.handlers.get(message.get("type"))
+            except (ValueError, AttributeError) as e:
+                logger.error(f"Invalid control message: {str(e)}")
+                continue
+            if handler is None:
+                logger.warning(f"Unknown control message type: {message.get('type')}")
+                continue
+            try:
+                handler(message)
+            except Exception as e:
+                logger.error(f"Failed to handle {message.get('type')} message: {str(e)}")
+        logger.info("Control channel closed")
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import threading
+from core.proxy_server import AISecurityProxy
+from utils.system_utils import wait_for_port
+
+logger = logging.getLogger(__name__)
+
+class _InheritedSocketEventLoop(asyncio.SelectorEventLoop):
+    """Event loop that serves TCP listeners on a socket handed in by a supervisor"""
+
+    def __init__(self, listen_socket):
+        super().__init__()
+        self.listen_socket = listen_socket
+
+    async def create_server(self, protocol_factory, host=None, port=None, **kwargs):
+        # mitmproxy binds by host and port, serve the inherited socket instead
+        if kwargs.get("sock") is None:
+            kwargs.pop("reuse_address", None)
+            kwargs.pop("reuse_port", None)
+            return await super().create_server(
+                protocol_factory, sock=self.listen_socket, **kwargs
+            )
+        return await super().create_server(protocol_factory, host, port, **kwargs)
+
+class _ReadinessAddon:
+    """Signals when the master has set up its servers"""
+
+    def __init__(self, event):
+        self.event = event
+
+    def running(self):
+        self.event.set()
+
+class EmbeddedProxy:
+    """Run mitmproxy in-process on a dedicated asyncio loop"""
+
+    def __init__(self, proxy_host="127.0.0.1", proxy_port=8080, config=None, listen_socket=None,
+                 mitm_options=None):
+        """
+        Initialize the embedded proxy
+
+        Args:
+            proxy_host (str): Host to bind the proxy to
+            proxy_port (int): Port for the proxy server
+            config (dict, optional): Configuration dictionary
+            listen_socket (socket.socket, optional): Already listening socket
+                to serve instead of binding the host and port
+            mitm_options (dict, optional): Additional mitmproxy options,
+                such as a reverse proxy mode
+        """
+        self.proxy_host = proxy_host
+        self.proxy_port = proxy_port
+        self.config = config
+        self.listen_socket = listen_socket
+        self.mitm_options = mitm_options or {}
+
+        # The addon is shared directly with the rest of the process
+        self.addon = AISecurityProxy(config)
+
+        self.loop = None
+        self.master = None
+        self.thread = None
+        self.ready = threading.Event()
+
+    def start(self, timeout=10):
+        """
+        Start the proxy thread and wait until it accepts connections
+
+        Args:
+            timeout (float): Seconds to wait for the proxy to listen
+
+        Raises:
+            RuntimeError: If the proxy did not start listening
+        """
+        # An addon that already went through mitmproxy's done hook is spent
+        if not self.addon.is_running:
+            self.addon = AISecurityProxy(self.config)
+
+        self.ready.clear()
+        self.thread = threading.Thread(target=self._run, name="promptshield-proxy")
+        self.thread.daemon = True
+        self.thread.start()
+
+        if (not self.ready.wait(timeout)
+                or not wait_for_port(self.proxy_host, self.proxy_port, timeout)
+                or not self.is_alive()):
+            self.stop()
+            raise RuntimeError("Failed to start embedded proxy server")
+
+    def apply_config(self, config):
+        """
+        Apply a new configuration to the proxy addon
+
+        Request hooks read the addon's settings on the proxy's event loop,
+        the new ones are applied there rather than from the calling thread.
+
+        Args:
+            config (dict): Configuration dictionary
+        """
+        self.config = config
+        loop = self.loop
+        if self.is_alive() and loop is not None and loop.is_running():
+            loop.call_soon_threadsafe(self.addon.apply_config, config)
+        else:
+            self.addon.apply_config(config)
+
+    def is_alive(self):
+        """Whether the proxy thread is running"""
+        return self.thread is not None and self.thread.is_alive()
+
+    def _run(self):
+        """Thread body, runs the mitmproxy master until shutdown"""
+        if self.listen_socket is not None:
+            self.loop = _InheritedSocketEventLoop(self.listen_socket)
+        else:
+            self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._serve())
+        except Exception as e:
+            logger.error(f"Embedded proxy stopped: {str(e)}")
+        finally:
+            self.loop.close()
+
+    async def _serve(self):
+        """
+        Build the master on the running loop and serve
+
+        The master is headless: unlike the console and web frontends it has
+        no flow view, and none of the default addons keep flows unless
+        asked to save them, so memory does not grow with traffic.
+        """
+        # Imported here so that subprocess mode does not pay for it
+        from mitmproxy import addons, options
+        from mitmproxy.master import Master
+
+        opts = options.Options(listen_host=self.proxy_host, listen_port=self.proxy_port)
+        self.master = Master(opts)
+        self.master.addons.add(*addons.default_addons())
+        self.master.addons.add(self.addon, _ReadinessAddon(self.ready))
+        if self.mitm_options:
+            opts.update(**self.mitm_options)
+        await self.master.run()
+
+    def drain(self, timeout=30):
+        """
+        Stop accepting connections, let open ones finish, then shut down
+
+        Args:
+            timeout (float): Seconds to wait for open connections
+        """
+        if not self.is_alive() or not self.master:
+            return
+        future = asyncio.run_coroutine_threadsafe(self._drain(timeout), self.loop)
+        try:
+            future.result(timeout + 5)
+        except Exception as e:
+            logger.error(f"Failed to drain proxy connections: {str(e)}")
+            self.master.shutdown()
+        self.stop()
+
+    async def _drain(self, timeout):
+        """Close the listeners and wait for the connection count to reach zero"""
+        self.master.options.update(mode=[])
+        proxyserver = self.master.addons.get("proxyserver")
+        deadline = self.loop.time() + timeout
+        while proxyserver.connections and self.loop.time() < deadline:
+            await asyncio.sleep(0.1)
+        if proxyserver.connections:
+            logger.warning(f"Closing {len(proxyserver.connections)} connections after drain timeout")
+        self.master.shutdown()
+
+    def stop(self, timeout=5):
+        """
+        Shut the master down and wait for the thread to finish
+
+        Args:
+            timeout (float): Seconds to wait for the thread
+        """
+        if self.master:
+            self.master.shutdown()
+        if self.thread:
+            self.thread.join(timeout)
+        self.master = None
+        self.thread = None
@@ -1,47 +1,134 @@
 # core/proxy_server.py
-from mitmproxy import http
+from mitmproxy import http, tls
+import re
 import json
+import hashlib
 import logging
 import os
+import sys
 import time
 import threading
+from collections import deque
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, 
-                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# mitmproxy loads this file by path, make the project packages importable
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from config.settings import load_config, DEFAULT_AI_DOMAINS
+from core.analysis_pipeline import AnalysisPipeline, PipelineOverloaded
+from core.body_decoder import BodyDecoder, DecompressionBomb, UnsupportedEncoding, CorruptBody
+from core.session_store import SessionStore, turn_digest
+from core.stats_timeseries import StatsTimeSeries, LATENCY_LABELS, latency_bucket
+from core.websocket_inspector import WebSocketInspector, is_control_packet
+from core.verdict_cache import create_verdict_cache
+from security.analyzers.pattern_analyzer import PatternAnalyzer, Verdict
+from security.analyzers.byte_prefilter import BytePrefilter
+from security.analyzers.results import encode_json
+from security.analyzers.secret_detector import SecretDetector
+from security.analyzers.similarity_analyzer import SimilarityAnalyzer, ensure_index
+from security.analyzers.detector_cascade import build_cascade
+from security.extractors.provider_extractors import extract_segments
+from utils.profiling import TrafficProfiler
+from utils.system_utils import get_rss_bytes
+
+# Logging is configured by whoever runs the addon: the proxy worker, the
+# embedded service or mitmproxy itself
 logger = logging.getLogger('promptshield')
 
+# Conversation ids in web UI request paths
+CONVERSATION_ID = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+# Headers identifying the client's account, most specific first
+IDENTITY_HEADERS = ("x-api-key", "authorization", "cookie")
+
 class AISecurityProxy:
     """Proxy for intercepting and analyzing AI service traffic"""
     
-    def __init__(self):
-        """Initialize the proxy"""
-        # AI domains to intercept - all other traffic passes through untouched
-        self.ai_domains = [
-            "claude.ai",
-            "chat.openai.com",
-            "api.openai.com",
-            "api.anthropic.com",
-            "bard.google.com"
-        ]
-        
-        # Injection patterns to detect
-        self.injection_patterns = [
-            "ignore previous instructions",
-            "disregard previous",
-            "forget your instructions",
-            "ignore all prior commands",
-            "don't follow previous instructions"
-        ]
+    def __init__(self, config=None):
+        """
+        Initialize the proxy
+
+        Args:
+            config (dict, optional): Configuration dictionary
+        """
+        self.config = config if config is not None else load_config()
+        self._apply_domains()
+        self.block_mode = self.config.get("block_mode", "alert")
+        # Weaker detections, such as email addresses, are only reported
+        self.block_min_confidence = self.config.get("block_min_confidence", 0.7)
+
+        # Rule-based analyzer, the cascade only asks it for a verdict
+        self.analyzer = PatternAnalyzer()
+        
+        # Secrets and personal data leaving in prompts
+        self.secret_detector = SecretDetector() if self.config.get("secret_detection", True) else None
+        
+        # Paraphrases of known jailbreaks
+        self.similarity_analyzer = self._load_similarity_analyzer()
+        
+        # Injection classifier, needs the optional NumPy dependency
+        self.classifier = self._load_classifier()
+        
+        # Raw body check letting most requests skip JSON decoding
+        self.prefilter = self._load_prefilter()
+        
+        # Risk accumulated per conversation or client across requests
+        self.sessions = SessionStore(
+            max_sessions=self.config.get("session_max", 100000),
+            ttl=self.config.get("session_ttl", 3600),
+            half_life=self.config.get("session_risk_half_life", 600),
+            max_turns=self.config.get("session_max_turns", 256)
+        )
+        self.session_risk_threshold = self.config.get("session_risk_threshold", 1.5)
+        
+        # Messages web chat UIs send over WebSocket, with a short carry-over
+        # of earlier text per connection
+        self.websocket_inspection = self.config.get("websocket_inspection", True)
+        self.websockets = WebSocketInspector(self.config.get("websocket_carry_chars", 256))
+        
+        # Detectors run from cheap to expensive, ambiguous prompts escalate
+        self.cascade = build_cascade(
+            self.config, self.analyzer, self.secret_detector, self.classifier, self.similarity_analyzer
+        )
+
+        # Clean verdicts shared with the other workers, keyed by prompt and
+        # detector version so rule or model changes invalidate them
+        self.verdict_cache = create_verdict_cache(self.config)
+        self.rule_version = self._rule_version()
+
+        # Most recent detections with full match details
+        self.recent_detections = deque(maxlen=100)
         
         # Statistics
         self.stats = {
             "total_requests": 0,
             "ai_requests": 0,
             "detected_threats": 0,
+            "truncated_requests": 0,
+            "shed_requests": 0,
+            "passthrough_connections": 0,
+            "decompression_bombs": 0,
+            "undecodable_requests": 0,
+            "websocket_messages": 0,
+            "websocket_analysis_seconds": 0.0,
+            "websocket_latency": dict.fromkeys(LATENCY_LABELS, 0),
+            "rss_bytes": get_rss_bytes(),
             "start_time": time.time()
         }
         
+        # Per-second, per-minute and per-hour counters, fixed size
+        self.timeseries = StatsTimeSeries()
+        
+        # On-demand CPU profiles of live traffic
+        self.profiler = TrafficProfiler("data/profiles")
+        
+        # Bounded analysis stage with per-request byte budgets
+        self.pipeline = AnalysisPipeline(self.config, self.stats)
+        
+        # Compressed bodies are decoded with output limits, not by mitmproxy
+        self.body_decoder = BodyDecoder(self.config)
+        
         # Start stats saving thread - FIXED variable name (is_running instead of running)
         self.is_running = True
         os.makedirs("data/stats", exist_ok=True)
@@ -51,92 +138,585 @@ class AISecurityProxy:
         
         logger.info(f"PromptShield initialized - monitoring {len(self.ai_domains)} AI domains")
     
-    def request(self, flow: http.HTTPFlow) -> None:
+    def _apply_domains(self):
+        """Set the AI domains to intercept from the configuration"""
+        # AI domains to intercept - all other traffic passes through untouched
+        self.ai_domains = list(self.config.get("intercepted_domains") or DEFAULT_AI_DOMAINS)
+        self._ai_domain_set = set(domain.lower() for domain in self.ai_domains)
+        self._ai_domain_suffixes = tuple("." + domain for domain in self._ai_domain_set)
+    
+    def load(self, loader):
+        """Register PromptShield options with mitmproxy"""
+        loader.add_option(
+            "promptshield_config", str, "",
+            "Path to the PromptShield configuration file"
+        )
+    
+    def configure(self, updated):
+        """Reload the configuration when its path is set"""
+        from mitmproxy import ctx
+        if "promptshield_config" in updated and ctx.options.promptshield_config:
+            self.apply_config(load_config(ctx.options.promptshield_config))
+    
+    def apply_config(self, config):
+        """
+        Apply a new configuration to the running proxy
+        
+        Domains, modes, thresholds and budgets take effect for the next
+        requests, open connections are kept. Settings that need new
+        detectors or workers (see config.settings.SETTINGS) are ignored.
+        
+        Args:
+            config (dict): Configuration dictionary
+        """
+        self.config = config
+        self._apply_domains()
+        self.block_mode = config.get("block_mode", "alert")
+        self.block_min_confidence = config.get("block_min_confidence", 0.7)
+        self.pipeline.update(config)
+        self.body_decoder.update(config)
+        self.session_risk_threshold = config.get("session_risk_threshold", 1.5)
+        self.websocket_inspection = config.get("websocket_inspection", True)
+        self.websockets.carry_chars = config.get("websocket_carry_chars", 256)
+        
+        if config.get("secret_detection", True):
+            self.secret_detector = self.secret_detector or SecretDetector()
+        else:
+            self.secret_detector = None
+        if self.similarity_analyzer:
+            self.similarity_analyzer.threshold = config.get("similarity_threshold", 0.25)
+        if self.classifier:
+            self.classifier.threshold = config.get("ml_threshold", 0.8)
+        
+        # Tier decisions capture thresholds, swap in a new cascade keeping the statistics
+        cascade = build_cascade(
+            config, self.analyzer, self.secret_detector, self.classifier, self.similarity_analyzer
+        )
+        for name, stats in self.cascade.stats.items():
+            if name in cascade.stats:
+                cascade.stats[name] = stats
+        self.cascade = cascade
+        self.prefilter = self._load_prefilter()
+        self.rule_version = self._rule_version()
+        logger.info(f"Configuration applied - monitoring {len(self.ai_domains)} AI domains")
+    
+    def _is_ai_host(self, host):
+        """Whether a host is one of the AI domains or a subdomain of one"""
+        if not host:
+            return False
+        host = host.lower().rstrip(".")
+        return host in self._ai_domain_set or host.endswith(self._ai_domain_suffixes)
+    
+    def tls_clienthello(self, data: tls.ClientHelloData) -> None:
+        """Tunnel TLS connections to non-AI hosts without intercepting them"""
+        host = data.client_hello.sni
+        if not host and data.context.server.address:
+            host = data.context.server.address[0]
+        
+        if not self._is_ai_host(host):
+            # Forwarded as raw TCP, no certificate forging or HTTP parsing
+            data.ignore_connection = True
+            self.stats["passthrough_connections"] += 1
+    
+    def requestheaders(self, flow: http.HTTPFlow) -> None:
+        """Stream request bodies that will never be analyzed"""
+        if not self._is_ai_host(flow.request.pretty_host):
+            flow.request.stream = True
+    
+    def responseheaders(self, flow: http.HTTPFlow) -> None:
+        """Responses are not inspected, stream them straight to the client"""
+        flow.response.stream = True
+    
+    async def request(self, flow: http.HTTPFlow) -> None:
         """Process requests - THE KEY FUNCTION"""
         
         logger.info(f"DEBUG: Received request for: {flow.request.pretty_host}")
         # Count all requests
         self.stats["total_requests"] += 1
+        self.timeseries.record("requests")
         
-        # IMPORTANT: Only analyze AI domain traffic
-        is_ai_domain = False
-        for domain in self.ai_domains:
-            if domain in flow.request.pretty_host:
-                is_ai_domain = True
-                break
-        
-        # If not an AI domain, do nothing and let the request pass through
-        if not is_ai_domain:
+        # IMPORTANT: Only analyze AI domain traffic. HTTPS to other hosts is
+        # already tunneled in tls_clienthello, this catches plain HTTP
+        if not self._is_ai_host(flow.request.pretty_host):
             return
         
         # It's an AI domain, so analyze it
         logger.info(f"Intercepted request to AI service: {flow.request.pretty_host}")
         self.stats["ai_requests"] += 1
+        self.timeseries.record("ai_requests")
         
-        # Analyze POST requests with content
-        if flow.request.method == "POST" and flow.request.content:
+        # Analyze POST requests with content. The raw body is used, reading
+        # .content would have mitmproxy inflate it without any limit
+        if flow.request.method == "POST" and flow.request.raw_content:
             try:
                 # Try to parse JSON content
                 if flow.request.headers.get("content-type", "").startswith("application/json"):
-                    body = json.loads(flow.request.content)
+                    started = time.perf_counter()
+                    verdict, truncated = await self.pipeline.run(
+                        self.profiler.wrap(self._analyze_content), flow.request.pretty_host, flow.request.path,
+                        flow.request.raw_content, self._session_key(flow),
+                        flow.request.headers.get("content-encoding")
+                    )
+                    self.timeseries.record_latency(time.perf_counter() - started)
+                    if truncated:
+                        self.stats["truncated_requests"] += 1
                     
-                    # Extract the prompt based on the service
-                    prompt = self._extract_prompt(flow.request.pretty_host, body)
-                    
-                    # Check for injection attempts
-                    if prompt and self._check_for_injection(prompt):
-                        logger.warning(f"Detected potential prompt injection: {prompt[:100]}...")
-                        self.stats["detected_threats"] += 1
-                        
-                        # For now, just log it - you can add blocking or modification later
-                        # flow.response = http.Response.make(
-                        #     403, b"Request blocked by PromptShield", {"Content-Type": "text/plain"}
-                        # )
+                    if verdict and verdict.is_dangerous:
+                        self._handle_detection(flow, verdict)
+            except DecompressionBomb as e:
+                logger.warning(f"Rejected compressed request to {flow.request.pretty_host}: {str(e)}")
+                self.stats["decompression_bombs"] += 1
+                self.timeseries.record("blocked")
+                flow.response = http.Response.make(
+                    413, b"Request body inflates past the PromptShield limit", {"Content-Type": "text/plain"}
+                )
+            except (UnsupportedEncoding, CorruptBody) as e:
+                # A body that cannot be analyzed is not forwarded either
+                logger.warning(f"Rejected undecodable request to {flow.request.pretty_host}: {str(e)}")
+                self.stats["undecodable_requests"] += 1
+                self.timeseries.record("blocked")
+                status = 415 if isinstance(e, UnsupportedEncoding) else 400
+                flow.response = http.Response.make(
+                    status, f"PromptShield cannot decode the request body: {str(e)}".encode(),
+                    {"Content-Type": "text/plain"}
+                )
+            except PipelineOverloaded as e:
+                logger.warning(f"Analysis overloaded, request not analyzed: {str(e)}")
+                self.timeseries.record("shed")
+                if self.pipeline.fail_closed:
+                    flow.response = http.Response.make(
+                        503, b"PromptShield is overloaded", {"Content-Type": "text/plain"}
+                    )
             except Exception as e:
                 logger.error(f"Error analyzing request: {str(e)}")
     
-    def _extract_prompt(self, host, body):
-        """Extract prompt from request body based on service"""
+    async def websocket_message(self, flow: http.HTTPFlow) -> None:
+        """Scan messages clients send over WebSocket connections to AI hosts"""
+        message = flow.websocket.messages[-1]
+        # Only the message being forwarded is kept, not the whole session
+        del flow.websocket.messages[:-1]
+        
+        if not message.from_client or not self.websocket_inspection:
+            return
+        if not self._is_ai_host(flow.request.pretty_host):
+            return
+        # Heartbeats are frequent and carry no text
+        if is_control_packet(message.content):
+            return
+        
+        # The carry-over is chained here on the event loop, in message order
+        if self.pipeline.is_oversized(message.content):
+            # Scanned as raw text, its tail is no prompt text to carry over
+            self.websockets.close(flow.id)
+            text = None
+        else:
+            text = self.websockets.text(flow.id, message.content, message.is_text)
+            if not text:
+                # No string payload
+                return
+        
         try:
-            if "anthropic" in host:
-                if "messages" in body:
-                    # Claude API v2
-                    return body.get("messages", [{}])[-1].get("content", "")
-                elif "prompt" in body:
-                    # Claude API v1
-                    return body.get("prompt", "")
-            elif "openai" in host:
-                return body.get("messages", [{}])[-1].get("content", "")
-            return None
+            started = time.perf_counter()
+            verdict, truncated = await self.pipeline.run(
+                self.profiler.wrap(self._analyze_websocket_message),
+                message.content, text, self._session_key(flow)
+            )
+            if verdict is None:
+                return
+            elapsed = time.perf_counter() - started
+            self.stats["websocket_messages"] += 1
+            # Kept apart from request latency, messages are small and frequent
+            self.stats["websocket_analysis_seconds"] += elapsed
+            self.stats["websocket_latency"][LATENCY_LABELS[latency_bucket(elapsed)]] += 1
+            if truncated:
+                self.stats["truncated_requests"] += 1
+            
+            if verdict.is_dangerous:
+                if text:
+                    self.websockets.detected(flow.id, text)
+                verdict.path = "websocket"
+                self._handle_detection(flow, verdict, message)
+        except PipelineOverloaded as e:
+            logger.warning(f"Analysis overloaded, WebSocket message not analyzed: {str(e)}")
+            self.timeseries.record("shed")
+            if self.pipeline.fail_closed:
+                message.drop()
         except Exception as e:
-            logger.error(f"Error extracting prompt: {str(e)}")
-            return None
+            logger.error(f"Error analyzing WebSocket message: {str(e)}")
+    
+    def websocket_end(self, flow: http.HTTPFlow) -> None:
+        """Drop the carry-over of a closed WebSocket connection"""
+        self.websockets.close(flow.id)
+    
+    def _analyze_websocket_message(self, content, text, session_key=None):
+        """
+        Analyze a client WebSocket message
+        
+        Args:
+            content (bytes): Message payload
+            text (str): Message text after the connection's carry-over, None
+                for an oversized message, whose payload is scanned as text
+            session_key (str, optional): Session the message belongs to
+        
+        Returns:
+            tuple: (verdict, whether the text was truncated)
+        """
+        if text is None:
+            prompt = self.pipeline.clip_body(content)
+            truncated = True
+        else:
+            prompt, truncated = self.pipeline.clip_prompt(text)
+        
+        elevated = bool(session_key) and self.sessions.risk(session_key) >= self.session_risk_threshold
+        verdict = self._cached_verdicts([prompt], elevated)[0]
+        
+        # Only detections add to the session's risk
+        if session_key and verdict is not None and verdict.is_dangerous:
+            self.sessions.record(session_key, [], verdict.confidence, detected=True)
+        return verdict, truncated
+    
+    def _analyze_content(self, host, path, content, session_key=None, encoding=None):
+        """
+        Decode, extract and analyze a request body within the byte budget
+        
+        Returns:
+            tuple: (verdict or None, whether the prompt was truncated)
+        
+        Raises:
+            DecompressionBomb: If a compressed body inflates past the limits
+            UnsupportedEncoding: If the body's content encoding is unknown
+            CorruptBody: If the body is not valid in its content encoding
+        """
+        if encoding:
+            content = self.body_decoder.decode(content, encoding)
+        
+        # Oversized bodies are not decoded, their head and tail are scanned as text
+        if self.pipeline.is_oversized(content):
+            return self._check_for_injection(self.pipeline.clip_body(content)), True
+        
+        elevated = bool(session_key) and self.sessions.risk(session_key) >= self.session_risk_threshold
+        
+        # Bodies no rule or secret detector can match are never decoded,
+        # risky sessions always get the full analysis
+        prefilter = self.prefilter
+        if prefilter and not elevated and not prefilter.may_match(content):
+            return None, False
+        
+        body = json.loads(content)
+        segments = extract_segments(host, path, body)
+        
+        # Clients resend the whole conversation, turns already scanned clean
+        # in this session by the current detectors are skipped
+        rule_version = self.rule_version
+        digests = [turn_digest(segment.text, rule_version) for segment in segments]
+        if session_key:
+            fresh = self.sessions.new_turns(session_key, digests)
+            segments = [segment for segment, new in zip(segments, fresh) if new]
+            digests = [digest for digest, new in zip(digests, fresh) if new]
+        
+        prompts = []
+        truncated = False
+        for segment in segments:
+            prompt, clipped = self.pipeline.clip_prompt(segment.text)
+            truncated = truncated or clipped
+            prompts.append(prompt)
+        
+        # Every new text segment is checked, the first dangerous one decides.
+        # Only detections add risk, and only turns the cascade settled as
+        # clean are remembered
+        verdicts = self._cached_verdicts(prompts, elevated)
+        found = None
+        signal = 0.0
+        clean = []
+        for segment, digest, verdict in zip(segments, digests, verdicts):
+            if verdict is None:
+                continue
+            if verdict.is_dangerous:
+                signal = max(signal, verdict.confidence)
+                if found is None:
+                    verdict.path = segment.path
+                    found = verdict
+            elif verdict.settled:
+                clean.append(digest)
+        
+        if session_key:
+            self.sessions.record(session_key, clean, signal, detected=found is not None)
+        return found, truncated
+    
+    def _cached_verdicts(self, prompts, elevated=False):
+        """
+        Run prompts through the cascade, reusing clean verdicts from the cache
+
+        Only clean verdicts the cascade settled are cached, detections are
+        rare and need their full analysis. Elevated sessions bypass the
+        lookup since a prompt clean for an ordinary session may not be
+        clean for them.
+
+        Returns:
+            list: One verdict per prompt, None for prompts that were not checked
+        """
+        if self.verdict_cache is None or not prompts:
+            return self.cascade.verdicts(prompts, stop_on_first=True, elevated=elevated)
+        
+        keys = [self._cache_key(prompt) for prompt in prompts]
+        cached = {} if elevated else self.verdict_cache.get_many(keys)
+        
+        verdicts = [None] * len(prompts)
+        missing = []
+        for i, key in enumerate(keys):
+            entry = cached.get(key)
+            if entry is None:
+                missing.append(i)
+            else:
+                verdict = Verdict(None, prompts[i], None)
+                verdict.ml_score = entry.get("ml_score")
+                verdict.settled = True
+                verdicts[i] = verdict
+        
+        results = self.cascade.verdicts([prompts[i] for i in missing], stop_on_first=True, elevated=elevated)
+        fresh = {}
+        for i, verdict in zip(missing, results):
+            verdicts[i] = verdict
+            if verdict is not None and verdict.settled and not verdict.is_dangerous:
+                fresh[keys[i]] = {"ml_score": verdict.ml_score}
+        self.verdict_cache.put_many(fresh)
+        return verdicts
+    
+    def _cache_key(self, prompt):
+        """Verdict cache key of a prompt under the current detectors"""
+        digest = hashlib.blake2b(self.rule_version, digest_size=16)
+        digest.update(prompt.encode("utf-8", "replace"))
+        return digest.digest()
+    
+    def _rule_version(self):
+        """Digest of everything a verdict depends on: rules, models and thresholds"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(json.dumps([rule["pattern"] for rule in self.analyzer.patterns], sort_keys=True, default=str).encode())
+        if self.secret_detector and self.secret_detector.scanner:
+            digest.update(self.secret_detector.scanner.pattern.encode())
+        if self.similarity_analyzer:
+            digest.update(self._file_version(self.config.get("similarity_index", "data/index/known_jailbreaks.lsh")))
+        if self.classifier:
+            model = self.config.get("ml_model", "data/models/injection_classifier")
+            digest.update(self._file_version(model + ".npy"))
+            digest.update(self._file_version(model + ".json"))
+        settings = [self.config.get(key) for key in (
+            "similarity_threshold", "ml_threshold", "ml_clean_below",
+            "pattern_decisive_confidence", "block_min_confidence",
+        )]
+        digest.update(json.dumps(settings).encode())
+        return digest.digest()
+    
+    def _file_version(self, path):
+        """Size and modification time of a derived artifact"""
+        try:
+            stat = os.stat(path)
+            return f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode()
+        except OSError:
+            return path.encode()
+    
+    def _session_key(self, flow):
+        """Identify the conversation, or else the account or address, of a request"""
+        match = CONVERSATION_ID.search(flow.request.path)
+        if match:
+            return f"conversation:{match.group()}"
+        for header in IDENTITY_HEADERS:
+            value = flow.request.headers.get(header)
+            if value:
+                # Only a digest of the credential is kept
+                digest = hashlib.blake2b(value.encode("utf-8", "replace"), digest_size=12).hexdigest()
+                return f"{header}:{digest}"
+        peername = flow.client_conn.peername
+        return f"address:{peername[0]}" if peername else None
     
     def _check_for_injection(self, prompt):
-        """Check for prompt injection patterns"""
+        """Run a single text through the detector cascade, returns a verdict or None"""
         if not prompt or not isinstance(prompt, str):
-            return False
+            return None
+        
+        return self.cascade.verdicts([prompt])[0]
+    
+    def _load_prefilter(self):
+        """
+        Build the raw body prefilter if it can stand in for the detectors
+        
+        The classifier is advisory, it never flags a prompt that no rule
+        matched, so bodies the prefilter rules out need no score. The
+        similarity tier flags prompts of its own and has no trigger words:
+        in "auto" mode the prefilter is only used without it, "on" uses it
+        anyway and the similarity tier then only sees bodies that hit a
+        trigger.
+        """
+        mode = self.config.get("byte_prefilter", "auto")
+        if mode == "off":
+            return None
+        if mode == "auto" and self.similarity_analyzer:
+            return None
+        prefilter = BytePrefilter(self.analyzer, self.secret_detector)
+        return prefilter if prefilter.complete else None
+    
+    def _load_similarity_analyzer(self):
+        """Open the known jailbreak index, building it from the corpus if needed"""
+        corpus = self.config.get("similarity_corpus")
+        if not corpus:
+            return None
+        if not os.path.isabs(corpus):
+            corpus = os.path.join(PROJECT_ROOT, corpus)
+        index = self.config.get("similarity_index", "data/index/known_jailbreaks.lsh")
+        
+        if not ensure_index(corpus, index):
+            return None
+        try:
+            return SimilarityAnalyzer(index, self.config.get("similarity_threshold", 0.25))
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to open similarity index: {str(e)}")
+            return None
+    
+    def _load_classifier(self):
+        """Open the injection classifier, training it from its corpus if needed"""
+        if not self.config.get("ml_classifier", True):
+            return None
+        try:
+            from security.analyzers.ml_classifier import MLClassifier, ensure_model
+        except ImportError:
+            logger.warning("NumPy is not installed, the injection classifier is disabled")
+            return None
         
-        prompt_lower = prompt.lower()
-        for pattern in self.injection_patterns:
-            if pattern in prompt_lower:
-                return True
-        return False
+        corpus = self.config.get("ml_training_corpus", "security/corpus/classifier_training.jsonl")
+        if not os.path.isabs(corpus):
+            corpus = os.path.join(PROJECT_ROOT, corpus)
+        model = self.config.get("ml_model", "data/models/injection_classifier")
+        
+        if not ensure_model(corpus, model):
+            return None
+        try:
+            return MLClassifier(model, self.config.get("ml_threshold", 0.8))
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Failed to load injection classifier: {str(e)}")
+            return None
+    
+    def _handle_detection(self, flow, verdict, message=None):
+        """
+        Log a detection and apply the configured block mode
+        
+        Args:
+            flow (HTTPFlow): The request's flow
+            verdict (Verdict): Dangerous verdict
+            message (WebSocketMessage, optional): The WebSocket message
+                the detection is in, dropped instead of answering the flow
+        """
+        self.stats["detected_threats"] += 1
+        self.timeseries.record_detection(verdict.threat_type)
+        
+        # Only detections pay for full match enumeration
+        # Rule details once, threats by rule index, matched text sliced here
+        report = verdict.analysis.compact()
+        matched = [threat["matched_text"] for threat in report["threats"]]
+        logger.warning(
+            f"Detected potential {verdict.threat_type} "
+            f"(confidence {verdict.confidence:.2f}) on {flow.request.pretty_host}: {matched}"
+        )
+        self.recent_detections.append({
+            "time": time.time(),
+            "host": flow.request.pretty_host,
+            "path": verdict.path,
+            "ml_score": verdict.ml_score,
+            "confidence": report["confidence"],
+            "rules": report["rules"],
+            "threats": report["threats"],
+        })
+        
+        if self.block_mode == "block" and verdict.confidence >= self.block_min_confidence:
+            self.timeseries.record("blocked")
+            if message is not None:
+                message.drop()
+                return
+            flow.response = http.Response.make(
+                403, b"Request blocked by PromptShield", {"Content-Type": "text/plain"}
+            )
+    
+    def _check_profile_request(self):
+        """Start a profiling session requested through the API server"""
+        path = "data/stats/promptshield_profile_request.json"
+        try:
+            with open(path, "r") as f:
+                request = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.error(f"Invalid profiling request: {str(e)}")
+            request = None
+        os.remove(path)
+        if request:
+            self.start_profiling(request)
+    
+    def start_profiling(self, request):
+        """
+        Start a profiling session
+        
+        Args:
+            request (dict): {"mode": "sample", "seconds": N} or
+                {"mode": "requests", "every": K, "count": M}
+        
+        Returns:
+            str: File the profile will be written to, or None if it could
+                not be started
+        """
+        if request.get("mode") == "requests":
+            return self.profiler.start_requests(
+                int(request.get("every", 10)), int(request.get("count", 100))
+            )
+        return self.profiler.start_sampling(
+            float(request.get("seconds", 10)), float(request.get("interval_ms", 5)) / 1000
+        )
     
     def _save_stats_periodically(self):
         """Save statistics periodically"""
+        ticks = 0
         while self.is_running:  # FIXED: changed from self.running to self.is_running
+            # Profiling requests are picked up every second
             try:
-                with open("data/stats/promptshield_stats.json", "w") as f:
-                    json.dump(self.stats, f, indent=2)
+                self._check_profile_request()
             except Exception as e:
-                logger.error(f"Error saving stats: {str(e)}")
-            time.sleep(10)  # Save every 10 seconds
+                logger.error(f"Error starting profiler: {str(e)}")
+            
+            if ticks % 10 == 0:  # Save every 10 seconds
+                self._save_stats()
+            ticks += 1
+            time.sleep(1)
+    
+    def _save_stats(self):
+        """Write statistics and recent detections for the API server"""
+        try:
+            self.stats["rss_bytes"] = get_rss_bytes()
+            self.stats["tiers"] = self.cascade.report()
+            self.stats["sessions"] = len(self.sessions)
+            self.stats["profiler"] = self.profiler.status()
+            if self.verdict_cache:
+                self.stats["verdict_cache"] = self.verdict_cache.report()
+            if self.prefilter:
+                self.stats["prefilter"] = {
+                    "checked": self.prefilter.checked,
+                    "skipped": self.prefilter.skipped,
+                }
+            with open("data/stats/promptshield_stats.json", "w") as f:
+                f.write(encode_json(self.stats))
+            with open("data/stats/promptshield_detections.json", "w") as f:
+                f.write(encode_json(list(self.recent_detections)))
+            self.timeseries.save("data/stats/promptshield_timeseries.json")
+        except Exception as e:
+            logger.error(f"Error saving stats: {str(e)}")
     
     def done(self):  # Added proper shutdown hook for mitmproxy
         """Called when the addon shuts down"""
         self.is_running = False
+        self.pipeline.shutdown()
         logger.info("PromptShield shutting down")
 
-# Create the addon instance for mitmproxy
-addons = [AISecurityProxy()]
\ No newline at end of file
+def __getattr__(name):
+    """Create the addon instance only when mitmproxy loads this file as a script"""
+    if name == "addons":
+        global addons
+        addons = [AISecurityProxy()]
+        return addons
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
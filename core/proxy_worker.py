@@ -0,0 +1,90 @@
+"""
+Proxy worker process
+
+Runs the proxy in-process on a listening socket inherited from the
+service supervisor. On SIGTERM the worker stops accepting connections and
+drains the open ones, so a replacement worker on the same socket can take
+over without dropping connections.
+"""
+import os
+import sys
+import socket
+import signal
+import argparse
+import logging
+import threading
+
+# Started as a script by the supervisor, make the project packages importable
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from config.settings import load_config, validate_config
+from core.control_channel import ControlListener, CONFIG
+from core.embedded_proxy import EmbeddedProxy
+from utils.logging_utils import setup_logging
+
+logger = logging.getLogger(__name__)
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="PromptShield proxy worker")
+    parser.add_argument("--listen-host", default="127.0.0.1", help="Host the proxy listens on")
+    parser.add_argument("--listen-port", type=int, default=8080, help="Port the proxy listens on")
+    parser.add_argument("--listen-fd", type=int, help="Inherited listening socket to serve")
+    parser.add_argument("--ready-file", help="File to create once the worker is serving")
+    parser.add_argument("--config", help="Path to the configuration file")
+    parser.add_argument("--control-stdin", action="store_true", help="Read control messages from stdin")
+    parser.add_argument("--drain-timeout", type=float, default=30, help="Seconds to drain connections on shutdown")
+    return parser.parse_args()
+
+def main():
+    """Run the proxy worker until it is told to stop"""
+    args = parse_args()
+    setup_logging(logging.INFO, log_dir=None)
+
+    listen_socket = None
+    if args.listen_fd is not None:
+        listen_socket = socket.socket(fileno=args.listen_fd)
+
+    proxy = EmbeddedProxy(
+        args.listen_host, args.listen_port,
+        config=load_config(args.config),
+        listen_socket=listen_socket
+    )
+
+    stop_requested = threading.Event()
+    signal.signal(signal.SIGTERM, lambda sig, frame: stop_requested.set())
+    signal.signal(signal.SIGINT, lambda sig, frame: stop_requested.set())
+
+    try:
+        proxy.start()
+    except RuntimeError as e:
+        logger.error(str(e))
+        return 1
+
+    if args.control_stdin:
+        # New configurations pushed by the service apply without a restart
+        def apply_config(message):
+            proxy.apply_config(validate_config(message["config"]))
+        # Unbuffered, a buffered reader blocked in a daemon thread aborts interpreter shutdown
+        control = open(sys.stdin.fileno(), "rb", buffering=0, closefd=False)
+        ControlListener(control, {CONFIG: apply_config}).start()
+
+    if args.ready_file:
+        with open(args.ready_file, "w") as f:
+            f.write(str(os.getpid()))
+
+    while proxy.is_alive() and not stop_requested.wait(1):
+        pass
+
+    if not stop_requested.is_set():
+        logger.error("Proxy stopped unexpectedly")
+        return 1
+
+    logger.info("Proxy worker draining connections...")
+    proxy.drain(args.drain_timeout)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+def turn_digest(text, version=b""):
+    """
+    64-bit digest identifying a conversation turn
+
+    Args:
+        text (str): Turn text
+        version (bytes): Version of the detectors that scanned it, so
+            turns are scanned again when rules or thresholds change
+
+    Returns:
+        int: The digest
+    """
+    digest = hashlib.blake2b(version, digest_size=8)
+    digest.update(text.encode("utf-8"))
+    return int.from_bytes(digest.digest(), "little")
+
+class Session:
+    """Risk state of one conversation or client"""
+
+    __slots__ = ("risk", "updated", "seen", "turns", "requests", "detections")
+
+    def __init__(self, now):
+        self.risk = 0.0
+        # When the risk was last updated, and when the session was last used
+        self.updated = now
+        self.seen = now
+        # Insertion-ordered digests of turns already scanned clean
+        self.turns = {}
+        self.requests = 0
+        self.detections = 0
+
+    def decayed_risk(self, now, half_life):
+        """Risk score decayed to the given time"""
+        if half_life <= 0 or now <= self.updated:
+            return self.risk
+        return self.risk * 0.5 ** ((now - self.updated) / half_life)
+
+class SessionStore:
+    """Bounded in-memory session state with TTL and LRU eviction"""
+
+    def __init__(self, max_sessions=100000, ttl=3600, half_life=600, max_turns=256):
+        """
+        Initialize the session store
+
+        Sessions are kept in least recently used order, so both the
+        least recently used and the expired ones sit at the front and every
+        operation is O(1) amortized.
+
+        Args:
+            max_sessions (int): Most sessions kept, least recently used
+                ones are evicted beyond that
+            ttl (float): Seconds after which an idle session is dropped
+            half_life (float): Seconds for the risk score to halve
+            max_turns (int): Most turn digests remembered per session
+        """
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.half_life = half_life
+        self.max_turns = max_turns
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def _get(self, key, now):
+        """Session for a key, created if needed, marked as most recently used"""
+        session = self.sessions.get(key)
+        if session is None or now - session.seen > self.ttl:
+            session = Session(now)
+            self.sessions[key] = session
+        session.seen = now
+        self.sessions.move_to_end(key)
+        self._evict(now)
+        return session
+
+    def _evict(self, now):
+        """Drop expired sessions and the least recently used ones over the cap"""
+        sessions = self.sessions
+        while sessions:
+            key, oldest = next(iter(sessions.items()))
+            if len(sessions) <= self.max_sessions and now - oldest.seen <= self.ttl:
+                break
+            del sessions[key]
+            self.evictions += 1
+
+    def risk(self, key):
+        """
+        Current risk score of a session
+
+        Args:
+            key (str): Session key
+
+        Returns:
+            float: Decayed risk score, 0 for unknown sessions
+        """
+        now = time.monotonic()
+        with self.lock:
+            session = self.sessions.get(key)
+            if session is None or now - session.seen > self.ttl:
+                return 0.0
+            return session.decayed_risk(now, self.half_life)
+
+    def new_turns(self, key, digests):
+        """
+        Which turns have not been scanned clean in this session yet
+
+        Args:
+            key (str): Session key
+            digests (list): Turn digests of a request
+
+        Returns:
+            list: Booleans, True for turns that still need scanning
+        """
+        now = time.monotonic()
+        with self.lock:
+            turns = self._get(key, now).turns
+            return [digest not in turns for digest in digests]
+
+    def record(self, key, clean_digests, signal, detected=False):
+        """
+        Update a session after a request was analyzed
+
+        Args:
+            key (str): Session key
+            clean_digests (list): Digests of turns scanned clean
+            signal (float): Risk contributed by the request, from its
+                detections only
+            detected (bool): Whether the request had a detection
+
+        Returns:
+            float: The updated risk score
+        """
+        now = time.monotonic()
+        with self.lock:
+            session = self._get(key, now)
+            session.risk = session.decayed_risk(now, self.half_life) + signal
+            session.updated = now
+            session.requests += 1
+            if detected:
+                session.detections += 1
+
+            turns = session.turns
+            for digest in clean_digests:
+                turns[digest] = None
+            while len(turns) > self.max_turns:
+                del turns[next(iter(turns))]
+            return session.risk
+
+    def __len__(self):
+        return len(self.sessions)
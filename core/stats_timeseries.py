@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import threading
+from array import array
+
+# Upper bounds of the analysis latency buckets, in milliseconds
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, float("inf"))
+LATENCY_LABELS = tuple("inf" if bound == float("inf") else f"{bound}ms" for bound in LATENCY_BUCKETS_MS)
+
+# Resolutions kept: name, seconds per bucket, buckets kept
+RESOLUTIONS = (
+    ("second", 1, 300),
+    ("minute", 60, 1440),
+    ("hour", 3600, 720),
+)
+
+# Counters recorded per bucket
+COUNTERS = ("requests", "ai_requests", "detections", "blocked", "shed")
+
+# Distinct detection types counted separately, the rest count as "other"
+MAX_THREAT_TYPES = 16
+
+def latency_bucket(seconds):
+    """Index of the latency bucket a duration falls in"""
+    ms = seconds * 1000
+    for i, bound in enumerate(LATENCY_BUCKETS_MS):
+        if ms <= bound:
+            return i
+    return len(LATENCY_BUCKETS_MS) - 1
+
+class StatsTimeSeries:
+    """
+    Fixed-size ring buffers of per-second, per-minute and per-hour counters
+
+    Every tier is one flat array of counters, a row per bucket, and an array
+    of the bucket number each row currently holds. A row is reset when the
+    ring wraps onto it, so memory is fixed however long the proxy runs.
+    Counts are added to all tiers at once, the minute and hour tiers hold
+    the sums of the finer tiers over a longer history.
+    """
+
+    def __init__(self, resolutions=RESOLUTIONS):
+        """
+        Args:
+            resolutions (tuple): (name, seconds per bucket, buckets kept)
+                for each tier, finest first
+        """
+        self.latency_labels = list(LATENCY_LABELS)
+        self.threat_types = {}
+        self.columns = (
+            list(COUNTERS)
+            + [f"latency_{label}" for label in self.latency_labels]
+            + [f"type_{i}" for i in range(MAX_THREAT_TYPES)]
+        )
+        self.latency_offset = len(COUNTERS)
+        self.type_offset = self.latency_offset + len(LATENCY_BUCKETS_MS)
+
+        self.tiers = {}
+        for name, step, length in resolutions:
+            self.tiers[name] = {
+                "step": step,
+                "length": length,
+                "stamps": array("q", [-1]) * length,
+                "counts": array("Q", [0]) * (length * len(self.columns)),
+            }
+        self.lock = threading.Lock()
+
+    def _add(self, column, count, now):
+        """Add to one column of the current bucket of every tier"""
+        width = len(self.columns)
+        with self.lock:
+            for tier in self.tiers.values():
+                bucket = int(now // tier["step"])
+                slot = bucket % tier["length"]
+                row = slot * width
+                stamp = tier["stamps"][slot]
+                if stamp > bucket:
+                    # Older than the tier's history, would clobber newer counts
+                    continue
+                if stamp != bucket:
+                    tier["stamps"][slot] = bucket
+                    tier["counts"][row:row + width] = array("Q", [0]) * width
+                tier["counts"][row + column] += count
+
+    def record(self, counter, count=1, now=None):
+        """
+        Count an event
+
+        Args:
+            counter (str): One of COUNTERS
+            count (int): Number of events
+            now (float, optional): Event time, defaults to the current time
+        """
+        self._add(COUNTERS.index(counter), count, time.time() if now is None else now)
+
+    def record_latency(self, seconds, now=None):
+        """
+        Count an analysis latency in its bucket
+
+        Args:
+            seconds (float): Analysis time
+            now (float, optional): Event time, defaults to the current time
+        """
+        self._add(self.latency_offset + latency_bucket(seconds), 1, time.time() if now is None else now)
+
+    def record_detection(self, threat_type, now=None):
+        """
+        Count a detection, in total and by threat type
+
+        Args:
+            threat_type (str): Detected threat type
+            now (float, optional): Event time, defaults to the current time
+        """
+        now = time.time() if now is None else now
+        self._add(COUNTERS.index("detections"), 1, now)
+        self._add(self.type_offset + self._type_column(threat_type or "unknown"), 1, now)
+
+    def _type_column(self, threat_type):
+        """Column of a threat type, the last one collects types over the limit"""
+        with self.lock:
+            column = self.threat_types.get(threat_type)
+            if column is None:
+                if len(self.threat_types) >= MAX_THREAT_TYPES - 1:
+                    return MAX_THREAT_TYPES - 1
+                column = len(self.threat_types)
+                self.threat_types[threat_type] = column
+            return column
+
+    def query(self, resolution="second", since=None, until=None):
+        """
+        Counters of one tier over a time range
+
+        Args:
+            resolution (str): Tier name, "second", "minute" or "hour"
+            since (float, optional): Start time, defaults to the oldest
+                bucket kept
+            until (float, optional): End time, defaults to now
+
+        Returns:
+            dict: The tier's bucket size and one point per bucket, missing
+                buckets count zero
+        """
+        tier = self.tiers[resolution]
+        step, length = tier["step"], tier["length"]
+        width = len(self.columns)
+        last = int((time.time() if until is None else until) // step)
+        first = last - length + 1
+        if since is not None:
+            first = max(first, int(since // step))
+
+        type_names = {column: name for name, column in self.threat_types.items()}
+        if len(self.threat_types) >= MAX_THREAT_TYPES - 1:
+            type_names[MAX_THREAT_TYPES - 1] = "other"
+
+        points = []
+        with self.lock:
+            for bucket in range(first, last + 1):
+                slot = bucket % length
+                if tier["stamps"][slot] == bucket:
+                    row = tier["counts"][slot * width:(slot + 1) * width].tolist()
+                else:
+                    row = [0] * width
+                point = {"time": bucket * step}
+                point.update(zip(COUNTERS, row))
+                point["latency"] = dict(zip(
+                    self.latency_labels, row[self.latency_offset:self.type_offset]
+                ))
+                point["threat_types"] = {
+                    type_names[column]: count
+                    for column, count in enumerate(row[self.type_offset:])
+                    if count and column in type_names
+                }
+                points.append(point)
+        return {"resolution": resolution, "step": step, "points": points}
+
+    def save(self, path):
+        """
+        Write the buckets in use to a JSON file, for other processes to query
+
+        Args:
+            path (str): File to write, replaced atomically
+        """
+        width = len(self.columns)
+        with self.lock:
+            state = {
+                "threat_types": dict(self.threat_types),
+                "tiers": {
+                    name: [
+                        [bucket] + tier["counts"][slot * width:(slot + 1) * width].tolist()
+                        for slot, bucket in enumerate(tier["stamps"]) if bucket >= 0
+                    ]
+                    for name, tier in self.tiers.items()
+                },
+            }
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read buckets written by save()
+
+        Args:
+            path (str): File to read
+
+        Returns:
+            StatsTimeSeries: The restored time series
+        """
+        with open(path, "r") as f:
+            state = json.load(f)
+        series = cls()
+        series.threat_types = state.get("threat_types", {})
+        width = len(series.columns)
+        for name, rows in state.get("tiers", {}).items():
+            tier = series.tiers.get(name)
+            if tier is None:
+                continue
+            for row in rows:
+                if len(row) != width + 1:
+                    continue
+                slot = row[0] % tier["length"]
+                tier["stamps"][slot] = row[0]
+                tier["counts"][slot * width:(slot + 1) * width] = array("Q", row[1:])
+        return series
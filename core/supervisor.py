@@ -0,0 +1,250 @@
+import os
+import time
+import socket
+import signal
+import logging
+import platform
+import threading
+import subprocess
+from core.control_channel import send_message
+
+logger = logging.getLogger(__name__)
+
+class WorkerSupervisor:
+    """Supervise a worker process with health checks, backoff and hand-off"""
+
+    def __init__(self, name, host, port, build_command, health_check, config=None,
+                 run_dir="data/run", log_dir="data/logs", control=False):
+        """
+        Initialize the supervisor
+
+        Args:
+            name (str): Worker name used in logs and file names
+            host (str): Host the worker listens on
+            port (int): Port the worker listens on
+            build_command (callable): Returns the worker command line, gets
+                the inherited socket's file descriptor (or None) and the
+                ready file path
+            health_check (callable): Returns True if the running worker is
+                healthy
+            config (dict, optional): Configuration dictionary
+            run_dir (str): Directory for ready files
+            log_dir (str): Directory for worker output
+            control (bool): Give workers a control pipe on their stdin
+        """
+        config = config or {}
+        self.name = name
+        self.host = host
+        self.port = port
+        self.build_command = build_command
+        self.health_check = health_check
+        self.run_dir = run_dir
+        self.log_dir = log_dir
+        self.control = control
+
+        self.startup_timeout = config.get("startup_timeout", 10)
+        self.drain_timeout = config.get("drain_timeout", 30)
+        self.max_health_failures = config.get("health_check_failures", 3)
+        self.backoff_initial = config.get("restart_backoff_initial", 0.5)
+        self.backoff_max = config.get("restart_backoff_max", 30)
+        # A worker that stays healthy this long resets the backoff
+        self.stable_after = config.get("restart_stable_after", 60)
+
+        # Hand-off needs an inheritable listening socket
+        self.handoff = platform.system() != "Windows"
+
+        self.listen_socket = None
+        self.process = None
+        self.started_at = 0
+        self.health_failures = 0
+        self.restart_attempts = 0
+        self.next_restart_at = 0
+        self.lock = threading.RLock()
+
+    def start(self):
+        """
+        Bind the listening socket and start the first worker
+
+        Raises:
+            RuntimeError: If the worker did not become ready
+        """
+        with self.lock:
+            if self.handoff and self.listen_socket is None:
+                self.listen_socket = self._bind()
+            self.process = self._spawn()
+            self.started_at = time.monotonic()
+            self.health_failures = 0
+
+    def _bind(self):
+        """Create the listening socket shared by successive workers"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(socket.SOMAXCONN)
+        sock.set_inheritable(True)
+        return sock
+
+    def _spawn(self):
+        """Start a worker process and wait until it reports ready"""
+        os.makedirs(self.run_dir, exist_ok=True)
+        os.makedirs(self.log_dir, exist_ok=True)
+        ready_file = os.path.join(self.run_dir, f"{self.name}-{time.monotonic_ns()}.ready")
+        fd = self.listen_socket.fileno() if self.listen_socket else None
+
+        with open(os.path.join(self.log_dir, f"{self.name}.log"), "ab") as log:
+            process = subprocess.Popen(
+                self.build_command(fd, ready_file),
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                stdin=subprocess.PIPE if self.control else None,
+                pass_fds=(fd,) if fd is not None else ()
+            )
+
+        try:
+            deadline = time.monotonic() + self.startup_timeout
+            while not os.path.exists(ready_file):
+                if process.poll() is not None or time.monotonic() > deadline:
+                    self._terminate(process, wait=True)
+                    raise RuntimeError(f"{self.name} worker failed to start")
+                time.sleep(0.02)
+        finally:
+            if os.path.exists(ready_file):
+                os.remove(ready_file)
+
+        logger.info(f"{self.name} worker {process.pid} is ready")
+        return process
+
+    def check(self):
+        """
+        Health-check the worker and restart it with backoff if needed
+
+        Returns:
+            bool: Whether the worker is healthy
+        """
+        with self.lock:
+            if self.process is None:
+                return self._restart_due()
+
+            if self.process.poll() is not None:
+                logger.error(f"{self.name} worker exited with code {self.process.returncode}")
+                self.process = None
+                self._schedule_restart()
+                return self._restart_due()
+
+            if self.health_check():
+                self.health_failures = 0
+                if time.monotonic() - self.started_at > self.stable_after:
+                    self.restart_attempts = 0
+                return True
+
+            self.health_failures += 1
+            logger.warning(
+                f"{self.name} worker failed health check "
+                f"({self.health_failures}/{self.max_health_failures})"
+            )
+            if self.health_failures >= self.max_health_failures:
+                self._terminate(self.process, wait=False)
+                self.process = None
+                self._schedule_restart()
+                return self._restart_due()
+            return False
+
+    def _schedule_restart(self):
+        """Compute when the next restart attempt may happen"""
+        delay = min(self.backoff_initial * (2 ** self.restart_attempts), self.backoff_max)
+        self.restart_attempts += 1
+        self.next_restart_at = time.monotonic() + delay
+        logger.info(f"Restarting {self.name} worker in {delay:.1f}s")
+
+    def _restart_due(self):
+        """Restart the worker if its backoff delay has passed"""
+        if time.monotonic() < self.next_restart_at:
+            return False
+        try:
+            self.start()
+            return True
+        except RuntimeError as e:
+            logger.error(str(e))
+            self._schedule_restart()
+            return False
+
+    def reload(self):
+        """
+        Replace the worker without dropping connections
+
+        The new worker starts on the same listening socket, and the old
+        one is only told to drain once the new one is serving.
+
+        Returns:
+            bool: Success or failure
+        """
+        with self.lock:
+            old = self.process
+            if not self.handoff:
+                if old:
+                    self._terminate(old, wait=True)
+                self.process = None
+                return self._restart_due()
+
+            try:
+                self.process = self._spawn()
+            except RuntimeError as e:
+                logger.error(f"Hand-off failed, keeping the current worker: {str(e)}")
+                self.process = old
+                return False
+
+            self.started_at = time.monotonic()
+            self.health_failures = 0
+            if old:
+                self._terminate(old, wait=False)
+            return True
+
+    def send(self, message):
+        """
+        Send a message over the running worker's control pipe
+
+        Args:
+            message (dict): Message with a "type" key
+
+        Returns:
+            bool: Whether the message was delivered to a running worker
+        """
+        with self.lock:
+            if not self.control or self.process is None or self.process.poll() is not None:
+                return False
+            return send_message(self.process.stdin, message)
+
+    def _terminate(self, process, wait):
+        """Ask a worker to drain and exit, killing it if it does not"""
+        if process.poll() is not None:
+            return
+        try:
+            if platform.system() == 'Windows':
+                process.send_signal(signal.CTRL_C_EVENT)
+            else:
+                process.terminate()
+        except OSError:
+            return
+
+        def reap():
+            try:
+                process.wait(timeout=self.drain_timeout + 5)
+            except subprocess.TimeoutExpired:
+                logger.warning(f"{self.name} worker {process.pid} did not exit, killing it")
+                process.kill()
+                process.wait()
+
+        if wait:
+            reap()
+        else:
+            threading.Thread(target=reap, daemon=True).start()
+
+    def stop(self):
+        """Stop the worker and close the listening socket"""
+        with self.lock:
+            if self.process:
+                self._terminate(self.process, wait=True)
+                self.process = None
+            if self.listen_socket:
+                self.listen_socket.close()
+                self.listen_socket = None
@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+class VerdictCache(ABC):
+    """
+    Interface of verdict cache backends
+
+    Keys are bytes digests of the analyzed text and the detector version,
+    values are JSON-serializable dicts. A backend shared between worker
+    processes (on disk, or over the network) lets one worker reuse what
+    another already analyzed.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys):
+        """
+        Look up several keys at once
+
+        Args:
+            keys (list): Cache keys
+
+        Returns:
+            dict: Values of the keys found and not expired
+        """
+        found = self._get_many(keys) if keys else {}
+        with self.lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items):
+        """
+        Store several values
+
+        Args:
+            items (dict): Values by key
+        """
+        if items:
+            self._put_many(items)
+
+    @abstractmethod
+    def _get_many(self, keys):
+        """Values of the keys found and not expired, keys is not empty"""
+
+    @abstractmethod
+    def _put_many(self, items):
+        """Store values by key, items is not empty"""
+
+    @abstractmethod
+    def size(self):
+        """Number of stored entries"""
+
+    def close(self):
+        """Release the backend's resources"""
+
+    def report(self):
+        """
+        Cache statistics
+
+        Returns:
+            dict: Hits, misses, hit rate and size
+        """
+        with self.lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "backend": self.name,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "entries": self.size(),
+        }
+
+class MemoryVerdictCache(VerdictCache):
+    """Process-local cache, also the stand-in for networked backends"""
+
+    name = "memory"
+
+    def __init__(self, max_entries=100000, ttl=86400):
+        """
+        Args:
+            max_entries (int): Most entries kept, least recently used ones
+                are evicted beyond that
+            ttl (float): Seconds an entry stays valid
+        """
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+
+    def _get_many(self, keys):
+        now = time.time()
+        found = {}
+        with self.lock:
+            for key in keys:
+                entry = self.entries.get(key)
+                if entry is None:
+                    continue
+                expires, value = entry
+                if expires < now:
+                    del self.entries[key]
+                    continue
+                self.entries.move_to_end(key)
+                found[key] = value
+        return found
+
+    def _put_many(self, items):
+        expires = time.time() + self.ttl
+        with self.lock:
+            for key, value in items.items():
+                self.entries[key] = (expires, value)
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def size(self):
+        return len(self.entries)
+
+class SQLiteVerdictCache(VerdictCache):
+    """Cache in a local SQLite database in WAL mode, shared by worker processes"""
+
+    name = "sqlite"
+
+    # Puts between two pruning passes
+    PRUNE_EVERY = 500
+    # Keys looked up per query
+    QUERY_KEYS = 500
+
+    def __init__(self, path="data/cache/verdicts.sqlite3", max_entries=200000, ttl=86400):
+        """
+        Args:
+            path (str): Database file, created if needed
+            max_entries (int): Most entries kept, the oldest are pruned
+                beyond that
+            ttl (float): Seconds an entry stays valid
+        """
+        super().__init__()
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.local = threading.local()
+        self.puts = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._connection()
+        # WAL lets readers in every worker run alongside one writer
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts ("
+            "key BLOB PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS verdicts_expires ON verdicts (expires)")
+        conn.commit()
+
+    def _connection(self):
+        """SQLite connection of the calling thread"""
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def _get_many(self, keys):
+        now = time.time()
+        conn = self._connection()
+        rows = []
+        try:
+            # Stay under SQLite's limit on query parameters
+            for start in range(0, len(keys), self.QUERY_KEYS):
+                chunk = keys[start:start + self.QUERY_KEYS]
+                rows.extend(conn.execute(
+                    f"SELECT key, value FROM verdicts WHERE expires >= ? AND key IN ({','.join('?' * len(chunk))})",
+                    [now, *chunk]
+                ).fetchall())
+        except sqlite3.Error as e:
+            logger.error(f"Verdict cache lookup failed: {str(e)}")
+            return {}
+        return {bytes(key): json.loads(value) for key, value in rows}
+
+    def _put_many(self, items):
+        expires = time.time() + self.ttl
+        conn = self._connection()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO verdicts (key, value, expires) VALUES (?, ?, ?)",
+                    [(key, json.dumps(value), expires) for key, value in items.items()]
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Verdict cache update failed: {str(e)}")
+            return
+
+        with self.lock:
+            self.puts += len(items)
+            prune = self.puts >= self.PRUNE_EVERY
+            if prune:
+                self.puts = 0
+        if prune:
+            self.prune()
+
+    def prune(self):
+        """Delete expired entries and the oldest ones over the size cap"""
+        conn = self._connection()
+        try:
+            with conn:
+                conn.execute("DELETE FROM verdicts WHERE expires < ?", (time.time(),))
+                # Entries share one TTL, the soonest to expire are the oldest
+                conn.execute(
+                    "DELETE FROM verdicts WHERE key IN ("
+                    "SELECT key FROM verdicts ORDER BY expires "
+                    "LIMIT max(0, (SELECT count(*) FROM verdicts) - ?))",
+                    (self.max_entries,)
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Verdict cache pruning failed: {str(e)}")
+
+    def size(self):
+        try:
+            return self._connection().execute("SELECT count(*) FROM verdicts").fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+    def close(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+# Backends by the name used in the "verdict_cache" setting
+BACKENDS = {
+    "memory": MemoryVerdictCache,
+    "sqlite": SQLiteVerdictCache,
+}
+
+def create_verdict_cache(config):
+    """
+    Create the configured verdict cache backend
+
+    Args:
+        config (dict): Configuration dictionary
+
+    Returns:
+        VerdictCache: The cache, or None if caching is disabled
+    """
+    name = config.get("verdict_cache", "sqlite")
+    if not name or name == "none":
+        return None
+    if name not in BACKENDS:
+        logger.error(f"Unknown verdict cache backend: {name}")
+        return None
+
+    options = {
+        "max_entries": config.get("verdict_cache_max_entries", 200000),
+        "ttl": config.get("verdict_cache_ttl", 86400),
+    }
+    if name == "sqlite":
+        options["path"] = config.get("verdict_cache_path", "data/cache/verdicts.sqlite3")
+    try:
+        return BACKENDS[name](**options)
+    except (OSError, sqlite3.Error) as e:
+        logger.error(f"Failed to open verdict cache: {str(e)}")
+        return None
@@ -0,0 +1,134 @@
+import re
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Socket.IO and Engine.IO prefix packets with a numeric type before the JSON
+PACKET_PREFIX = re.compile(r"^\d+")
+
+# Engine.IO control packets without payload: close, ping, pong, upgrade,
+# noop, and the probes of the transport upgrade
+CONTROL_PACKET = re.compile(rb"^\s*\d(?:probe)?\s*$")
+
+class WebSocketInspector:
+    """
+    Incremental text of client-to-server WebSocket messages per connection
+
+    Web chat UIs send a prompt as one or more messages. mitmproxy joins the
+    frames of a message before the message hook runs, across messages each
+    connection keeps only the tail of its already scanned text, so a phrase
+    split between two messages is still seen in one piece while nothing
+    else of the session is retained.
+
+    The carry-over is only read and written on the event loop, in the
+    order messages arrive; analysis threads get the combined text.
+    """
+
+    def __init__(self, carry_chars=256):
+        """
+        Args:
+            carry_chars (int): Characters of earlier messages scanned again
+                with the next one
+        """
+        self.carry_chars = carry_chars
+        self.carry = {}
+
+    def text(self, connection_id, content, is_text=True):
+        """
+        Text to scan for a new message, preceded by the connection's carry-over
+
+        Its tail becomes the carry-over right away, so the next message
+        chains onto it even if it is analyzed before this one finishes.
+
+        Args:
+            connection_id (str): Connection the message was sent on
+            content (bytes): Message payload
+            is_text (bool): Whether it is a text message, binary messages
+                are decoded leniently
+
+        Returns:
+            str: Text to analyze, empty if the message has none
+        """
+        text = message_text(content, is_text)
+        if not text:
+            return ""
+        text = self.carry.get(connection_id, "") + text
+        if self.carry_chars:
+            self.carry[connection_id] = text[-self.carry_chars:]
+        return text
+
+    def detected(self, connection_id, text):
+        """
+        Drop the carry-over of a text that had a detection, it is reported once
+
+        A later message that already chained onto the text keeps its own
+        carry-over.
+
+        Args:
+            connection_id (str): Connection the message was sent on
+            text (str): Text returned by text()
+        """
+        if self.carry_chars and self.carry.get(connection_id) == text[-self.carry_chars:]:
+            del self.carry[connection_id]
+
+    def close(self, connection_id):
+        """Forget the carry-over of a connection"""
+        self.carry.pop(connection_id, None)
+
+    def __len__(self):
+        return len(self.carry)
+
+def is_control_packet(content):
+    """
+    Whether a message is a protocol control packet carrying no text
+
+    Args:
+        content (bytes): Message payload
+
+    Returns:
+        bool: True for heartbeats and similar packets
+    """
+    return len(content) <= 16 and CONTROL_PACKET.match(content) is not None
+
+def _strings(node, out):
+    """Collect the string values of decoded JSON"""
+    if isinstance(node, str):
+        if node:
+            out.append(node)
+    elif isinstance(node, dict):
+        for value in node.values():
+            _strings(value, out)
+    elif isinstance(node, list):
+        for value in node:
+            _strings(value, out)
+
+def message_text(content, is_text=True):
+    """
+    Prompt text of a WebSocket message
+
+    JSON messages, optionally behind a Socket.IO packet type, contribute
+    their string values one per line; other messages are used as text.
+
+    Args:
+        content (bytes): Message payload
+        is_text (bool): Whether it is a text message
+
+    Returns:
+        str: The text, empty for packets carrying none
+    """
+    if is_control_packet(content):
+        return ""
+    text = content.decode("utf-8", errors="replace" if is_text else "ignore")
+    payload = PACKET_PREFIX.sub("", text.lstrip(), count=1)
+    if not payload.strip():
+        # A bare packet type, such as a Socket.IO connect
+        return ""
+    if payload[:1] in ("{", "["):
+        try:
+            strings = []
+            _strings(json.loads(payload), strings)
+            return "\n".join(strings)
+        except ValueError:
+            pass
+    return text
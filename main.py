@@ -5,9 +5,7 @@ import logging
 import time
 import signal
 import threading
-from core.app_service import AISecurityProxyService
-from config.settings import load_config
-from utils.logging_utils import setup_logging
+from utils.profiling import startup_profiler
 
 def parse_args():
     """Parse command line arguments."""
@@ -15,11 +13,21 @@ def parse_args():
     parser.add_argument("--config", help="Path to the configuration file")
     parser.add_argument("--uninstall", action="store_true", help="Uninstall the proxy")
     parser.add_argument("--debug", action="store_true", help="Enable debug logging")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Log how long each startup phase takes")
     return parser.parse_args()
 
 def main():
     """Main entry point"""
     args = parse_args()
+    if args.profile_startup:
+        startup_profiler.enable()
+
+    # Imported after argument parsing so --help does not pay for them
+    with startup_profiler.phase("import modules"):
+        from core.app_service import AISecurityProxyService
+        from config.settings import load_config, validate_config, ConfigError
+        from utils.logging_utils import setup_logging
 
     # Setup logging
     log_level = logging.DEBUG if args.debug else logging.INFO
@@ -28,15 +36,22 @@ def main():
     
     # Load configuration
     config_path = args.config
-    config = load_config(config_path)
+    with startup_profiler.phase("load config"):
+        try:
+            config = validate_config(load_config(config_path))
+        except ConfigError as e:
+            logger.error(f"Invalid configuration: {str(e)}")
+            return 1
     
     # Create service instance
-    service = AISecurityProxyService(
-        proxy_host=config.get("proxy_host", "127.0.0.1"),
-        proxy_port=config.get("proxy_port", 8080),
-        api_port=config.get("api_port", 3001),
-        config=config
-    )
+    with startup_profiler.phase("create service"):
+        service = AISecurityProxyService(
+            proxy_host=config.get("proxy_host", "127.0.0.1"),
+            proxy_port=config.get("proxy_port", 8080),
+            api_port=config.get("api_port", 3001),
+            config=config,
+            config_path=config_path
+        )
     
     # Handle uninstall
     if args.uninstall:
@@ -52,16 +67,22 @@ def main():
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
     
+    # SIGHUP reloads the configuration, pushed to the running proxy when
+    # possible, otherwise handed off to fresh workers without dropping connections
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, lambda sig, frame: threading.Thread(target=service.reload).start())
+    
     # Start the service
     try:
-        if service.start():
+        started = service.start()
+        startup_profiler.report()
+        if started:
             logger.info(f"PromptShield is running on {config.get('proxy_host', '127.0.0.1')}:{config.get('proxy_port', 8080)}")
             logger.info(f"API server is running on {config.get('proxy_host', '127.0.0.1')}:{config.get('api_port', 3001)}")
             logger.info("Press Ctrl+C to stop the service.")
             
-            # Keep main thread alive
-            while True:
-                time.sleep(1)
+            # Supervise the workers until stopped
+            service.run_forever()
         else:
             logger.error("Failed to start the service.")
             return 1
@@ -0,0 +1,204 @@
+"""
+Raw request body prefilter
+
+Decides from the undecoded request body whether any rule could match, so
+that most bodies are never parsed into Python objects. Every pattern rule
+is reduced to clauses of literal words, each clause a set of alternatives
+one of which every match contains (for example "let's", "play", "game" and
+"where" for the game rule, or "create", "generate" or "write" for the
+malware rule). A body can only match a rule if all of its clauses are
+found in the lowercased body bytes, searched with plain substring searches,
+which is much faster than a case-insensitive alternation. Secret detectors
+run on the body as ASCII text.
+
+The filter only says no when that is certain. For ASCII text, normalization
+only lowercases and collapses whitespace, and JSON only escapes quotes,
+backslashes and control characters, none of which occur inside a literal
+word. Bodies with non-ASCII bytes or \\u escapes may hide homoglyphs or
+invisible characters, so they always pass. Rules without usable literals
+disable the filter.
+"""
+import re
+import logging
+from typing import FrozenSet, Iterable, List, Optional
+
+try:
+    from re import _parser as sre_parse
+    from re._constants import BRANCH, LITERAL, MAX_REPEAT, MIN_REPEAT, SUBPATTERN
+except ImportError:
+    # Python before 3.11
+    import sre_parse
+    from sre_constants import BRANCH, LITERAL, MAX_REPEAT, MIN_REPEAT, SUBPATTERN
+
+logger = logging.getLogger(__name__)
+
+# Shortest literal worth searching for, shorter ones hit nearly every body
+MIN_LITERAL_LENGTH = 3
+
+# Words too common in prompts to be useful triggers
+COMMON_WORDS = frozenset({
+    "the", "this", "that", "these", "those", "you", "your", "are", "was", "were",
+    "for", "and", "with", "from", "have", "has", "been", "not", "now", "can",
+    "will", "all", "what", "how", "give", "tell", "make", "need", "data",
+})
+
+# JSON escapes of characters that may appear next to literal words
+_JSON_ESCAPES = ((b'\\"', b'"'), (b"\\/", b"/"), (b"\\n", b"\n"), (b"\\t", b"\t"),
+                 (b"\\r", b"\r"), (b"\\b", b"\b"), (b"\\f", b"\f"))
+
+
+# Characters a literal may span besides letters and digits, JSON leaves
+# them unescaped and ASCII normalization keeps them
+WORD_PUNCTUATION = "'"
+
+# A requirement: at least one of these literals occurs in every match
+Clause = FrozenSet[str]
+
+
+def _score(clause: Clause):
+    """Rank clauses: no common words, then longest shortest literal, then fewest"""
+    return (
+        not any(literal in COMMON_WORDS for literal in clause),
+        min(len(literal) for literal in clause),
+        -len(clause),
+    )
+
+
+def _usable(clause: Clause) -> bool:
+    return min(len(literal) for literal in clause) >= MIN_LITERAL_LENGTH
+
+
+def _sequence_clauses(items) -> List[Clause]:
+    """
+    Clauses every match of a sequence satisfies, all of them at once
+
+    Runs of letters and digits are clauses by themselves, groups and
+    repeats contribute their own clauses, an alternation contributes the
+    union of its branches' best clauses.
+    """
+    clauses: List[Clause] = []
+    run = []
+
+    def close_run():
+        if run:
+            clauses.append(frozenset(["".join(run)]))
+            run.clear()
+
+    for op, av in items:
+        if op is LITERAL and chr(av).isascii() and (chr(av).isalnum() or chr(av) in WORD_PUNCTUATION):
+            run.append(chr(av).lower())
+            continue
+        close_run()
+        if op is SUBPATTERN:
+            clauses.extend(_sequence_clauses(av[3]))
+        elif op is BRANCH:
+            branches = [_best(_sequence_clauses(branch)) for branch in av[1]]
+            if all(branches):
+                clauses.append(frozenset().union(*branches))
+        elif op in (MAX_REPEAT, MIN_REPEAT) and av[0] >= 1:
+            clauses.extend(_sequence_clauses(av[2]))
+    close_run()
+    return clauses
+
+
+def _best(clauses: Iterable[Clause]) -> Optional[Clause]:
+    """Most selective usable clause, or None"""
+    clauses = [clause for clause in clauses if clause and _usable(clause)]
+    return max(clauses, key=_score) if clauses else None
+
+
+def required_literals(pattern: str) -> Optional[List[Clause]]:
+    """
+    Lowercase literal words every match of a regex contains
+
+    Args:
+        pattern (str): Regular expression
+
+    Returns:
+        list: Clauses, most selective first; every match contains at least
+            one literal of each clause. None if the regex has no usable ones
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return None
+    clauses = sorted(set(c for c in _sequence_clauses(list(parsed)) if _usable(c)), key=_score, reverse=True)
+    return clauses or None
+
+
+class BytePrefilter:
+    """Tell from raw request bytes whether the body needs to be analyzed"""
+
+    def __init__(self, pattern_analyzer=None, secret_detector=None):
+        """
+        Initialize the prefilter
+
+        Args:
+            pattern_analyzer (PatternAnalyzer, optional): Rules to derive
+                trigger literals from
+            secret_detector (SecretDetector, optional): Secret detectors,
+                run on the ASCII body
+        """
+        self.secret_detector = secret_detector
+        # Bodies checked and bodies found clean
+        self.checked = 0
+        self.skipped = 0
+        # Per rule, the clauses a body must all satisfy for it to match
+        self.triggers = []
+        # Whether every rule could be reduced to literals
+        self.complete = True
+
+        for rule in (pattern_analyzer.rules if pattern_analyzer else []):
+            clauses = required_literals(rule["regex"].pattern)
+            if clauses is None:
+                logger.info(f"Rule has no trigger literals, prefilter disabled: {rule['regex'].pattern}")
+                self.complete = False
+                break
+            self.triggers.append(tuple(
+                tuple(literal.encode("ascii") for literal in sorted(clause)) for clause in clauses
+            ))
+
+    def may_match(self, content: bytes) -> bool:
+        """
+        Whether a request body could contain a detection
+
+        Args:
+            content (bytes): Raw JSON request body
+
+        Returns:
+            bool: False only if no rule or secret detector can match
+        """
+        if not self.complete:
+            return True
+        self.checked += 1
+        if self._may_match(content):
+            return True
+        self.skipped += 1
+        return False
+
+    def _may_match(self, content: bytes) -> bool:
+        """Check a body"""
+        # Escaped or non-ASCII text may hide folded characters
+        if not content.isascii() or b"\\u" in content or b"\\\\" in content:
+            return True
+
+        if b"\\" in content:
+            for escaped, char in _JSON_ESCAPES:
+                content = content.replace(escaped, char)
+
+        lowered = content.lower()
+        # Literals shared by several rules are searched once
+        found = {}
+
+        def contains(literal):
+            hit = found.get(literal)
+            if hit is None:
+                hit = found[literal] = literal in lowered
+            return hit
+
+        for clauses in self.triggers:
+            if all(any(contains(literal) for literal in clause) for clause in clauses):
+                return True
+        if self.secret_detector is not None:
+            return self.secret_detector.verdict(content.decode("ascii")).is_dangerous
+        return False
@@ -0,0 +1,299 @@
+"""
+Tiered detector cascade
+
+Detectors run from cheapest to most expensive. Each tier looks at the
+prompts earlier tiers left undecided and, per prompt, either decides it
+(dangerous or clean) or escalates it to the next tier. Most traffic is
+settled by the cheap tiers, only ambiguous prompts reach the expensive
+ones.
+
+Every tier has a time budget per batch. A tier that runs over it stops
+taking prompts and defers the rest: they wait until every other prompt has
+been through the cascade, so a detection elsewhere in the request can end
+it early, and are then checked from that tier on without a budget. A
+deferred prompt is never passed over, skipping a tier must not make it
+clean. Budgets are checked between prompts, a single regex or batch call
+is never interrupted.
+"""
+import time
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from security.analyzers.pattern_analyzer import Verdict
+
+DANGEROUS = "dangerous"
+CLEAN = "clean"
+ESCALATE = "escalate"
+
+
+class Tier:
+    """One stage of the cascade"""
+
+    def __init__(self, name: str, check: Callable, decide: Callable[[Verdict], str],
+                 budget_ms: float = 5.0, batch: bool = False, advisory: bool = False):
+        """
+        Args:
+            name (str): Tier name used in statistics
+            check (callable): Returns a Verdict for a prompt, or a list of
+                verdicts for a list of prompts if batch is set
+            decide (callable): Maps a verdict to DANGEROUS, CLEAN or ESCALATE
+            budget_ms (float): Time budget per batch of prompts
+            batch (bool): Whether check takes all pending prompts at once
+            advisory (bool): The tier's dangerous verdicts only escalate,
+                they never flag a prompt by themselves
+        """
+        self.name = name
+        self.check = check
+        self.decide = decide
+        self.budget = budget_ms / 1000.0
+        self.batch = batch
+        self.advisory = advisory
+
+
+class DetectorCascade:
+    """Run detector tiers from cheap to expensive"""
+
+    def __init__(self, tiers: Sequence[Tier]):
+        """
+        Args:
+            tiers (list): Tiers in the order they run
+        """
+        self.tiers = list(tiers)
+        self.lock = threading.Lock()
+        self.stats = {
+            tier.name: {
+                "prompts": 0,
+                "dangerous": 0,
+                "clean": 0,
+                "escalated": 0,
+                "over_budget": 0,
+                "deferred": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+            }
+            for tier in self.tiers
+        }
+
+    def verdicts(self, prompts: Sequence[str], stop_on_first: bool = False,
+                 elevated: bool = False) -> List[Optional[Verdict]]:
+        """
+        Decide every prompt
+
+        A prompt is dangerous as soon as a tier says so. A dangerous verdict
+        an escalating tier produced is kept as a candidate, a later CLEAN
+        decision cannot override it: the prompt gets the most confident
+        candidate unless a tier finds it dangerous, and is only clean if no
+        tier matched it at all.
+
+        Args:
+            prompts (list): Prompts to check
+            stop_on_first (bool): Stop once any prompt is dangerous, the
+                prompts not settled by then get None
+            elevated (bool): The prompts come from a risky session, any
+                dangerous verdict is decisive instead of escalating
+
+        Returns:
+            list: One verdict per prompt, None for prompts that were not
+                checked
+        """
+        final: List[Optional[Verdict]] = [None] * len(prompts)
+        candidates: List[Optional[Verdict]] = [None] * len(prompts)
+        ml_scores: List[Optional[float]] = [None] * len(prompts)
+        state = (prompts, final, candidates, ml_scores, elevated, stop_on_first)
+
+        # Prompts a tier had no time for, checked after all the others
+        deferred = self._run_tiers(0, list(range(len(prompts))), state, budgeted=True)
+        for start, indices in deferred:
+            if stop_on_first and self._found(final):
+                break
+            self._run_tiers(start, indices, state, budgeted=False)
+
+        for i, verdict in enumerate(final):
+            if verdict is None:
+                continue
+            if verdict.ml_score is None:
+                verdict.ml_score = ml_scores[i]
+            # Prompts get a verdict only once their tiers have run
+            verdict.settled = True
+        return final
+
+    @staticmethod
+    def _found(final) -> bool:
+        """Whether any prompt was found dangerous"""
+        return any(v is not None and v.is_dangerous for v in final)
+
+    def _run_tiers(self, start: int, pending: List[int], state, budgeted: bool):
+        """
+        Run prompts through the tiers from the start-th on
+
+        Prompts still undecided after the last tier get the most confident
+        dangerous verdict an escalating tier produced, or a clean one.
+
+        Returns:
+            list: (tier index, prompt indices) of prompts deferred by tiers
+                that ran over their budget, empty if not budgeted
+        """
+        prompts, final, candidates, ml_scores, elevated, stop_on_first = state
+        deferred = []
+        for position in range(start, len(self.tiers)):
+            if not pending:
+                break
+            decided, skipped = self._run_tier(
+                self.tiers[position], prompts, pending, final, candidates, ml_scores, elevated, budgeted
+            )
+            if skipped:
+                deferred.append((position, skipped))
+            skipped = set(skipped)
+            pending = [i for i in pending if i not in decided and i not in skipped]
+            if stop_on_first and self._found(final):
+                return []
+
+        for i in pending:
+            final[i] = candidates[i] or Verdict(None, prompts[i], None)
+        return deferred
+
+    def _run_tier(self, tier: Tier, prompts, pending, final, candidates, ml_scores, elevated, budgeted=True):
+        """
+        Run one tier on the pending prompts
+
+        Returns:
+            tuple: (indices it settled, indices it had no time for)
+        """
+        started = time.perf_counter()
+        deadline = started + tier.budget
+        decided = set()
+        skipped = []
+        counts = {DANGEROUS: 0, CLEAN: 0, ESCALATE: 0}
+
+        if tier.batch:
+            results = list(zip(pending, tier.check([prompts[i] for i in pending])))
+        else:
+            results = []
+            for n, i in enumerate(pending):
+                if budgeted and time.perf_counter() > deadline:
+                    skipped = pending[n:]
+                    break
+                results.append((i, tier.check(prompts[i])))
+
+        for i, verdict in results:
+            if verdict.ml_score is not None:
+                ml_scores[i] = verdict.ml_score
+            decision = tier.decide(verdict)
+            if tier.advisory:
+                decision = ESCALATE if decision == DANGEROUS else decision
+            elif elevated and decision == ESCALATE and verdict.is_dangerous:
+                decision = DANGEROUS
+            counts[decision] += 1
+            if decision == DANGEROUS:
+                final[i] = verdict
+                decided.add(i)
+            elif decision == CLEAN:
+                # A clean verdict does not outweigh an earlier tier's match
+                final[i] = candidates[i] or verdict
+                decided.add(i)
+            elif verdict.is_dangerous and not tier.advisory:
+                # Not conclusive, kept in case no later tier settles it
+                best = candidates[i]
+                if best is None or verdict.confidence > best.confidence:
+                    candidates[i] = verdict
+
+        elapsed = time.perf_counter() - started
+        self._record(tier.name, len(results), counts, len(skipped), elapsed, budgeted and elapsed > tier.budget)
+        return decided, skipped
+
+    def _record(self, name, prompts, counts, deferred, elapsed, over_budget):
+        """Update the statistics of a tier"""
+        elapsed_ms = elapsed * 1000
+        with self.lock:
+            stats = self.stats[name]
+            stats["prompts"] += prompts
+            stats["dangerous"] += counts[DANGEROUS]
+            stats["clean"] += counts[CLEAN]
+            stats["escalated"] += counts[ESCALATE]
+            stats["deferred"] += deferred
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+            if over_budget:
+                stats["over_budget"] += 1
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Per-tier statistics with hit rates and mean latency
+
+        Returns:
+            dict: Statistics keyed by tier name
+        """
+        with self.lock:
+            report = {}
+            for name, stats in self.stats.items():
+                entry = dict(stats)
+                prompts = stats["prompts"]
+                entry["hit_rate"] = round(stats["dangerous"] / prompts, 4) if prompts else 0.0
+                entry["escalation_rate"] = round(stats["escalated"] / prompts, 4) if prompts else 0.0
+                entry["mean_ms"] = round(stats["total_ms"] / prompts, 4) if prompts else 0.0
+                entry["total_ms"] = round(stats["total_ms"], 3)
+                entry["max_ms"] = round(stats["max_ms"], 3)
+                report[name] = entry
+            return report
+
+
+def build_cascade(config: Dict[str, Any], pattern_analyzer=None, secret_detector=None,
+                  classifier=None, similarity_analyzer=None) -> DetectorCascade:
+    """
+    Build the default cascade from the available detectors
+
+    Tiers, cheapest first: secrets, rules, classifier, similarity. A rule
+    match below pattern_decisive_confidence is ambiguous and escalates, and
+    so does a secret below it or below block_min_confidence (an email
+    address, a password-like assignment): the injection tiers still check
+    the prompt, and it keeps the secret as a candidate if they find
+    nothing more confident. The
+    classifier is advisory: a score below ml_clean_below settles the prompt
+    as clean, any other score escalates it to the similarity tier, and its
+    score feeds session risk, but it never flags a prompt on its own.
+
+    Args:
+        config (dict): Configuration dictionary
+        pattern_analyzer (PatternAnalyzer, optional): Rule tier
+        secret_detector (SecretDetector, optional): Secret tier
+        classifier (MLClassifier, optional): Classifier tier
+        similarity_analyzer (SimilarityAnalyzer, optional): Similarity tier
+
+    Returns:
+        DetectorCascade: The cascade
+    """
+    budgets = config.get("cascade_budgets_ms", {})
+    decisive = config.get("pattern_decisive_confidence", 0.8)
+    secret_decisive = max(decisive, config.get("block_min_confidence", 0.7))
+    clean_below = config.get("ml_clean_below", 0.2)
+    tiers = []
+
+    if secret_detector:
+        tiers.append(Tier(
+            "secrets", secret_detector.verdict,
+            lambda v: DANGEROUS if v.is_dangerous and v.confidence >= secret_decisive else ESCALATE,
+            budgets.get("secrets", 5.0)
+        ))
+
+    if pattern_analyzer:
+        tiers.append(Tier(
+            "patterns", pattern_analyzer.verdict,
+            lambda v: DANGEROUS if v.is_dangerous and v.confidence >= decisive else ESCALATE,
+            budgets.get("patterns", 5.0)
+        ))
+
+    if classifier:
+        tiers.append(Tier(
+            "classifier", classifier.verdicts,
+            lambda v: CLEAN if v.ml_score < clean_below else ESCALATE,
+            budgets.get("classifier", 10.0), batch=True, advisory=True
+        ))
+
+    if similarity_analyzer:
+        # Last tier, whatever it says settles the prompt
+        tiers.append(Tier(
+            "similarity", similarity_analyzer.verdict,
+            lambda v: DANGEROUS if v.is_dangerous else CLEAN,
+            budgets.get("similarity", 20.0)
+        ))
+
+    return DetectorCascade(tiers)
@@ -0,0 +1,309 @@
+"""
+Lightweight prompt injection classifier
+
+A logistic regression over hashed character n-grams of the normalized
+prompt. Feature hashing and scoring are vectorized with NumPy: the n-gram
+hashes of a whole batch of prompts are computed as array operations,
+weights are gathered by index and summed per prompt with bincount, so no
+feature vector or vocabulary is ever materialized.
+
+A model is a weights file in .npy format, memory-mapped read-only, and a
+JSON file with the hashing parameters, bias and calibration. Raw scores
+are mapped to probabilities with Platt scaling fitted on held-out
+examples, so the score can be read next to PatternAnalyzer's confidence.
+The small training corpus makes false positives likely, so in the detector
+cascade the score only escalates prompts and adds to session risk; it
+never blocks a request by itself.
+
+NumPy is an optional dependency (pip install promptshield[ml]).
+"""
+import os
+import json
+import random
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from security.analyzers.pattern_analyzer import Verdict
+from security.analyzers.results import AnalysisResult
+from security.normalizers.text_normalizer import normalize_text
+
+logger = logging.getLogger(__name__)
+
+FNV_OFFSET = np.uint32(2166136261)
+FNV_PRIME = np.uint32(16777619)
+
+
+class HashedNgramFeaturizer:
+    """Map texts to hashed character n-gram indices"""
+
+    def __init__(self, bits: int = 18, ngram_range: Tuple[int, int] = (3, 5)):
+        """
+        Args:
+            bits (int): Feature space size as a power of two
+            ngram_range (tuple): Smallest and largest n-gram length
+        """
+        self.bits = bits
+        self.ngram_range = tuple(ngram_range)
+
+    def indices(self, text: str) -> np.ndarray:
+        """
+        Feature indices of every n-gram of a text, repeated n-grams repeat
+
+        Args:
+            text (str): Text to featurize
+
+        Returns:
+            numpy.ndarray: uint32 indices
+        """
+        codes = np.frombuffer(normalize_text(text).text.encode("utf-32-le"), dtype=np.uint32)
+        shift = np.uint32(32 - self.bits)
+        parts = []
+        with np.errstate(over="ignore"):
+            for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+                count = len(codes) - n + 1
+                if count <= 0:
+                    break
+                # FNV-1a over each window, seeded by n so lengths do not collide
+                h = np.full(count, FNV_OFFSET ^ np.uint32(n), dtype=np.uint32)
+                for k in range(n):
+                    h ^= codes[k:k + count]
+                    h *= FNV_PRIME
+                parts.append(h >> shift)
+        if not parts:
+            return np.empty(0, dtype=np.uint32)
+        return np.concatenate(parts)
+
+    def batch(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Feature indices of a batch of texts
+
+        Returns:
+            tuple: (indices, row of each index, n-gram count per text)
+        """
+        parts = [self.indices(text) for text in texts]
+        counts = np.array([len(part) for part in parts], dtype=np.int64)
+        rows = np.repeat(np.arange(len(parts)), counts)
+        indices = np.concatenate(parts) if parts else np.empty(0, dtype=np.uint32)
+        return indices, rows, counts
+
+
+class MLClassifier:
+    """Score prompts for injection with a hashed n-gram linear model"""
+
+    def __init__(self, model_path: str, threshold: float = 0.8):
+        """
+        Initialize the classifier
+
+        Args:
+            model_path (str): Model path without extension, reads
+                <model_path>.npy and <model_path>.json
+            threshold (float): Calibrated score from which a prompt is
+                considered dangerous
+        """
+        with open(model_path + ".json", "r") as f:
+            meta = json.load(f)
+        self.weights = np.load(model_path + ".npy", mmap_mode="r")
+        self.featurizer = HashedNgramFeaturizer(meta["bits"], meta["ngram_range"])
+        if len(self.weights) != 1 << self.featurizer.bits:
+            raise ValueError(f"{model_path} weights do not match its feature size")
+        self.bias = meta["bias"]
+        self.platt_a = meta.get("platt_a", 1.0)
+        self.platt_b = meta.get("platt_b", 0.0)
+        self.threshold = threshold
+
+    def score_batch(self, prompts: Sequence[str]) -> np.ndarray:
+        """
+        Calibrated injection probability of each prompt
+
+        Args:
+            prompts (list): Prompts to score
+
+        Returns:
+            numpy.ndarray: Probabilities in prompt order
+        """
+        if not prompts:
+            return np.empty(0)
+        indices, rows, counts = self.featurizer.batch(prompts)
+        sums = np.bincount(rows, weights=self.weights[indices], minlength=len(prompts))
+        raw = self.bias + sums / np.sqrt(np.maximum(counts, 1))
+        return 1.0 / (1.0 + np.exp(-(self.platt_a * raw + self.platt_b)))
+
+    def score(self, prompt: str) -> float:
+        """Calibrated injection probability of a prompt"""
+        return float(self.score_batch([prompt])[0])
+
+    def _rule(self, score: float) -> Dict[str, Any]:
+        """Describe a positive score like a PatternAnalyzer rule"""
+        return {
+            "type": "LLM01_prompt_injection",
+            "description": f"Classified as prompt injection (score {score:.2f})",
+            "confidence": round(score, 2),
+        }
+
+    def verdicts(self, prompts: Sequence[str]) -> List[Verdict]:
+        """
+        Verdicts for a batch of prompts, scored together
+
+        Args:
+            prompts (list): Prompts to classify
+
+        Returns:
+            list: One Verdict per prompt, each with its ml_score set
+        """
+        results = []
+        for prompt, score in zip(prompts, self.score_batch(prompts).tolist()):
+            verdict = Verdict(self, prompt, None, self._rule(score) if score >= self.threshold else None)
+            verdict.ml_score = score
+            results.append(verdict)
+        return results
+
+    def verdict(self, prompt: str) -> Verdict:
+        """
+        Decide whether the prompt is an injection
+
+        Args:
+            prompt (str): The prompt to classify
+
+        Returns:
+            Verdict: Analysis verdict with its ml_score set
+        """
+        return self.verdicts([prompt])[0]
+
+    def analyze(self, prompt: str) -> AnalysisResult:
+        """
+        Classify the prompt
+
+        Args:
+            prompt (str): The prompt to classify
+
+        Returns:
+            AnalysisResult: Analysis results in the same shape as PatternAnalyzer
+        """
+        return self._analyze(prompt, None)
+
+    def _analyze(self, prompt: str, normalized: Optional[Any]) -> AnalysisResult:
+        """The classifier scores the whole prompt"""
+        score = self.score(prompt)
+        result = AnalysisResult(prompt, [self._rule(score)], preview=80)
+        result.ml_score = score
+        if score >= self.threshold:
+            result.add(0, 0, len(prompt))
+        return result
+
+
+def _sigmoid(x):
+    """Logistic function"""
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def train_model(examples: Sequence[Tuple[str, int]], model_path: str, bits: int = 18,
+                ngram_range: Tuple[int, int] = (3, 5), epochs: int = 30,
+                learning_rate: float = 0.5, l2: float = 1e-6, holdout: float = 0.2,
+                seed: int = 0) -> Dict[str, Any]:
+    """
+    Train a model with SGD and write it to disk
+
+    Args:
+        examples (list): (text, label) pairs, label 1 for injections
+        model_path (str): Model path without extension
+        bits (int): Feature space size as a power of two
+        ngram_range (tuple): Smallest and largest n-gram length
+        epochs (int): Passes over the training examples
+        learning_rate (float): SGD step size
+        l2 (float): L2 regularization strength
+        holdout (float): Share of examples kept aside for calibration
+        seed (int): Shuffle seed
+
+    Returns:
+        dict: Model metadata
+    """
+    featurizer = HashedNgramFeaturizer(bits, ngram_range)
+    examples = list(examples)
+    random.Random(seed).shuffle(examples)
+    split = int(len(examples) * (1 - holdout)) if len(examples) >= 10 else len(examples)
+    train, calibration = examples[:split], examples[split:] or examples[:split]
+
+    weights = np.zeros(1 << bits, dtype=np.float32)
+    bias = 0.0
+    featurized = [(featurizer.indices(text), label) for text, label in train]
+    rng = random.Random(seed)
+    for _ in range(epochs):
+        rng.shuffle(featurized)
+        for indices, label in featurized:
+            if not len(indices):
+                continue
+            scale = 1.0 / np.sqrt(len(indices))
+            raw = bias + float(weights[indices].sum()) * scale
+            gradient = _sigmoid(raw) - label
+            # Repeated n-grams get one update per occurrence, like their weight
+            np.subtract.at(weights, indices, learning_rate * gradient * scale)
+            weights *= (1 - learning_rate * l2)
+            bias -= learning_rate * gradient
+
+    # Platt scaling on held-out raw scores
+    texts = [text for text, _ in calibration]
+    labels = np.array([label for _, label in calibration], dtype=np.float64)
+    indices, rows, counts = featurizer.batch(texts)
+    raw = bias + np.bincount(rows, weights=weights[indices], minlength=len(texts)) / np.sqrt(np.maximum(counts, 1))
+    a, b = 1.0, 0.0
+    for _ in range(500):
+        p = _sigmoid(a * raw + b)
+        a -= 0.1 * float(np.mean((p - labels) * raw))
+        b -= 0.1 * float(np.mean(p - labels))
+
+    meta = {
+        "bits": bits,
+        "ngram_range": list(ngram_range),
+        "bias": float(bias),
+        "platt_a": a,
+        "platt_b": b,
+        "examples": len(examples),
+    }
+    os.makedirs(os.path.dirname(model_path) or ".", exist_ok=True)
+    # Write both files next to the model and swap, mapped weights stay valid
+    tmp_path = f"{model_path}.{os.getpid()}.tmp"
+    np.save(tmp_path + ".npy", weights)
+    with open(tmp_path + ".json", "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path + ".npy", model_path + ".npy")
+    os.replace(tmp_path + ".json", model_path + ".json")
+    return meta
+
+
+def load_training_corpus(path: str) -> List[Tuple[str, int]]:
+    """
+    Read labeled examples
+
+    Args:
+        path (str): JSON lines file of {"text": ..., "label": 0 or 1} objects
+
+    Returns:
+        list: (text, label) pairs
+    """
+    examples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                item = json.loads(line)
+                examples.append((item["text"], int(item["label"])))
+    return examples
+
+
+def ensure_model(corpus_path: str, model_path: str) -> bool:
+    """
+    Train the model if it is missing or older than its training corpus
+
+    Returns:
+        bool: Whether a model is available
+    """
+    try:
+        if (os.path.exists(model_path + ".npy")
+                and os.path.getmtime(model_path + ".npy") >= os.path.getmtime(corpus_path)):
+            return True
+        meta = train_model(load_training_corpus(corpus_path), model_path)
+        logger.info(f"Trained injection classifier on {meta['examples']} examples at {model_path}")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to train injection classifier: {str(e)}")
+        return os.path.exists(model_path + ".npy")
@@ -2,20 +2,58 @@ import re
 import logging
 import importlib
 from typing import List, Dict, Any
+from security.normalizers.text_normalizer import normalize_text
+from security.analyzers.results import AnalysisResult
 
 logger = logging.getLogger(__name__)
 
+class Verdict:
+    """Decision for a prompt, with full match details computed on demand"""
+
+    def __init__(self, analyzer, prompt, normalized, rule=None):
+        """
+        Args:
+            analyzer (PatternAnalyzer): Analyzer that produced the verdict
+            prompt (str): The analyzed prompt
+            normalized (NormalizedText): Normalized prompt, or None
+            rule (dict, optional): First rule that matched
+        """
+        self.is_dangerous = rule is not None
+        self.confidence = rule["confidence"] if rule else 0.0
+        self.threat_type = rule["type"] if rule else None
+        self.description = rule["description"] if rule else None
+        # JSON path of the analyzed text within the request, set by the caller
+        self.path = None
+        # Injection classifier score of the same text, when one was computed
+        self.ml_score = None
+        # Set by the detector cascade once every tier it needed has run
+        self.settled = False
+        self._analyzer = analyzer
+        self._prompt = prompt
+        self._normalized = normalized
+        self._analysis = None
+
+    @property
+    def analysis(self) -> AnalysisResult:
+        """Full analysis results, enumerated on first access"""
+        if self._analysis is None:
+            self._analysis = self._analyzer._analyze(self._prompt, self._normalized)
+        return self._analysis
+
 class PatternAnalyzer:
     """Analyze prompts using regex patterns."""
 
-    def __init__(self, pattern_modules=None):
+    def __init__(self, pattern_modules=None, normalize=True):
         """
         Initialize the pattern analyzer
-        
+
         Args:
             pattern_modules (list, optional): List of pattern module names to load
+            normalize (bool): Match against normalized text (see
+                security.normalizers.text_normalizer)
         """
         self.patterns = []
+        self.normalize = normalize
 
         # Default pattern modules
         if pattern_modules is None:
@@ -36,7 +74,60 @@ class PatternAnalyzer:
             except ImportError as e:
                 logger.error(f"Failed to load pattern module {module_name}: {str(e)}")
 
-    def analyze(self, prompt: str) -> Dict[str, Any]:
+        # Compile every rule once instead of on each analysis
+        self.rules = []
+        for pattern_info in self.patterns:
+            rule = self._compile_rule(pattern_info)
+            if rule:
+                self.rules.append(rule)
+
+        # Verdict mode tries the most confident rules first, and the
+        # cheapest among equally confident ones, so the first match decides
+        self.verdict_rules = sorted(
+            self.rules,
+            key=lambda rule: (-rule["confidence"], len(rule["regex"].pattern))
+        )
+
+    def _compile_rule(self, pattern_info: Dict[str, Any]):
+        """
+        Compile a loaded pattern into a rule
+
+        Args:
+            pattern_info (dict): Pattern entry with its source module
+
+        Returns:
+            dict: Compiled rule, or None if the regex is invalid
+        """
+        pattern = pattern_info["pattern"]
+
+        # If pattern is a dict with regex and metadata
+        if isinstance(pattern, dict):
+            regex = pattern.get("regex", "")
+            threat_type = pattern.get("type", "unknown")
+            description = pattern.get("description", "")
+            confidence = pattern.get("confidence", 0.8)
+        else:
+            # Simple string pattern
+            regex = pattern
+            threat_type = "prompt_injection"
+            description = "Potential prompt injection detected"
+            confidence = 0.8
+
+        try:
+            compiled = re.compile(regex, re.IGNORECASE)
+        except re.error as e:
+            logger.error(f"Invalid regex pattern: {regex}, error: {str(e)}")
+            return None
+
+        return {
+            "regex": compiled,
+            "type": threat_type,
+            "description": description,
+            "confidence": confidence,
+            "pattern_info": pattern_info,
+        }
+
+    def analyze(self, prompt: str) -> AnalysisResult:
         """
         Analyze the prompt for security threats
 
@@ -44,52 +135,47 @@ class PatternAnalyzer:
             prompt (str): The prompt to analyze
 
         Returns:
-            dict: Analysis results
+            AnalysisResult: Analysis results
         """
-        result = {
-            "is_dangerous": False,
-            "threats": [],
-            "confidence": 0.0,
-            "matched_patterns": [],
-        }
+        normalized = normalize_text(prompt) if self.normalize else None
+        return self._analyze(prompt, normalized)
 
-        # Check against each pattern
-        for pattern_info in self.patterns:
-            pattern = pattern_info["pattern"]
-
-            # If pattern is a dict with regex and metadata
-            if isinstance(pattern, dict):
-                regex = pattern.get("regex", "")
-                threat_type = pattern.get("type", "unknown")
-                description = pattern.get("description", "")
-                confidence = pattern.get("confidence", 0.8)
-            else:
-                # Simple string pattern
-                regex = pattern
-                threat_type = "prompt_injection"
-                description = "Potential prompt injection detected"
-                confidence = 0.8
-
-             # Check for matches
-            try:
-                matches = list(re.finditer(regex, prompt, re.IGNORECASE))
-
-                if matches:
-                    result["is_dangerous"] = True
-                    result["confidence"] = max(result["confidence"], confidence)
-                    
-                    # Add details for each match
-                    for match in matches:
-                        threat = {
-                            "type": threat_type,
-                            "description": description,
-                            "confidence": confidence,
-                            "matched_text": match.group(0),
-                            "position": (match.start(), match.end()),
-                        }
-                        result["threats"].append(threat)
-                        result["matched_patterns"].append(pattern_info)
-            except re.error as e:
-                logger.error(f"Invalid regex pattern: {regex}, error: {str(e)}")
-    
-        return result
\ No newline at end of file
+    def verdict(self, prompt: str) -> Verdict:
+        """
+        Decide whether the prompt is dangerous, stopping at the first match
+
+        The verdict has the same danger flag and confidence as analyze(),
+        full match enumeration is deferred to Verdict.analysis.
+
+        Args:
+            prompt (str): The prompt to analyze
+
+        Returns:
+            Verdict: Analysis verdict
+        """
+        normalized = normalize_text(prompt) if self.normalize else None
+        text = normalized.text if normalized else prompt
+
+        for rule in self.verdict_rules:
+            if rule["regex"].search(text):
+                return Verdict(self, prompt, normalized, rule)
+
+        return Verdict(self, prompt, normalized)
+
+    def _analyze(self, prompt: str, normalized) -> AnalysisResult:
+        """Enumerate every match of every rule"""
+        # Threats refer to rules by their index in self.rules
+        result = AnalysisResult(prompt, self.rules)
+
+        # Match against the normalized text, report positions in the original
+        text = normalized.text if normalized else prompt
+
+        for rule_id, rule in enumerate(self.rules):
+            for match in rule["regex"].finditer(text):
+                if normalized:
+                    start, end = normalized.span(match.start(), match.end())
+                else:
+                    start, end = match.start(), match.end()
+                result.add(rule_id, start, end)
+
+        return result
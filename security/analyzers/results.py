@@ -0,0 +1,234 @@
+"""
+Analysis result model
+
+Analyzers used to return nested dicts in which every threat repeated its
+rule's type, description and confidence, carried a copy of the matched
+text, and matched_patterns referenced the pattern entry once per match.
+Results are now small slotted objects: a threat is a rule id and a span,
+rule details are looked up in the analyzer's rule table, and matched text
+is sliced from the prompt only when it is read.
+
+Results still support the dict access of the old model (result["threats"],
+threat["matched_text"]), and are turned into plain dicts only when they are
+serialized, with encode_json() using the C JSON encoder.
+"""
+import json
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+class Threat:
+    """One match of one rule"""
+
+    __slots__ = ("result", "rule_id", "start", "end")
+
+    FIELDS = ("type", "description", "confidence", "matched_text", "position")
+
+    def __init__(self, result: "AnalysisResult", rule_id: int, start: int, end: int):
+        """
+        Args:
+            result (AnalysisResult): Result the threat belongs to
+            rule_id (int): Index of the rule in the result's rule table
+            start (int): Start of the match in the original prompt
+            end (int): End of the match in the original prompt
+        """
+        self.result = result
+        self.rule_id = rule_id
+        self.start = start
+        self.end = end
+
+    @property
+    def rule(self) -> Dict[str, Any]:
+        return self.result.rules[self.rule_id]
+
+    @property
+    def type(self) -> str:
+        return self.rule["type"]
+
+    @property
+    def description(self) -> str:
+        return self.rule["description"]
+
+    @property
+    def confidence(self) -> float:
+        return self.rule["confidence"]
+
+    @property
+    def position(self) -> Tuple[int, int]:
+        return (self.start, self.end)
+
+    @property
+    def matched_text(self) -> str:
+        """Matched text, sliced from the prompt on each access"""
+        return self.result.matched_text(self.start, self.end)
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.FIELDS
+
+    def keys(self) -> Tuple[str, ...]:
+        return self.FIELDS
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+
+class AnalysisResult:
+    """Threats found in a prompt"""
+
+    __slots__ = ("prompt", "rules", "threats", "confidence", "mask", "preview", "ml_score")
+
+    FIELDS = ("is_dangerous", "threats", "confidence", "matched_patterns")
+
+    def __init__(self, prompt: str, rules: Sequence[Dict[str, Any]],
+                 mask: Optional[Callable[[str], str]] = None, preview: Optional[int] = None):
+        """
+        Args:
+            prompt (str): The analyzed prompt
+            rules (list): Rule table threats refer to, usually the
+                analyzer's own, shared rather than copied
+            mask (callable, optional): Applied to matched text, e.g. to hide
+                detected secrets
+            preview (int, optional): Longest matched text reported
+        """
+        self.prompt = prompt
+        self.rules = rules
+        self.threats: List[Threat] = []
+        self.confidence = 0.0
+        self.mask = mask
+        self.preview = preview
+        self.ml_score = None
+
+    @property
+    def is_dangerous(self) -> bool:
+        return bool(self.threats)
+
+    @property
+    def matched_patterns(self) -> List[Any]:
+        """Pattern entry of the rule behind each threat, for rules that have one"""
+        return [threat.rule["pattern_info"] for threat in self.threats if "pattern_info" in threat.rule]
+
+    def add(self, rule_id: int, start: int, end: int) -> Threat:
+        """
+        Record a match
+
+        Args:
+            rule_id (int): Index of the rule in the rule table
+            start (int): Start of the match in the original prompt
+            end (int): End of the match in the original prompt
+
+        Returns:
+            Threat: The new threat
+        """
+        threat = Threat(self, rule_id, start, end)
+        self.threats.append(threat)
+        confidence = self.rules[rule_id]["confidence"]
+        if confidence > self.confidence:
+            self.confidence = confidence
+        return threat
+
+    def matched_text(self, start: int, end: int) -> str:
+        """Reported text of a span of the prompt"""
+        text = self.prompt[start:end]
+        if self.preview is not None:
+            text = text[:self.preview]
+        return self.mask(text) if self.mask else text
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "ml_score" and self.ml_score is not None:
+            return self.ml_score
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.FIELDS or (key == "ml_score" and self.ml_score is not None)
+
+    def keys(self) -> Tuple[str, ...]:
+        """Keys of the old model's dict, ml_score only once it is set"""
+        if self.ml_score is not None:
+            return self.FIELDS + ("ml_score",)
+        return self.FIELDS
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The result in the dict shape of the old model"""
+        result = {
+            "is_dangerous": self.is_dangerous,
+            "threats": [threat.to_dict() for threat in self.threats],
+            "confidence": self.confidence,
+            "matched_patterns": self.matched_patterns,
+        }
+        if self.ml_score is not None:
+            result["ml_score"] = self.ml_score
+        return result
+
+    def compact(self) -> Dict[str, Any]:
+        """
+        Smaller form for reports: rule details appear once, threats
+        refer to them by index
+
+        Returns:
+            dict: is_dangerous, confidence, rules and threats
+        """
+        used = {}
+        rules = []
+        threats = []
+        for threat in self.threats:
+            index = used.get(threat.rule_id)
+            if index is None:
+                rule = threat.rule
+                index = used[threat.rule_id] = len(rules)
+                rules.append({
+                    "type": rule["type"],
+                    "description": rule["description"],
+                    "confidence": rule["confidence"],
+                })
+            threats.append({
+                "rule": index,
+                "matched_text": threat.matched_text,
+                "position": [threat.start, threat.end],
+            })
+        return {
+            "is_dangerous": self.is_dangerous,
+            "confidence": self.confidence,
+            "rules": rules,
+            "threats": threats,
+        }
+
+
+def _to_json(obj: Any) -> Any:
+    """Encoder fallback for result objects"""
+    if isinstance(obj, (AnalysisResult, Threat)):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def encode_json(obj: Any) -> str:
+    """
+    Serialize data that may contain results
+
+    Without indentation the standard library uses its C encoder, result
+    objects are converted as they are reached.
+
+    Args:
+        obj: Data to serialize
+
+    Returns:
+        str: JSON text
+    """
+    return json.dumps(obj, default=_to_json, separators=(",", ":"))
@@ -0,0 +1,221 @@
+import re
+import math
+import logging
+import importlib
+from collections import Counter
+from typing import Any, Callable, Dict, Optional
+from security.analyzers.pattern_analyzer import Verdict
+from security.analyzers.results import AnalysisResult
+
+logger = logging.getLogger(__name__)
+
+
+def luhn_valid(candidate: str) -> bool:
+    """Whether the digits of a candidate card number pass the Luhn check"""
+    digits = [int(ch) for ch in candidate if ch.isdigit()]
+    if not 13 <= len(digits) <= 19:
+        return False
+    total = 0
+    for i, digit in enumerate(reversed(digits)):
+        if i % 2:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return total % 10 == 0
+
+
+def shannon_entropy(text: str) -> float:
+    """Shannon entropy of a string in bits per character"""
+    if not text:
+        return 0.0
+    length = len(text)
+    return -sum(
+        count / length * math.log2(count / length)
+        for count in Counter(text).values()
+    )
+
+
+def high_entropy(candidate: str) -> bool:
+    """Whether a token looks random enough to be a secret"""
+    token = candidate.rstrip("=")
+    # Identifiers and words rarely mix letters and digits
+    if not any(ch.isdigit() for ch in token) or not any(ch.isalpha() for ch in token):
+        return False
+    return shannon_entropy(token) >= 4.0
+
+
+# Validators a detector can name, a candidate match must pass them
+VALIDATORS: Dict[str, Callable[[str], bool]] = {
+    "luhn": luhn_valid,
+    "entropy": high_entropy,
+}
+
+
+def mask_secret(secret: str) -> str:
+    """Mask a detected value so reports do not leak it again"""
+    if len(secret) <= 8:
+        return "*" * len(secret)
+    return f"{secret[:4]}{'*' * (len(secret) - 4)}"
+
+
+class SecretDetector:
+    """Detect credentials and personal data in prompts"""
+
+    def __init__(self, detector_modules=None):
+        """
+        Initialize the secret detector
+
+        All detectors are combined into one alternation, so the prompt is
+        scanned in a single pass however many detectors are loaded; the
+        named group that matched tells which detector fired.
+
+        Args:
+            detector_modules (list, optional): List of detector module names to load
+        """
+        if detector_modules is None:
+            detector_modules = ["security.patterns.secret_patterns"]
+
+        self.detectors = []
+        for module_name in detector_modules:
+            try:
+                module = importlib.import_module(module_name)
+                for detector in getattr(module, "DETECTORS", []):
+                    rule = self._compile_detector(detector, module_name)
+                    if rule:
+                        self.detectors.append(rule)
+            except ImportError as e:
+                logger.error(f"Failed to load detector module {module_name}: {str(e)}")
+
+        # No detection can be more confident, verdict() stops at one
+        self.max_confidence = max((rule["confidence"] for rule in self.detectors), default=0.0)
+
+        # Group name -> detector rule
+        self.groups = {f"d{i}": rule for i, rule in enumerate(self.detectors)}
+        self.scanner = None
+        if self.detectors:
+            alternation = "|".join(
+                f"(?P<{group}>{rule['regex'].pattern})" for group, rule in self.groups.items()
+            )
+            # Detections start at a word boundary, checking that once up
+            # front skips the inside of words without trying each detector
+            self.scanner = re.compile(rf"(?<!\w)(?:{alternation})")
+
+    def _compile_detector(self, detector: Dict[str, Any], source: str):
+        """
+        Validate a loaded detector
+
+        Args:
+            detector (dict): Detector entry
+            source (str): Module the detector came from
+
+        Returns:
+            dict: Detector rule, or None if it is invalid
+        """
+        regex = detector.get("regex", "")
+        try:
+            compiled = re.compile(regex)
+        except re.error as e:
+            logger.error(f"Invalid detector regex: {regex}, error: {str(e)}")
+            return None
+        if compiled.groups:
+            logger.error(f"Detector {detector.get('name')} must only use non-capturing groups")
+            return None
+
+        validator = detector.get("validator")
+        if validator and validator not in VALIDATORS:
+            logger.error(f"Unknown validator {validator} for detector {detector.get('name')}")
+            return None
+
+        return {
+            "regex": compiled,
+            "name": detector.get("name", "unknown"),
+            "type": detector.get("type", "LLM06_sensitive_info"),
+            "description": detector.get("description", ""),
+            "confidence": detector.get("confidence", 0.8),
+            "validator": VALIDATORS[validator] if validator else None,
+            "pattern_info": {"pattern": detector, "source": source},
+        }
+
+    def _matches(self, prompt: str):
+        """Yield (detector index, rule, match) for every validated detection in text order"""
+        if self.scanner is None:
+            return
+        pos = 0
+        while True:
+            match = self.scanner.search(prompt, pos)
+            if match is None:
+                return
+            # Scanner groups are named after the detector's index
+            found = self._validated(prompt, int(match.lastgroup[1:]), match)
+            if found is None:
+                pos = match.start() + 1
+                continue
+            yield found
+            pos = max(found[2].end(), match.start() + 1)
+
+    def _validated(self, prompt: str, index: int, match):
+        """
+        The detection at a match's position that passes its validator
+
+        The alternation only reports the first detector matching at a
+        position. If that one's validator rejects the candidate, the
+        detectors after it are tried at the same position.
+
+        Returns:
+            tuple: (detector index, rule, match), or None
+        """
+        start = match.start()
+        for i in range(index, len(self.detectors)):
+            rule = self.detectors[i]
+            if i != index:
+                match = rule["regex"].match(prompt, start)
+                if match is None:
+                    continue
+            if not rule["validator"] or rule["validator"](match.group()):
+                return i, rule, match
+        return None
+
+    def analyze(self, prompt: str) -> AnalysisResult:
+        """
+        Find every secret in the prompt
+
+        Args:
+            prompt (str): The prompt to analyze
+
+        Returns:
+            AnalysisResult: Analysis results in the same shape as
+                PatternAnalyzer, with matched values masked
+        """
+        return self._analyze(prompt, None)
+
+    def verdict(self, prompt: str) -> Verdict:
+        """
+        Decide whether the prompt contains a secret
+
+        The verdict carries the most confident detection, so an email
+        address early in the prompt cannot stand in for a key after it.
+        Scanning stops at a detection no other detector can outrank.
+
+        Args:
+            prompt (str): The prompt to analyze
+
+        Returns:
+            Verdict: Analysis verdict
+        """
+        best = None
+        for _, rule, _ in self._matches(prompt):
+            if best is None or rule["confidence"] > best["confidence"]:
+                best = rule
+                if best["confidence"] >= self.max_confidence:
+                    break
+        return Verdict(self, prompt, None, best)
+
+    def _analyze(self, prompt: str, normalized: Optional[Any]) -> AnalysisResult:
+        """Enumerate every detection, normalization does not apply"""
+        result = AnalysisResult(prompt, self.detectors, mask=mask_secret)
+
+        for index, _, match in self._matches(prompt):
+            result.add(index, *match.span())
+
+        return result
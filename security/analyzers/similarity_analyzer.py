@@ -0,0 +1,402 @@
+"""
+Near-duplicate detection of known jailbreak prompts
+
+Prompts are normalized, split into word shingles and summarized by a
+MinHash signature. Signatures of a corpus of known attacks are stored in
+an LSH index file: for each band of the signature, a table of
+(band hash, entry id) pairs sorted by hash. A query binary-searches each
+band table, so lookup cost grows with the log of the corpus size, and only
+the entries sharing a band are compared signature by signature.
+
+The index file is memory-mapped read-only. Opening it costs nothing
+however large the corpus is, and every worker process mapping the same
+file shares its pages.
+
+Signatures use one-permutation hashing: each shingle is hashed once and
+lands in one of num_perm bins, keeping the minimum per bin. Empty bins
+are filled from the next non-empty bin (densification), so signature cost
+is linear in the number of shingles rather than shingles x permutations.
+"""
+import os
+import re
+import sys
+import json
+import mmap
+import struct
+import hashlib
+import logging
+import argparse
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from security.analyzers.pattern_analyzer import Verdict
+from security.analyzers.results import AnalysisResult
+from security.normalizers.text_normalizer import normalize_text
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"PSLSH\x00\x00\x01"
+
+# magic, num_perm, bands, rows, shingle_size, count, reserved,
+# signatures offset, bands offset, labels offset
+HEADER = struct.Struct("<8s6I3Q")
+BAND_ENTRY = struct.Struct("<QI")
+
+EMPTY_BIN = 0xFFFFFFFF
+
+_WORD = re.compile(r"\w+")
+
+
+class MinHasher:
+    """Compute one-permutation MinHash signatures of prompts"""
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 2):
+        """
+        Args:
+            num_perm (int): Signature length, a power of two
+            shingle_size (int): Words per shingle
+        """
+        if num_perm & (num_perm - 1):
+            raise ValueError("num_perm must be a power of two")
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.mask = num_perm - 1
+
+    def shingles(self, text: str) -> set:
+        """Word shingles of the normalized text"""
+        words = _WORD.findall(normalize_text(text).text)
+        if len(words) < self.shingle_size:
+            return {" ".join(words)} if words else set()
+        size = self.shingle_size
+        return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+    def signature(self, text: str) -> Optional[array]:
+        """
+        Signature of a text
+
+        Args:
+            text (str): Text to summarize
+
+        Returns:
+            array: num_perm unsigned 32-bit values, or None for empty text
+        """
+        shingles = self.shingles(text)
+        if not shingles:
+            return None
+
+        bins = array("I", [EMPTY_BIN]) * self.num_perm
+        mask = self.mask
+        for shingle in shingles:
+            h = int.from_bytes(
+                hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little"
+            )
+            b = h & mask
+            value = h >> 32
+            if value < bins[b]:
+                bins[b] = value
+
+        # Densify: an empty bin borrows from the next non-empty one, offset
+        # by the distance so borrowed values stay distinguishable
+        if EMPTY_BIN in bins:
+            original = bins.tolist()
+            n = self.num_perm
+            for i in range(n):
+                if original[i] != EMPTY_BIN:
+                    continue
+                for distance in range(1, n):
+                    value = original[(i + distance) % n]
+                    if value != EMPTY_BIN:
+                        bins[i] = (value + distance * 0x9E3779B1) & 0xFFFFFFFF
+                        break
+        return bins
+
+
+def _band_key(signature: array, band: int, rows: int) -> int:
+    """64-bit hash of one band of a signature"""
+    chunk = signature[band * rows:(band + 1) * rows].tobytes()
+    return int.from_bytes(hashlib.blake2b(chunk, digest_size=8).digest(), "little")
+
+
+def build_index(entries: Iterable[Tuple[str, str]], path: str, num_perm: int = 128,
+                bands: int = 64, shingle_size: int = 2) -> int:
+    """
+    Build an LSH index file from a corpus
+
+    Args:
+        entries (iterable): (label, text) pairs
+        path (str): Index file to write
+        num_perm (int): Signature length, a power of two
+        bands (int): Number of LSH bands, must divide num_perm
+        shingle_size (int): Words per shingle
+
+    Returns:
+        int: Number of indexed entries
+    """
+    if num_perm % bands:
+        raise ValueError("bands must divide num_perm")
+    rows = num_perm // bands
+    hasher = MinHasher(num_perm, shingle_size)
+
+    labels = []
+    signatures = array("I")
+    for label, text in entries:
+        signature = hasher.signature(text)
+        if signature is None:
+            continue
+        labels.append(label)
+        signatures.extend(signature)
+    count = len(labels)
+
+    band_tables = []
+    for band in range(bands):
+        table = sorted(
+            (_band_key(signatures[i * num_perm:(i + 1) * num_perm], band, rows), i)
+            for i in range(count)
+        )
+        band_tables.append(b"".join(BAND_ENTRY.pack(key, i) for key, i in table))
+
+    # Signatures are stored little-endian, band keys hash native arrays
+    if sys.byteorder != "little":
+        signatures.byteswap()
+
+    encoded = [label.encode("utf-8") for label in labels]
+    label_offsets = [0]
+    for label in encoded:
+        label_offsets.append(label_offsets[-1] + len(label))
+
+    signatures_offset = HEADER.size
+    bands_offset = signatures_offset + count * num_perm * 4
+    labels_offset = bands_offset + bands * count * BAND_ENTRY.size
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Write next to the index and swap, processes mapping the old file keep it
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(
+            MAGIC, num_perm, bands, rows, shingle_size, count, 0,
+            signatures_offset, bands_offset, labels_offset
+        ))
+        f.write(signatures.tobytes())
+        for table in band_tables:
+            f.write(table)
+        f.write(struct.pack(f"<{count + 1}I", *label_offsets))
+        f.write(b"".join(encoded))
+    os.replace(tmp_path, path)
+    return count
+
+
+def load_corpus(path: str) -> List[Tuple[str, str]]:
+    """
+    Read a corpus of known attacks
+
+    Args:
+        path (str): JSON lines file of {"label": ..., "text": ...} objects
+
+    Returns:
+        list: (label, text) pairs
+    """
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                item = json.loads(line)
+                entries.append((item.get("label", "unknown"), item["text"]))
+    return entries
+
+
+def ensure_index(corpus_path: str, index_path: str) -> bool:
+    """
+    Build the index if it is missing or older than the corpus
+
+    Returns:
+        bool: Whether an index is available
+    """
+    try:
+        if (os.path.exists(index_path)
+                and os.path.getmtime(index_path) >= os.path.getmtime(corpus_path)):
+            return True
+        count = build_index(load_corpus(corpus_path), index_path)
+        logger.info(f"Built similarity index of {count} known attacks at {index_path}")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to build similarity index: {str(e)}")
+        return os.path.exists(index_path)
+
+
+class LSHIndex:
+    """Read-only, memory-mapped LSH index"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): Index file written by build_index
+
+        Raises:
+            ValueError: If the file is not an index
+        """
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, self.num_perm, self.bands, self.rows, self.shingle_size, self.count, _,
+         self.signatures_offset, self.bands_offset, self.labels_offset) = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            self.map.close()
+            raise ValueError(f"{path} is not a similarity index")
+
+        self.signature_format = struct.Struct(f"<{self.num_perm}I")
+        self.label_blob_offset = self.labels_offset + (self.count + 1) * 4
+
+    def _band_ids(self, band: int, key: int) -> List[int]:
+        """Entry ids whose band hash equals key, by binary search"""
+        base = self.bands_offset + band * self.count * BAND_ENTRY.size
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if BAND_ENTRY.unpack_from(self.map, base + mid * BAND_ENTRY.size)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        ids = []
+        while lo < self.count:
+            entry_key, entry_id = BAND_ENTRY.unpack_from(self.map, base + lo * BAND_ENTRY.size)
+            if entry_key != key:
+                break
+            ids.append(entry_id)
+            lo += 1
+        return ids
+
+    def signature(self, entry_id: int) -> Tuple[int, ...]:
+        """Stored signature of an entry"""
+        return self.signature_format.unpack_from(
+            self.map, self.signatures_offset + entry_id * self.num_perm * 4
+        )
+
+    def label(self, entry_id: int) -> str:
+        """Label of an entry"""
+        start, end = struct.unpack_from("<2I", self.map, self.labels_offset + entry_id * 4)
+        return self.map[self.label_blob_offset + start:self.label_blob_offset + end].decode("utf-8")
+
+    def query(self, signature: array, threshold: float, max_candidates: int = 256) -> List[Tuple[float, int]]:
+        """
+        Find entries similar to a signature
+
+        Args:
+            signature (array): Query signature
+            threshold (float): Minimum estimated Jaccard similarity
+            max_candidates (int): Most candidates to compare
+
+        Returns:
+            list: (similarity, entry id) pairs, most similar first
+        """
+        candidates = set()
+        for band in range(self.bands):
+            candidates.update(self._band_ids(band, _band_key(signature, band, self.rows)))
+            if len(candidates) >= max_candidates:
+                break
+
+        results = []
+        for entry_id in candidates:
+            stored = self.signature(entry_id)
+            similarity = sum(1 for a, b in zip(signature, stored) if a == b) / self.num_perm
+            if similarity >= threshold:
+                results.append((similarity, entry_id))
+        results.sort(reverse=True)
+        return results
+
+    def close(self):
+        """Unmap the index"""
+        self.map.close()
+
+
+class SimilarityAnalyzer:
+    """Detect near-duplicates of known jailbreak prompts"""
+
+    def __init__(self, index_path: str, threshold: float = 0.25):
+        """
+        Initialize the similarity analyzer
+
+        Args:
+            index_path (str): LSH index file
+            threshold (float): Minimum estimated Jaccard similarity to a
+                known attack
+        """
+        self.index = LSHIndex(index_path)
+        self.hasher = MinHasher(self.index.num_perm, self.index.shingle_size)
+        self.threshold = threshold
+
+    def _rule(self, similarity: float, entry_id: int) -> Dict[str, Any]:
+        """Describe a match like a PatternAnalyzer rule"""
+        label = self.index.label(entry_id)
+        return {
+            "type": "LLM01_known_jailbreak",
+            "description": f"Near-duplicate of known jailbreak '{label}' ({similarity:.0%} similar)",
+            "confidence": round(min(0.95, 0.5 + similarity / 2), 2),
+            "label": label,
+            "similarity": similarity,
+        }
+
+    def analyze(self, prompt: str) -> AnalysisResult:
+        """
+        Analyze the prompt for known jailbreaks
+
+        Args:
+            prompt (str): The prompt to analyze
+
+        Returns:
+            AnalysisResult: Analysis results in the same shape as PatternAnalyzer
+        """
+        return self._analyze(prompt, None)
+
+    def verdict(self, prompt: str) -> Verdict:
+        """
+        Decide whether the prompt is a near-duplicate of a known jailbreak
+
+        Args:
+            prompt (str): The prompt to analyze
+
+        Returns:
+            Verdict: Analysis verdict
+        """
+        signature = self.hasher.signature(prompt)
+        if signature is not None:
+            matches = self.index.query(signature, self.threshold)
+            if matches:
+                return Verdict(self, prompt, None, self._rule(*matches[0]))
+        return Verdict(self, prompt, None)
+
+    def _analyze(self, prompt: str, normalized: Optional[Any]) -> AnalysisResult:
+        """Report every known jailbreak above the threshold"""
+        rules = []
+        result = AnalysisResult(prompt, rules, preview=80)
+
+        signature = self.hasher.signature(prompt)
+        if signature is None:
+            return result
+
+        for similarity, entry_id in self.index.query(signature, self.threshold):
+            rule = self._rule(similarity, entry_id)
+            rule["pattern_info"] = {"label": rule["label"], "similarity": similarity}
+            rules.append(rule)
+            # The whole prompt resembles the attack, not a span of it
+            result.add(len(rules) - 1, 0, len(prompt))
+
+        return result
+
+
+def main():
+    """Build an index from a corpus file"""
+    parser = argparse.ArgumentParser(description="Build the PromptShield jailbreak similarity index")
+    parser.add_argument("corpus", help="JSON lines corpus of known attacks")
+    parser.add_argument("index", help="Index file to write")
+    parser.add_argument("--num-perm", type=int, default=128, help="Signature length")
+    parser.add_argument("--bands", type=int, default=64, help="Number of LSH bands")
+    parser.add_argument("--shingle-size", type=int, default=2, help="Words per shingle")
+    args = parser.parse_args()
+
+    count = build_index(load_corpus(args.corpus), args.index, args.num_perm, args.bands, args.shingle_size)
+    print(f"Indexed {count} entries into {args.index}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
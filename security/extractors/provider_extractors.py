@@ -0,0 +1,271 @@
+"""
+Prompt text extraction from AI provider request bodies
+
+Each provider payload shape is described by an extractor with a list of
+JSON paths, compiled once into steps. Content found at a path may be a
+plain string or an array of content blocks; only text is yielded, binary
+blocks (images, documents, audio) are skipped without being copied.
+Extractors are looked up by host and request path through a registry so
+new providers can be added without touching the proxy.
+"""
+import re
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+PathKey = Union[str, int]
+
+# Content block types that carry prompt text in their "text" field
+TEXT_BLOCK_TYPES = frozenset({"text", "input_text", "output_text"})
+
+# Block fields that may hold nested content blocks (e.g. tool results)
+NESTED_CONTENT_FIELDS = ("content",)
+
+_WILDCARD = object()
+_PATH_TOKEN = re.compile(r"([^.\[\]]+)|\[(\*|\d+)\]")
+
+
+class TextSegment:
+    """A piece of prompt text together with where it was found"""
+
+    __slots__ = ("keys", "text")
+
+    def __init__(self, keys: Tuple[PathKey, ...], text: str):
+        """
+        Args:
+            keys (tuple): Object keys and array indices leading to the text
+            text (str): The text, not copied from the decoded body
+        """
+        self.keys = keys
+        self.text = text
+
+    @property
+    def path(self) -> str:
+        """JSON path of the segment, e.g. $.messages[2].content[0].text"""
+        parts = ["$"]
+        for key in self.keys:
+            parts.append(f"[{key}]" if isinstance(key, int) else f".{key}")
+        return "".join(parts)
+
+    def __repr__(self):
+        return f"TextSegment({self.path!r}, {len(self.text)} chars)"
+
+
+def compile_path(path: str) -> List[Any]:
+    """
+    Compile a path such as "messages[*].content" into steps
+
+    Args:
+        path (str): Dotted keys with [*] for every array element or [n]
+            for a single element
+
+    Returns:
+        list: Keys, indices and wildcard markers
+    """
+    steps = []
+    for key, index in _PATH_TOKEN.findall(path):
+        if key:
+            steps.append(key)
+        elif index == "*":
+            steps.append(_WILDCARD)
+        else:
+            steps.append(int(index))
+    return steps
+
+
+def _walk(node: Any, steps: Sequence[Any], keys: Tuple[PathKey, ...]) -> Iterator[Tuple[Tuple[PathKey, ...], Any]]:
+    """Yield (keys, value) for every value a compiled path reaches"""
+    if not steps:
+        yield keys, node
+        return
+
+    step, rest = steps[0], steps[1:]
+    if step is _WILDCARD:
+        if isinstance(node, list):
+            for i, item in enumerate(node):
+                yield from _walk(item, rest, keys + (i,))
+    elif isinstance(step, int):
+        if isinstance(node, list) and -len(node) <= step < len(node):
+            yield from _walk(node[step], rest, keys + (step % len(node),))
+    elif isinstance(node, dict) and step in node:
+        yield from _walk(node[step], rest, keys + (step,))
+
+
+def iter_content_text(content: Any, keys: Tuple[PathKey, ...]) -> Iterator[TextSegment]:
+    """
+    Yield the text of a content value
+
+    Args:
+        content: A string, or an array of strings and content blocks
+        keys (tuple): Path of the content value
+
+    Yields:
+        TextSegment: Non-empty text segments
+    """
+    if isinstance(content, str):
+        if content:
+            yield TextSegment(keys, content)
+        return
+    if not isinstance(content, list):
+        return
+
+    for i, block in enumerate(content):
+        if isinstance(block, str):
+            if block:
+                yield TextSegment(keys + (i,), block)
+        elif isinstance(block, dict):
+            block_type = block.get("type", "text")
+            text = block.get("text")
+            if block_type in TEXT_BLOCK_TYPES and isinstance(text, str):
+                if text:
+                    yield TextSegment(keys + (i, "text"), text)
+                continue
+            # Binary blocks are never looked into, only known nesting is
+            for field in NESTED_CONTENT_FIELDS:
+                if field in block:
+                    yield from iter_content_text(block[field], keys + (i, field))
+
+
+class ProviderExtractor:
+    """Extract prompt text from one provider's request payloads"""
+
+    def __init__(self, name: str, hosts: Sequence[str], paths: Sequence[str],
+                 url_prefixes: Optional[Sequence[str]] = None):
+        """
+        Args:
+            name (str): Provider payload name
+            hosts (list): Hosts the payloads are sent to, subdomains included
+            paths (list): Paths to prompt content inside the body
+            url_prefixes (list, optional): Request paths the extractor is
+                limited to, any path if not set
+        """
+        self.name = name
+        self.hosts = tuple(h.lower() for h in hosts)
+        self.url_prefixes = tuple(url_prefixes or ())
+        self.paths = [(path, compile_path(path)) for path in paths]
+
+    def matches(self, host: str, url_path: str) -> bool:
+        """Whether the extractor handles a request"""
+        if not any(host == h or host.endswith("." + h) for h in self.hosts):
+            return False
+        return not self.url_prefixes or url_path.startswith(self.url_prefixes)
+
+    def extract(self, body: Any) -> Iterator[TextSegment]:
+        """
+        Yield the text segments of a decoded request body
+
+        Args:
+            body: Decoded JSON body
+
+        Yields:
+            TextSegment: Text segments in path order
+        """
+        for _, steps in self.paths:
+            for keys, content in _walk(body, steps, ()):
+                yield from iter_content_text(content, keys)
+
+
+# Registered extractors, more specific ones first
+EXTRACTORS: List[ProviderExtractor] = []
+
+# (host, url_path) -> extractor lookups
+_LOOKUP_CACHE: Dict[Tuple[str, str], Optional[ProviderExtractor]] = {}
+
+
+def register_extractor(extractor: ProviderExtractor, first: bool = False) -> None:
+    """
+    Add an extractor to the registry
+
+    Args:
+        extractor (ProviderExtractor): Extractor to add
+        first (bool): Take precedence over the registered extractors
+    """
+    if first:
+        EXTRACTORS.insert(0, extractor)
+    else:
+        EXTRACTORS.append(extractor)
+    _LOOKUP_CACHE.clear()
+
+
+def get_extractor(host: str, url_path: str = "/") -> Optional[ProviderExtractor]:
+    """
+    Find the extractor for a request
+
+    Args:
+        host (str): Request host
+        url_path (str): Request path, the query string is ignored
+
+    Returns:
+        ProviderExtractor: The first matching extractor, or None
+    """
+    url_path = url_path.split("?", 1)[0]
+    key = (host.lower(), url_path)
+    try:
+        return _LOOKUP_CACHE[key]
+    except KeyError:
+        pass
+
+    found = None
+    for extractor in EXTRACTORS:
+        if extractor.matches(key[0], url_path):
+            found = extractor
+            break
+    # Web UIs put ids in their paths, keep the cache bounded
+    if len(_LOOKUP_CACHE) > 1024:
+        _LOOKUP_CACHE.clear()
+    _LOOKUP_CACHE[key] = found
+    return found
+
+
+def extract_segments(host: str, url_path: str, body: Any) -> List[TextSegment]:
+    """
+    Extract the prompt text segments of a request
+
+    Args:
+        host (str): Request host
+        url_path (str): Request path
+        body: Decoded JSON body
+
+    Returns:
+        list: Text segments, empty for unknown providers
+    """
+    extractor = get_extractor(host, url_path)
+    if extractor is None:
+        return []
+    return list(extractor.extract(body))
+
+
+# Anthropic Messages API, and the legacy Text Completions "prompt"
+register_extractor(ProviderExtractor(
+    "anthropic_messages",
+    hosts=["api.anthropic.com"],
+    paths=["system", "messages[*].content", "prompt"],
+))
+
+# OpenAI Responses API, "input" is a string or an array of message items
+# whose content is reached as nested content
+register_extractor(ProviderExtractor(
+    "openai_responses",
+    hosts=["api.openai.com"],
+    paths=["instructions", "input"],
+    url_prefixes=["/v1/responses"],
+))
+
+# OpenAI Chat Completions API
+register_extractor(ProviderExtractor(
+    "openai_chat",
+    hosts=["api.openai.com"],
+    paths=["messages[*].content", "prompt"],
+))
+
+# ChatGPT web UI conversation payloads
+register_extractor(ProviderExtractor(
+    "chatgpt_web",
+    hosts=["chat.openai.com", "chatgpt.com"],
+    paths=["messages[*].content.parts"],
+))
+
+# Claude web UI completion payloads, with extracted attachment text
+register_extractor(ProviderExtractor(
+    "claude_web",
+    hosts=["claude.ai"],
+    paths=["prompt", "attachments[*].extracted_content"],
+))
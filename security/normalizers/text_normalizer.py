@@ -0,0 +1,131 @@
+"""
+Text normalization applied before pattern matching
+
+Folds the prompt into a canonical form so that rules do not have to spell
+out every evasion: compatibility forms (fullwidth, ligatures), case,
+diacritics, common homoglyphs and invisible format characters are folded,
+and whitespace runs are collapsed to a single space. Each character of the
+original text is folded through a memoized per-codepoint table in a single
+pass, and an offset map back to the original text is kept so matches can
+be reported (and sanitized) against what the user actually sent.
+"""
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+# Characters that look like ASCII letters or punctuation. Only lowercase
+# forms are needed since case folding runs first.
+CONFUSABLES = {
+    # Cyrillic
+    "а": "a", "в": "b", "е": "e", "к": "k",
+    "м": "m", "н": "h", "о": "o", "р": "p", "с": "c",
+    "т": "t", "у": "y", "х": "x", "ѕ": "s", "і": "i",
+    "ј": "j", "ԁ": "d", "һ": "h", "ӏ": "l",
+    "ɡ": "g",
+    # Greek
+    "α": "a", "ε": "e", "ι": "i", "κ": "k", "ν": "v",
+    "ο": "o", "ρ": "p", "τ": "t", "υ": "u", "χ": "x",
+    # Punctuation
+    "‘": "'", "’": "'", "‚": "'", "‛": "'", "′": "'",
+    "ʼ": "'",
+    "“": '"', "”": '"', "„": '"', "″": '"',
+    "‐": "-", "‑": "-", "‒": "-", "–": "-", "—": "-",
+    "―": "-", "−": "-",
+}
+
+# ASCII text only needs lowercasing unless it has whitespace other than
+# single spaces, str.isspace() includes the \x1c-\x1f separators
+_ASCII_NEEDS_FOLDING = re.compile(r"[\t\n\r\x0b\x0c\x1c-\x1f]| {2,}")
+
+# Memoized fold result per character, filled lazily
+_FOLD_TABLE: Dict[str, str] = {}
+
+
+def _fold_char(ch: str) -> str:
+    """Fold a single character to its canonical form"""
+    if ch.isspace():
+        return " "
+
+    folded = []
+    for part in unicodedata.normalize("NFKD", ch).casefold():
+        category = unicodedata.category(part)
+        # Drop combining marks (diacritics) and invisible format characters
+        # such as zero-width spaces, joiners and bidi controls
+        if category == "Mn" or category == "Cf":
+            continue
+        if part.isspace():
+            part = " "
+        folded.append(CONFUSABLES.get(part, part))
+    return "".join(folded)
+
+
+class NormalizedText:
+    """Normalized text together with its offset map to the original"""
+
+    __slots__ = ("text", "original", "offsets")
+
+    def __init__(self, text: str, original: str, offsets: Optional[List[int]] = None):
+        """
+        Args:
+            text (str): Normalized text
+            original (str): Original text
+            offsets (list, optional): Original index of each normalized
+                character, or None if the mapping is the identity
+        """
+        self.text = text
+        self.original = original
+        self.offsets = offsets
+
+    def span(self, start: int, end: int) -> Tuple[int, int]:
+        """
+        Map a span of the normalized text back to the original text
+
+        Args:
+            start (int): Start index in the normalized text
+            end (int): End index (exclusive) in the normalized text
+
+        Returns:
+            tuple: (start, end) in the original text
+        """
+        if self.offsets is None:
+            return start, end
+        if start >= end:
+            position = self.offsets[start] if start < len(self.offsets) else len(self.original)
+            return position, position
+        return self.offsets[start], self.offsets[end - 1] + 1
+
+
+def normalize_text(text: str) -> NormalizedText:
+    """
+    Normalize text for pattern matching
+
+    Args:
+        text (str): Text to normalize
+
+    Returns:
+        NormalizedText: Normalized text with offset map
+    """
+    if text.isascii() and not _ASCII_NEEDS_FOLDING.search(text):
+        return NormalizedText(text.lower(), text)
+
+    table = _FOLD_TABLE
+    chars = []
+    offsets = []
+    previous_space = False
+
+    for index, ch in enumerate(text):
+        folded = table.get(ch)
+        if folded is None:
+            folded = table[ch] = _fold_char(ch)
+
+        for part in folded:
+            if part == " ":
+                if previous_space:
+                    continue
+                previous_space = True
+            else:
+                previous_space = False
+            chars.append(part)
+            offsets.append(index)
+
+    return NormalizedText("".join(chars), text, offsets)
@@ -1,5 +1,9 @@
 """
 Patterns for detecting prompt injection attacks
+
+Patterns are matched against normalized text (lowercase, single spaces,
+homoglyphs and invisible characters folded), see
+security.normalizers.text_normalizer.
 """
 
 # Common prompt injection patterns
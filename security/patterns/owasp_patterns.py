@@ -1,5 +1,9 @@
 """
 Patterns based on OWASP LLM Top 10 vulnerabilities
+
+Patterns are matched against normalized text (lowercase, single spaces,
+homoglyphs and invisible characters folded), see
+security.normalizers.text_normalizer.
 """
 
 # OWASP LLM Top 10 related patterns
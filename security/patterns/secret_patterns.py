@@ -0,0 +1,113 @@
+"""
+Detectors for secrets and personal data pasted into prompts (OWASP LLM06)
+
+Unlike the other pattern modules these are matched against the original
+text, case and punctuation matter for credential formats. Detectors are
+combined into a single regex, so they must only use non-capturing groups,
+and a detection can only start where a word does. A detector may name a
+validator that a candidate match has to pass, see
+security.analyzers.secret_detector.
+"""
+
+DETECTORS = [
+    {
+        "name": "private_key",
+        "regex": r"-----BEGIN (?:[A-Z]+ )*PRIVATE KEY(?: BLOCK)?-----",
+        "type": "LLM06_credential",
+        "description": "Private key",
+        "confidence": 0.95
+    },
+    {
+        "name": "aws_access_key",
+        "regex": r"\b(?:AKIA|ASIA)[0-9A-Z]{16}\b",
+        "type": "LLM06_credential",
+        "description": "AWS access key ID",
+        "confidence": 0.95
+    },
+    {
+        "name": "github_token",
+        "regex": r"\b(?:gh[pousr]_[A-Za-z0-9]{36,255}|github_pat_[A-Za-z0-9_]{82})\b",
+        "type": "LLM06_credential",
+        "description": "GitHub token",
+        "confidence": 0.95
+    },
+    {
+        "name": "anthropic_api_key",
+        "regex": r"\bsk-ant-[A-Za-z0-9_\-]{32,}",
+        "type": "LLM06_credential",
+        "description": "Anthropic API key",
+        "confidence": 0.95
+    },
+    {
+        "name": "openai_api_key",
+        "regex": r"\bsk-(?:proj-|svcacct-|admin-)?[A-Za-z0-9_\-]{32,}",
+        "type": "LLM06_credential",
+        "description": "OpenAI API key",
+        "confidence": 0.9
+    },
+    {
+        "name": "google_api_key",
+        "regex": r"\bAIza[0-9A-Za-z_\-]{35}\b",
+        "type": "LLM06_credential",
+        "description": "Google API key",
+        "confidence": 0.9
+    },
+    {
+        "name": "slack_token",
+        "regex": r"\bxox[abposr]-[A-Za-z0-9\-]{10,}",
+        "type": "LLM06_credential",
+        "description": "Slack token",
+        "confidence": 0.9
+    },
+    {
+        "name": "stripe_key",
+        "regex": r"\b[rs]k_live_[0-9A-Za-z]{24,}\b",
+        "type": "LLM06_credential",
+        "description": "Stripe live key",
+        "confidence": 0.9
+    },
+    {
+        "name": "jwt",
+        "regex": r"\beyJ[A-Za-z0-9_\-]{10,}\.eyJ[A-Za-z0-9_\-]{10,}\.[A-Za-z0-9_\-]{10,}",
+        "type": "LLM06_credential",
+        "description": "JSON Web Token",
+        "confidence": 0.85
+    },
+    {
+        "name": "password_assignment",
+        "regex": r"(?i:\b(?:password|passwd|pwd|secret)\s*[:=]\s*)[\"']?[^\s\"']{6,128}",
+        "type": "LLM06_credential",
+        "description": "Password in plain text",
+        "confidence": 0.7
+    },
+    {
+        "name": "credit_card",
+        "regex": r"(?<![\d\-])(?:\d[ \-]?){12,18}\d(?![\d\-])",
+        "type": "LLM06_pii",
+        "description": "Payment card number",
+        "confidence": 0.8,
+        "validator": "luhn"
+    },
+    {
+        "name": "us_ssn",
+        "regex": r"(?<![\d\-])(?!000|666|9\d\d)\d{3}-(?!00)\d{2}-(?!0000)\d{4}(?![\d\-])",
+        "type": "LLM06_pii",
+        "description": "US social security number",
+        "confidence": 0.7
+    },
+    {
+        "name": "email",
+        "regex": r"\b[A-Za-z0-9._%+\-]{1,64}@[A-Za-z0-9\-]{1,63}(?:\.[A-Za-z0-9\-]{1,63}){0,8}\.[A-Za-z]{2,24}\b",
+        "type": "LLM06_pii",
+        "description": "Email address",
+        "confidence": 0.5
+    },
+    {
+        "name": "high_entropy_token",
+        "regex": r"(?<![A-Za-z0-9+/_\-])[A-Za-z0-9+/_\-]{32,128}={0,2}(?![A-Za-z0-9+/_\-=])",
+        "type": "LLM06_credential",
+        "description": "High-entropy token",
+        "confidence": 0.6,
+        "validator": "entropy"
+    },
+]
@@ -13,6 +13,10 @@ setup(
         "requests>=2.31.0",
         "pyOpenSSL>=23.0.0"
     ],
+    extras_require={
+        # Injection classifier
+        "ml": ["numpy>=1.22"],
+    },
     entry_points={
         "console_scripts": [
             "promptshield=main:main",
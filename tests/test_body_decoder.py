@@ -0,0 +1,100 @@
+import gzip
+import zlib
+
+import pytest
+
+from core.body_decoder import (
+    RATIO_FLOOR, BodyDecoder, CorruptBody, DecompressionBomb, UnsupportedEncoding,
+)
+
+BODY = b'{"messages": [{"role": "user", "content": "hello"}]}' * 50
+
+
+def deflate(data, wbits):
+    compressor = zlib.compressobj(wbits=wbits)
+    return compressor.compress(data) + compressor.flush()
+
+
+@pytest.fixture
+def decoder():
+    return BodyDecoder()
+
+
+@pytest.mark.parametrize("encoding, encode", [
+    ("gzip", gzip.compress),
+    ("x-gzip", gzip.compress),
+    ("deflate", zlib.compress),
+    ("deflate", lambda data: deflate(data, -zlib.MAX_WBITS)),
+    ("identity", lambda data: data),
+    ("", lambda data: data),
+])
+def test_round_trip(decoder, encoding, encode):
+    assert decoder.decode(encode(BODY), encoding) == BODY
+
+
+def test_stacked_encodings_are_undone_in_reverse(decoder):
+    content = gzip.compress(zlib.compress(BODY))
+    assert decoder.decode(content, "deflate, gzip") == BODY
+
+
+def test_multi_member_gzip(decoder):
+    content = gzip.compress(BODY[:100]) + gzip.compress(BODY[100:]) + b"\0\0\0"
+    assert decoder.decode(content, "gzip") == BODY
+
+
+def test_ratio_bomb_is_stopped(decoder):
+    content = gzip.compress(b"\0" * (RATIO_FLOOR * 4))
+    with pytest.raises(DecompressionBomb):
+        decoder.decode(content, "gzip")
+
+
+def test_output_cap_applies_whatever_the_ratio():
+    decoder = BodyDecoder({"max_decompressed_bytes": 1000, "max_compression_ratio": 10 ** 6})
+    with pytest.raises(DecompressionBomb):
+        decoder.decode(gzip.compress(BODY), "gzip")
+
+
+def test_small_bodies_get_the_ratio_floor():
+    decoder = BodyDecoder({"max_compression_ratio": 2})
+    content = gzip.compress(b"a" * RATIO_FLOOR)
+    assert len(decoder.decode(content, "gzip")) == RATIO_FLOOR
+
+
+@pytest.mark.parametrize("encoding, content", [
+    ("gzip", gzip.compress(BODY)[:-12]),
+    ("gzip", gzip.compress(BODY)[:20]),
+    ("deflate", zlib.compress(BODY)[:-8]),
+    ("gzip", b"not gzip at all"),
+    ("deflate", b"\xff" * 20),
+])
+def test_truncated_or_corrupt_streams_raise(decoder, encoding, content):
+    with pytest.raises(CorruptBody):
+        decoder.decode(content, encoding)
+
+
+def test_unknown_encoding(decoder):
+    with pytest.raises(UnsupportedEncoding):
+        decoder.decode(BODY, "compress")
+
+
+def test_brotli():
+    brotli = pytest.importorskip("brotli")
+    decoder = BodyDecoder()
+    content = brotli.compress(BODY)
+    assert decoder.decode(content, "br") == BODY
+    with pytest.raises(CorruptBody):
+        decoder.decode(content[:len(content) // 2], "br")
+    with pytest.raises(DecompressionBomb):
+        decoder.decode(brotli.compress(b"\0" * (RATIO_FLOOR * 4)), "br")
+
+
+def test_zstd():
+    zstandard = pytest.importorskip("zstandard")
+    decoder = BodyDecoder()
+    compressor = zstandard.ZstdCompressor()
+    content = compressor.compress(BODY[:100]) + compressor.compress(BODY[100:])
+    assert decoder.decode(content, "zstd") == BODY
+    with pytest.raises(CorruptBody):
+        decoder.decode(b"\x28\xb5\x2f\xfd" + b"\xff" * 20, "zstd")
+    with pytest.raises(DecompressionBomb):
+        decoder.decode(compressor.compress(b"\0" * (RATIO_FLOOR * 4)), "zstd")
@@ -0,0 +1,60 @@
+import pytest
+
+from security.normalizers.text_normalizer import normalize_text
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Ignore ALL previous", "ignore all previous"),
+    ("ignore\tall\nprevious", "ignore all previous"),
+    ("ignore   all \r\n previous", "ignore all previous"),
+    # Information separators are whitespace to str.isspace()
+    ("ignore\x1call\x1fprevious", "ignore all previous"),
+    ("ｉｇｎｏｒｅ ａｌｌ", "ignore all"),
+    ("ign​ore⁠ all", "ignore all"),
+    ("ignóre àll", "ignore all"),
+    ("іgnоrе аll", "ignore all"),
+    ("ﬁle", "file"),
+    ("don’t", "don't"),
+    ("re—write", "re-write"),
+])
+def test_folding(text, expected):
+    assert normalize_text(text).text == expected
+
+
+@pytest.mark.parametrize("text", ["plain ascii text", "tab\there", "a\x1fb", "x  y"])
+def test_ascii_fast_path_matches_full_folding(text):
+    # A leading non-ASCII character forces the per-character path
+    slow = normalize_text("é" + text).text[1:]
+    assert normalize_text(text).text == slow
+
+
+def test_ascii_text_maps_offsets_to_itself():
+    normalized = normalize_text("Hello World")
+    assert normalized.offsets is None
+    assert normalized.span(0, 5) == (0, 5)
+
+
+def test_offsets_map_back_to_the_original():
+    original = "say  ＩＧＮＯＲＥ​ all"
+    normalized = normalize_text(original)
+    start = normalized.text.index("ignore")
+    begin, end = normalized.span(start, start + len("ignore"))
+    assert original[begin:end] == "ＩＧＮＯＲＥ"
+    # The zero-width space and the collapsed space map to nothing extra
+    start = normalized.text.index("all")
+    begin, end = normalized.span(start, start + 3)
+    assert original[begin:end] == "all"
+
+
+def test_expanding_characters_map_to_their_source():
+    original = "a ﬁle"
+    normalized = normalize_text(original)
+    assert normalized.text == "a file"
+    begin, end = normalized.span(2, 4)
+    assert original[begin:end] == "ﬁ"
+
+
+def test_empty_span():
+    normalized = normalize_text("é x")
+    assert normalized.span(1, 1) == (1, 1)
+    assert normalized.span(len(normalized.text), len(normalized.text)) == (3, 3)
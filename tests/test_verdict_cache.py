@@ -0,0 +1,119 @@
+import time
+
+import pytest
+
+from core.verdict_cache import (
+    BACKENDS, MemoryVerdictCache, SQLiteVerdictCache, VerdictCache, create_verdict_cache,
+)
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+def make_cache(request, tmp_path):
+    """Factory for every backend, the memory one standing in for networked backends"""
+    caches = []
+
+    def make(**kwargs):
+        if request.param == "sqlite":
+            cache = SQLiteVerdictCache(str(tmp_path / "verdicts.sqlite3"), **kwargs)
+        else:
+            cache = BACKENDS[request.param](**kwargs)
+        caches.append(cache)
+        return cache
+
+    yield make
+    for cache in caches:
+        cache.close()
+
+
+def test_round_trip(make_cache):
+    cache = make_cache()
+    cache.put_many({b"a": {"ml_score": 0.1}, b"b": {"ml_score": None}})
+    assert cache.get_many([b"a", b"b", b"c"]) == {b"a": {"ml_score": 0.1}, b"b": {"ml_score": None}}
+    assert cache.size() == 2
+
+
+def test_empty_calls_do_not_reach_backend(make_cache):
+    cache = make_cache()
+    cache.put_many({})
+    assert cache.get_many([]) == {}
+    assert cache.report()["hits"] == 0
+    assert cache.report()["misses"] == 0
+
+
+def test_report_counts_hits_and_misses(make_cache):
+    cache = make_cache()
+    cache.put_many({b"a": {}})
+    cache.get_many([b"a", b"b"])
+    cache.get_many([b"a"])
+    report = cache.report()
+    assert report["backend"] in BACKENDS
+    assert (report["hits"], report["misses"]) == (2, 1)
+    assert report["hit_rate"] == round(2 / 3, 4)
+    assert report["entries"] == 1
+
+
+def test_expired_entries_are_not_returned(make_cache, monkeypatch):
+    cache = make_cache(ttl=10)
+    cache.put_many({b"a": {}})
+    later = time.time() + 11
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert cache.get_many([b"a"]) == {}
+
+
+def test_size_is_capped(make_cache):
+    cache = make_cache(max_entries=3)
+    for i in range(5):
+        cache.put_many({bytes([i]): {}})
+    if isinstance(cache, SQLiteVerdictCache):
+        cache.prune()
+    assert cache.size() == 3
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryVerdictCache(max_entries=2)
+    cache.put_many({b"a": {}, b"b": {}})
+    cache.get_many([b"a"])
+    cache.put_many({b"c": {}})
+    assert set(cache.get_many([b"a", b"b", b"c"])) == {b"a", b"c"}
+
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "verdicts.sqlite3")
+    writer, reader = SQLiteVerdictCache(path), SQLiteVerdictCache(path)
+    writer.put_many({b"a": {"ml_score": 0.5}})
+    assert reader.get_many([b"a"]) == {b"a": {"ml_score": 0.5}}
+    writer.close()
+    reader.close()
+
+
+def test_sqlite_lookup_spans_query_chunks(tmp_path):
+    cache = SQLiteVerdictCache(str(tmp_path / "verdicts.sqlite3"))
+    keys = [i.to_bytes(4, "big") for i in range(SQLiteVerdictCache.QUERY_KEYS * 2 + 1)]
+    cache.put_many({key: {} for key in keys})
+    assert len(cache.get_many(keys)) == len(keys)
+    cache.close()
+
+
+def test_backend_must_implement_interface():
+    class Partial(VerdictCache):
+        name = "partial"
+
+        def _get_many(self, keys):
+            return {}
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_create_verdict_cache(tmp_path):
+    assert create_verdict_cache({"verdict_cache": "none"}) is None
+    assert create_verdict_cache({"verdict_cache": ""}) is None
+    cache = create_verdict_cache({"verdict_cache": "memory", "verdict_cache_max_entries": 7})
+    assert isinstance(cache, MemoryVerdictCache)
+    assert cache.max_entries == 7
+    cache = create_verdict_cache({
+        "verdict_cache": "sqlite",
+        "verdict_cache_path": str(tmp_path / "cache" / "verdicts.sqlite3"),
+    })
+    assert isinstance(cache, SQLiteVerdictCache)
+    cache.close()
@@ -1,4 +1,7 @@
 import os
+import re
+import base64
+import hashlib
 import subprocess
 import platform
 import logging
@@ -19,6 +22,8 @@ class CertificateManager:
         self.cert_dir = cert_dir
         self.ca_cert_path = os.path.join(cert_dir, "mitmproxy-ca.pem")
         self.ca_cert_crt_path = os.path.join(cert_dir, "mitmproxy-ca-cert.crt")
+        self.installed_marker_path = os.path.join(cert_dir, "installed-ca.sha256")
+        self.mitmproxy_dir = os.path.expanduser("~/.mitmproxy")
         
         # Create cert directory if it doesn't exist
         if not os.path.exists(cert_dir):
@@ -33,14 +38,14 @@ class CertificateManager:
         """
         try:
             # Check if mitmproxy certificates already exist
-            mitmproxy_dir = os.path.expanduser("~/.mitmproxy")
+            mitmproxy_dir = self.mitmproxy_dir
             
-            if not os.path.exists(mitmproxy_dir):
-                os.makedirs(mitmproxy_dir, exist_ok=True)
-                
-                # Run mitmproxy once to generate certificates
+            if not os.path.exists(os.path.join(mitmproxy_dir, "mitmproxy-ca.pem")):
+                # Create the CA the same way mitmproxy does on first start,
+                # without spawning a mitmdump process
                 logger.info("Generating new mitmproxy certificates...")
-                subprocess.run(["mitmdump", "--quiet", "-n"], capture_output=True, check=True)
+                from mitmproxy.certs import CertStore
+                CertStore.from_store(mitmproxy_dir, "mitmproxy", 2048)
             
             if os.path.exists(os.path.join(mitmproxy_dir, "mitmproxy-ca.pem")):
                 # Copy existing certificates
@@ -68,19 +73,65 @@ class CertificateManager:
             bool: Success or failure
         """
         try:
-            subprocess.run(
-                ["openssl", "x509", "-in", self.ca_cert_path, "-inform", "PEM", 
-                "-out", self.ca_cert_crt_path],
-                capture_output=True, check=True
-            )
+            # The CRT is the certificate block of the PEM without the private key
+            block = self._read_certificate_block(self.ca_cert_path)
+            if not block:
+                logger.error("Failed to convert certificate to CRT: no certificate found")
+                return False
+            with open(self.ca_cert_crt_path, "w") as f:
+                f.write(block + "\n")
             return True
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Failed to convert certificate to CRT: {e.stderr.decode() if e.stderr else str(e)}")
-            return False
         except Exception as e:
             logger.error(f"Failed to convert certificate to CRT: {str(e)}")
             return False
     
+    @staticmethod
+    def _read_certificate_block(path):
+        """Return the first PEM certificate block in a file, or None"""
+        with open(path, "r") as f:
+            match = re.search(
+                r"-----BEGIN CERTIFICATE-----[A-Za-z0-9+/=\s]+-----END CERTIFICATE-----",
+                f.read()
+            )
+        return match.group(0) if match else None
+    
+    def fingerprint(self, path=None):
+        """
+        Compute the SHA-256 fingerprint of a CA certificate
+        
+        Args:
+            path (str, optional): PEM file, defaults to the managed CA
+        
+        Returns:
+            str: Hex fingerprint, or None if there is no certificate
+        """
+        try:
+            block = self._read_certificate_block(path or self.ca_cert_path)
+        except OSError:
+            return None
+        if not block:
+            return None
+        body = "".join(block.splitlines()[1:-1])
+        return hashlib.sha256(base64.b64decode(body)).hexdigest()
+    
+    def is_current(self):
+        """
+        Check whether the mitmproxy CA is already copied and installed
+        
+        Returns:
+            bool: True if generation and installation can be skipped
+        """
+        source = self.fingerprint(os.path.join(self.mitmproxy_dir, "mitmproxy-ca.pem"))
+        if not source or source != self.fingerprint():
+            return False
+        if not os.path.exists(self.ca_cert_crt_path):
+            return False
+        try:
+            with open(self.installed_marker_path, "r") as f:
+                return f.read().strip() == source
+        except OSError:
+            return False
+    
     def install_certificate(self):
         """
         Install the certificate to the system trust store
@@ -116,6 +167,10 @@ class CertificateManager:
                               capture_output=True, check=True)
                 logger.info("Certificate installed to Linux trust store")
             
+            # Remember which CA was installed so the next start can skip it
+            with open(self.installed_marker_path, "w") as f:
+                f.write(self.fingerprint() or "")
+            
             return True
         except subprocess.CalledProcessError as e:
             logger.error(f"Failed to install certificate: {e.stderr.decode() if e.stderr else str(e)}")
@@ -158,6 +213,9 @@ class CertificateManager:
                                   capture_output=True, check=True)
                 logger.info("Certificate removed from Linux trust store")
             
+            if os.path.exists(self.installed_marker_path):
+                os.remove(self.installed_marker_path)
+            
             return True
         except subprocess.CalledProcessError as e:
             logger.error(f"Failed to uninstall certificate: {e.stderr.decode() if e.stderr else str(e)}")
@@ -0,0 +1,67 @@
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+PAC_CONTENT_TYPE = "application/x-ns-proxy-autoconfig"
+
+def generate_pac(ai_domains, proxy_host="127.0.0.1", proxy_port=8080):
+    """
+    Generate a proxy auto-config file that only sends AI traffic to the proxy
+
+    Args:
+        ai_domains (list): Domains to route through the proxy, including
+            their subdomains
+        proxy_host (str): Proxy server hostname
+        proxy_port (int): Proxy server port
+
+    Returns:
+        str: PAC file content
+    """
+    conditions = []
+    for domain in sorted(set(d.lower().strip(".") for d in ai_domains if d)):
+        conditions.append(f'host == "{domain}" || dnsDomainIs(host, ".{domain}")')
+
+    if not conditions:
+        conditions.append("false")
+
+    checks = " ||\n        ".join(conditions)
+    return (
+        "function FindProxyForURL(url, host) {\n"
+        "    host = host.toLowerCase();\n"
+        f"    if ({checks}) {{\n"
+        f'        return "PROXY {proxy_host}:{proxy_port}";\n'
+        "    }\n"
+        '    return "DIRECT";\n'
+        "}\n"
+    )
+
+def write_pac(path, ai_domains, proxy_host="127.0.0.1", proxy_port=8080):
+    """
+    Write the PAC file if its content changed
+
+    Args:
+        path (str): Path of the PAC file
+        ai_domains (list): Domains to route through the proxy
+        proxy_host (str): Proxy server hostname
+        proxy_port (int): Proxy server port
+
+    Returns:
+        bool: Whether the file was (re)written
+    """
+    content = generate_pac(ai_domains, proxy_host, proxy_port)
+    try:
+        with open(path, "r") as f:
+            if f.read() == content:
+                return False
+    except OSError:
+        pass
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Replace atomically so the API server never serves a partial file
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    logger.info(f"Wrote PAC file for {len(ai_domains)} AI domains to {path}")
+    return True
@@ -0,0 +1,288 @@
+import os
+import sys
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+class StartupProfiler:
+    """Record how long each startup phase takes"""
+
+    def __init__(self):
+        self.enabled = False
+        self.started = time.perf_counter()
+        self.phases = []
+        self.lock = threading.Lock()
+
+    def enable(self):
+        """Start recording phases, offsets are relative to the first import"""
+        self.enabled = True
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time a block of startup work
+
+        Phases may run concurrently on different threads, each one is
+        recorded with its own start offset and duration.
+
+        Args:
+            name (str): Phase name shown in the report
+        """
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self.lock:
+                self.phases.append((name, start - self.started, end - start))
+
+    def report(self):
+        """
+        Log the recorded phases in start order
+
+        Returns:
+            list: (name, offset_ms, duration_ms) tuples
+        """
+        with self.lock:
+            phases = sorted(self.phases, key=lambda p: p[1])
+
+        rows = [(name, offset * 1000, duration * 1000) for name, offset, duration in phases]
+        if not self.enabled:
+            return rows
+
+        total = (time.perf_counter() - self.started) * 1000
+        width = max([len(name) for name, _, _ in rows] + [5])
+        logger.info("Startup profile (offset / duration in ms):")
+        for name, offset, duration in rows:
+            logger.info(f"  {name:<{width}}  {offset:8.1f}  {duration:8.1f}")
+        logger.info(f"  {'total':<{width}}  {0:8.1f}  {total:8.1f}")
+        return rows
+
+# Shared by the entry point and the service so phases end up in one report
+startup_profiler = StartupProfiler()
+
+def _frame_label(code):
+    """Flame graph label of a code object"""
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class _CallTracer:
+    """Measure the self time of every call stack of one thread"""
+
+    def __init__(self, totals):
+        """
+        Args:
+            totals (dict): Microseconds by folded stack, added to
+        """
+        self.totals = totals
+        # Entries: [folded stack, start, time spent in callees]
+        self.stack = []
+
+    def __call__(self, frame, event, arg):
+        now = time.perf_counter()
+        if event == "call" or event == "c_call":
+            label = _frame_label(frame.f_code) if event == "call" else f"{getattr(arg, '__qualname__', arg)} (builtin)"
+            parent = self.stack[-1][0] + ";" if self.stack else ""
+            self.stack.append([parent + label, now, 0.0])
+        elif self.stack:
+            # Returns of frames entered before tracing started are not on the stack
+            path, start, children = self.stack.pop()
+            elapsed = now - start
+            self.totals[path] = self.totals.get(path, 0) + int((elapsed - children) * 1e6)
+            if self.stack:
+                self.stack[-1][2] += elapsed
+
+class TrafficProfiler:
+    """
+    On-demand CPU profiles of live traffic in flame graph folded format
+
+    Two modes: sampling the stacks of every thread of the process for some
+    seconds, or tracing every call made while analyzing one request in
+    every K. Results are written as folded stacks ("a;b;c count" lines)
+    that flamegraph.pl, speedscope and similar tools read. When no session
+    is running, the only cost is one attribute check per request.
+    """
+
+    def __init__(self, output_dir="data/profiles"):
+        """
+        Args:
+            output_dir (str): Directory profiles are written to
+        """
+        self.output_dir = output_dir
+        self.lock = threading.Lock()
+        # Request mode state, every is 0 when request profiling is off
+        self.every = 0
+        self.counter = 0
+        self.remaining = 0
+        self.request_totals = {}
+        self.request_path = None
+        # Sampling mode state
+        self.sampler = None
+        self.sample_path = None
+        self.last_profile = None
+
+    def _output_path(self, mode):
+        """File for a new profile"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        return os.path.join(self.output_dir, f"{stamp}-{mode}.folded")
+
+    def _write(self, path, totals):
+        """Write folded stacks, heaviest first"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            for stack, count in sorted(totals.items(), key=lambda item: -item[1]):
+                if count > 0:
+                    f.write(f"{stack} {count}\n")
+        os.replace(tmp_path, path)
+        self.last_profile = path
+        logger.info(f"Wrote profile {path}")
+
+    def start_sampling(self, seconds=10, interval=0.005):
+        """
+        Sample the stacks of every thread for a while
+
+        Args:
+            seconds (float): How long to sample
+            interval (float): Seconds between samples
+
+        Returns:
+            str: File the profile will be written to, or None if a sampling
+                session is already running
+        """
+        with self.lock:
+            if self.sampler is not None and self.sampler.is_alive():
+                return None
+            self.sample_path = self._output_path("sampled")
+            self.sampler = threading.Thread(
+                target=self._sample, args=(self.sample_path, seconds, interval),
+                name="promptshield-profiler", daemon=True
+            )
+            self.sampler.start()
+            return self.sample_path
+
+    def _sample(self, path, seconds, interval):
+        """Sampler thread body, counts are samples"""
+        own = threading.get_ident()
+        totals = {}
+        deadline = time.monotonic() + seconds
+        try:
+            while time.monotonic() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    labels = []
+                    while frame is not None:
+                        labels.append(_frame_label(frame.f_code))
+                        frame = frame.f_back
+                    labels.append(names.get(ident, str(ident)))
+                    stack = ";".join(reversed(labels))
+                    totals[stack] = totals.get(stack, 0) + 1
+                time.sleep(interval)
+            self._write(path, totals)
+        except Exception as e:
+            logger.error(f"Profiling failed: {str(e)}")
+
+    def start_requests(self, every=10, count=100):
+        """
+        Trace the analysis of one request in every K
+
+        Args:
+            every (int): Profile one request out of this many
+            count (int): Requests to profile before writing the result
+
+        Returns:
+            str: File the profile will be written to
+        """
+        with self.lock:
+            self.request_totals = {}
+            self.request_path = self._output_path("requests")
+            self.counter = 0
+            self.remaining = max(1, count)
+            self.every = max(1, every)
+            return self.request_path
+
+    def wrap(self, func):
+        """
+        The function to analyze a request with, traced if it is due
+
+        Args:
+            func (callable): Analysis function
+
+        Returns:
+            callable: func itself, or a traced wrapper around it
+        """
+        if not self.every:
+            return func
+        with self.lock:
+            if not self.every:
+                return func
+            self.counter += 1
+            if self.counter % self.every:
+                return func
+        return lambda *args, **kwargs: self._trace(func, args, kwargs)
+
+    def _trace(self, func, args, kwargs):
+        """Run a function with its calls traced on the current thread"""
+        totals = {}
+        tracer = _CallTracer(totals)
+        sys.setprofile(tracer)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            sys.setprofile(None)
+            self._merge(totals)
+
+    def _merge(self, totals):
+        """Add one request's stacks, write the profile once enough were traced"""
+        with self.lock:
+            if not self.every:
+                return
+            for stack, count in totals.items():
+                self.request_totals[stack] = self.request_totals.get(stack, 0) + count
+            self.remaining -= 1
+            if self.remaining > 0:
+                return
+            self.every = 0
+            path, totals = self.request_path, self.request_totals
+            self.request_totals = {}
+        try:
+            self._write(path, totals)
+        except OSError as e:
+            logger.error(f"Failed to write profile: {str(e)}")
+
+    def stop(self):
+        """Stop request profiling and write what was traced so far"""
+        with self.lock:
+            if not self.every:
+                return
+            self.every = 0
+            path, totals = self.request_path, self.request_totals
+            self.request_totals = {}
+        self._write(path, totals)
+
+    def status(self):
+        """
+        Running sessions and the latest profile
+
+        Returns:
+            dict: Profiler status
+        """
+        with self.lock:
+            sampling = self.sampler is not None and self.sampler.is_alive()
+            return {
+                "sampling": self.sample_path if sampling else None,
+                "requests": {
+                    "path": self.request_path,
+                    "every": self.every,
+                    "remaining": self.remaining,
+                } if self.every else None,
+                "last_profile": self.last_profile,
+            }
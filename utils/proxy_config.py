@@ -3,25 +3,54 @@ import platform
 import logging
 import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger(__name__)
 
 class SystemProxyConfig:
     """Configure system proxy settings"""
     
-    def __init__(self, proxy_host="127.0.0.1", proxy_port=8080):
+    def __init__(self, proxy_host="127.0.0.1", proxy_port=8080, pac_url=None):
         """
         Initialize the proxy configuration
         
         Args:
             proxy_host (str): Proxy server hostname
             proxy_port (int): Proxy server port
+            pac_url (str, optional): Proxy auto-config URL. When set, the
+                system proxy is configured in auto-config mode where
+                supported, so only AI traffic enters the proxy
         """
         self.proxy_host = proxy_host
         self.proxy_port = proxy_port
         self.proxy_url = f"{proxy_host}:{proxy_port}"
+        self.pac_url = pac_url
         self.system = platform.system()
-        self.original_settings = self._get_current_settings()
+        # Read on first use, querying the OS is slow and not every command
+        # touches the system proxy
+        self._original_settings = None
+        self._settings_lock = threading.Lock()
+    
+    @property
+    def original_settings(self):
+        """Proxy settings from before the proxy was enabled"""
+        return self.capture_settings()
+    
+    def capture_settings(self):
+        """
+        Read the current proxy settings once so they can be restored later
+        
+        Can be called early on a background thread to overlap the OS
+        queries with other startup work.
+        
+        Returns:
+            dict: Captured proxy settings
+        """
+        with self._settings_lock:
+            if self._original_settings is None:
+                self._original_settings = self._get_current_settings()
+            return self._original_settings
     
     def _get_current_settings(self):
         """
@@ -46,6 +75,10 @@ class SystemProxyConfig:
                             settings["bypass"] = winreg.QueryValueEx(key, "ProxyOverride")[0]
                         except:
                             settings["bypass"] = ""
+                        try:
+                            settings["auto_config_url"] = winreg.QueryValueEx(key, "AutoConfigURL")[0]
+                        except:
+                            settings["auto_config_url"] = ""
                 except ImportError:
                     logger.error("Failed to import winreg module")
                 except Exception as e:
@@ -61,41 +94,13 @@ class SystemProxyConfig:
                         if line and not line.startswith('*'):  # Skip empty lines and disabled services
                             networks.append(line)
                     
+                    # Each network takes several networksetup calls, query them concurrently
                     settings["networks"] = []
-                    
-                    for network in networks:
-                        try:
-                            # Check if the network is active
-                            proxy_state = subprocess.check_output(
-                                ["networksetup", "-getwebproxystate", network]).decode().strip()
-                            proxy_server = subprocess.check_output(
-                                ["networksetup", "-getwebproxy", network]).decode().strip()
-                            
-                            enabled = "Enabled: Yes" in proxy_state
-                            server = ""
-                            port = ""
-                            
-                            for line in proxy_server.split('\n'):
-                                if "Server:" in line:
-                                    server = line.split(': ')[1]
-                                if "Port:" in line:
-                                    port = line.split(': ')[1]
-                            
-                            if server and port:
-                                server_with_port = f"{server}:{port}"
-                            else:
-                                server_with_port = ""
-                            
-                            settings["networks"].append({
-                                "name": network,
-                                "enabled": enabled,
-                                "server": server_with_port
-                            })
-                        except subprocess.CalledProcessError:
-                            logger.warning(f"Could not get proxy settings for network {network}, skipping")
-                            continue
-                        except Exception as e:
-                            logger.error(f"Error getting proxy settings for network {network}: {str(e)}")
+                    if networks:
+                        with ThreadPoolExecutor(max_workers=min(len(networks), 8)) as pool:
+                            for network_settings in pool.map(self._get_network_settings, networks):
+                                if network_settings:
+                                    settings["networks"].append(network_settings)
                 except Exception as e:
                     logger.error(f"Failed to get macOS proxy settings: {str(e)}")
                     
@@ -104,26 +109,96 @@ class SystemProxyConfig:
                 settings["http_proxy"] = os.environ.get("http_proxy", "")
                 settings["https_proxy"] = os.environ.get("https_proxy", "")
                 
-                # Check GNOME settings if available
-                try:
-                    mode = subprocess.check_output(
-                        ["gsettings", "get", "org.gnome.system.proxy", "mode"]).decode().strip()
-                    settings["gnome_mode"] = mode
-                    
-                    if mode == "'manual'":
-                        host = subprocess.check_output(
-                            ["gsettings", "get", "org.gnome.system.proxy.http", "host"]).decode().strip()
-                        port = subprocess.check_output(
-                            ["gsettings", "get", "org.gnome.system.proxy.http", "port"]).decode().strip()
-                        settings["gnome_http_host"] = host
-                        settings["gnome_http_port"] = port
-                except:
-                    pass
+                # Check GNOME settings if available, each key is a separate
+                # gsettings call so read them concurrently
+                keys = {
+                    "gnome_mode": ("org.gnome.system.proxy", "mode"),
+                    "gnome_http_host": ("org.gnome.system.proxy.http", "host"),
+                    "gnome_http_port": ("org.gnome.system.proxy.http", "port"),
+                    "gnome_autoconfig_url": ("org.gnome.system.proxy", "autoconfig-url")
+                }
+                def read_key(key):
+                    # Each key on its own, one failing must not lose the others
+                    try:
+                        return subprocess.check_output(["gsettings", "get", *key]).decode().strip()
+                    except Exception:
+                        return None
+                
+                with ThreadPoolExecutor(max_workers=len(keys)) as pool:
+                    values = dict(zip(keys, pool.map(read_key, keys.values())))
+                
+                if values["gnome_mode"] is not None:
+                    settings["gnome_mode"] = values["gnome_mode"]
+                if values["gnome_mode"] == "'manual'":
+                    for name in ("gnome_http_host", "gnome_http_port"):
+                        if values[name] is not None:
+                            settings[name] = values[name]
+                if values["gnome_autoconfig_url"] is not None:
+                    settings["gnome_autoconfig_url"] = values["gnome_autoconfig_url"]
         except Exception as e:
             logger.error(f"Failed to get current proxy settings: {str(e)}")
         
         return settings
     
+    def _get_network_settings(self, network):
+        """
+        Get the proxy settings of one macOS network service
+        
+        Args:
+            network (str): Network service name
+        
+        Returns:
+            dict: Network proxy settings, or None if they could not be read
+        """
+        try:
+            # Check if the network is active
+            proxy_state = subprocess.check_output(
+                ["networksetup", "-getwebproxystate", network]).decode().strip()
+            proxy_server = subprocess.check_output(
+                ["networksetup", "-getwebproxy", network]).decode().strip()
+            
+            enabled = "Enabled: Yes" in proxy_state
+            server = ""
+            port = ""
+            
+            for line in proxy_server.split('\n'):
+                if "Server:" in line:
+                    server = line.split(': ')[1]
+                if "Port:" in line:
+                    port = line.split(': ')[1]
+            
+            if server and port:
+                server_with_port = f"{server}:{port}"
+            else:
+                server_with_port = ""
+            
+            # Auto-config (PAC) settings
+            auto_proxy = subprocess.check_output(
+                ["networksetup", "-getautoproxyurl", network]).decode().strip()
+            auto_url = ""
+            auto_enabled = False
+            for line in auto_proxy.split('\n'):
+                if line.startswith("URL:"):
+                    auto_url = line.split(': ', 1)[1]
+                    if auto_url == "(null)":
+                        auto_url = ""
+                if line.startswith("Enabled:"):
+                    auto_enabled = "Yes" in line
+            
+            return {
+                "name": network,
+                "enabled": enabled,
+                "server": server_with_port,
+                "auto_url": auto_url,
+                "auto_enabled": auto_enabled
+            }
+        except subprocess.CalledProcessError:
+            logger.warning(f"Could not get proxy settings for network {network}, skipping")
+            return None
+        except Exception as e:
+            logger.error(f"Error getting proxy settings for network {network}: {str(e)}")
+            return None
+    
     def enable_proxy(self):
         """
         Enable the proxy for system traffic
@@ -131,6 +206,9 @@ class SystemProxyConfig:
         Returns:
             bool: Success or failure
         """
+        # Remember what to restore before changing anything
+        self.capture_settings()
+        
         try:
             # Define bypass domains - only intercept AI domains, bypass everything else
             # This is a CRITICAL fix to maintain normal internet access
@@ -170,12 +248,17 @@ class SystemProxyConfig:
                     with winreg.OpenKey(winreg.HKEY_CURRENT_USER, 
                                        r"Software\Microsoft\Windows\CurrentVersion\Internet Settings", 
                                        0, winreg.KEY_WRITE) as key:
-                        winreg.SetValueEx(key, "ProxyEnable", 0, winreg.REG_DWORD, 1)
-                        winreg.SetValueEx(key, "ProxyServer", 0, winreg.REG_SZ, self.proxy_url)
-                        
-                        # Use the correct bypass list
-                        bypass = ";".join(bypass_list)
-                        winreg.SetValueEx(key, "ProxyOverride", 0, winreg.REG_SZ, bypass)
+                        if self.pac_url:
+                            # Auto-config mode, the PAC file selects AI traffic
+                            winreg.SetValueEx(key, "AutoConfigURL", 0, winreg.REG_SZ, self.pac_url)
+                            winreg.SetValueEx(key, "ProxyEnable", 0, winreg.REG_DWORD, 0)
+                        else:
+                            winreg.SetValueEx(key, "ProxyEnable", 0, winreg.REG_DWORD, 1)
+                            winreg.SetValueEx(key, "ProxyServer", 0, winreg.REG_SZ, self.proxy_url)
+                            
+                            # Use the correct bypass list
+                            bypass = ";".join(bypass_list)
+                            winreg.SetValueEx(key, "ProxyOverride", 0, winreg.REG_SZ, bypass)
                     
                     # Notify system of the change
                     try:
@@ -212,6 +295,17 @@ class SystemProxyConfig:
                             networks.append(line)
                     
                     for network in networks:
+                        if self.pac_url:
+                            # Auto-config mode, the PAC file selects AI traffic
+                            try:
+                                subprocess.run(["networksetup", "-setautoproxyurl", network, self.pac_url])
+                                subprocess.run(["networksetup", "-setautoproxystate", network, "on"])
+                                logger.info(f"Configured proxy auto-config for network {network}")
+                            except Exception as e:
+                                logger.error(f"Failed to set proxy auto-config for network {network}: {str(e)}")
+                                success = False
+                            continue
+                        
                         try:
                             # Get the current bypass domains
                             bypass_domains = subprocess.check_output(
@@ -255,6 +349,19 @@ class SystemProxyConfig:
                     return False
                 
             elif self.system == "Linux":
+                if self.pac_url:
+                    # Auto-config mode, the PAC file selects AI traffic. No
+                    # environment variables, clients honouring them would
+                    # send all their traffic through the proxy
+                    try:
+                        subprocess.run(["gsettings", "set", "org.gnome.system.proxy", "autoconfig-url", self.pac_url], check=True)
+                        subprocess.run(["gsettings", "set", "org.gnome.system.proxy", "mode", "auto"], check=True)
+                        logger.info("Enabled proxy auto-config on Linux (GNOME)")
+                        return True
+                    except Exception as e:
+                        logger.error(f"Failed to set GNOME proxy auto-config: {str(e)}")
+                        return False
+                
                 # Linux - set environment variables
                 try:
                     # Set environment variables for the current process
@@ -305,6 +412,11 @@ class SystemProxyConfig:
         Returns:
             bool: Success or failure
         """
+        if self._original_settings is None:
+            # enable_proxy captures the settings first, so nothing was changed
+            logger.info("System proxy settings were not changed, nothing to restore")
+            return True
+        
         try:
             if self.system == "Windows":
                 try:
@@ -320,6 +432,14 @@ class SystemProxyConfig:
                         if self.original_settings["bypass"]:
                             winreg.SetValueEx(key, "ProxyOverride", 0, winreg.REG_SZ, 
                                              self.original_settings["bypass"])
+                        if self.original_settings.get("auto_config_url"):
+                            winreg.SetValueEx(key, "AutoConfigURL", 0, winreg.REG_SZ, 
+                                             self.original_settings["auto_config_url"])
+                        elif self.pac_url:
+                            try:
+                                winreg.DeleteValue(key, "AutoConfigURL")
+                            except OSError:
+                                pass
                     
                     # Notify system of the change
                     try:
@@ -365,6 +485,13 @@ class SystemProxyConfig:
                                                   network, "off"])
                                     subprocess.run(["networksetup", "-setsecurewebproxystate", 
                                                   network, "off"])
+                                
+                                # Auto-config (PAC) settings
+                                if network_config.get("auto_url"):
+                                    subprocess.run(["networksetup", "-setautoproxyurl", 
+                                                  network, network_config["auto_url"]])
+                                subprocess.run(["networksetup", "-setautoproxystate", network,
+                                              "on" if network_config.get("auto_enabled") else "off"])
                             except Exception as e:
                                 logger.error(f"Failed to restore proxy for network {network}: {str(e)}")
                                 success = False
@@ -417,6 +544,10 @@ class SystemProxyConfig:
                             mode = self.original_settings["gnome_mode"]
                             subprocess.run(["gsettings", "set", "org.gnome.system.proxy", "mode", mode])
                             
+                            if "gnome_autoconfig_url" in self.original_settings:
+                                subprocess.run(["gsettings", "set", "org.gnome.system.proxy", "autoconfig-url",
+                                              self.original_settings["gnome_autoconfig_url"].strip("'")])
+                            
                             if mode == "'manual'" and "gnome_http_host" in self.original_settings:
                                 host = self.original_settings["gnome_http_host"]
                                 port = self.original_settings["gnome_http_port"]
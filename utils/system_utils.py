@@ -0,0 +1,104 @@
+import os
+import socket
+import time
+import logging
+import urllib.request
+import urllib.error
+
+logger = logging.getLogger(__name__)
+
+# Probes talk to local servers directly, never through a configured proxy
+_OPENER = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+def wait_for_port(host, port, timeout=10.0, process=None, interval=0.02):
+    """
+    Wait until a TCP port accepts connections
+
+    Args:
+        host (str): Host to connect to
+        port (int): Port to connect to
+        timeout (float): Seconds to wait before giving up
+        process (subprocess.Popen, optional): Process expected to open the
+            port, waiting stops early if it exits
+        interval (float): Seconds between attempts
+
+    Returns:
+        bool: Whether the port became ready
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            return False
+        try:
+            with socket.create_connection((host, port), timeout=interval * 5):
+                return True
+        except OSError:
+            time.sleep(interval)
+    return False
+
+def probe_http(url, timeout=1.0):
+    """
+    Send a single HTTP GET request
+
+    Args:
+        url (str): URL to request
+        timeout (float): Seconds to wait for a response
+
+    Returns:
+        int: HTTP status of the response, or None if there was no response
+    """
+    try:
+        with _OPENER.open(url, timeout=timeout) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (OSError, urllib.error.URLError):
+        return None
+
+def get_rss_bytes():
+    """
+    Resident memory of the current process
+
+    Returns:
+        int: Resident set size in bytes, or None if it cannot be determined
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+
+    # Linux fallback without psutil
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def get_cpu_seconds(pid=None):
+    """
+    CPU time used by a process
+
+    Args:
+        pid (int, optional): Process id, defaults to the current process
+
+    Returns:
+        float: User plus system CPU seconds, or None if it cannot be determined
+    """
+    try:
+        import psutil
+        times = psutil.Process(pid).cpu_times()
+        return times.user + times.system
+    except ImportError:
+        pass
+    except Exception:
+        return None
+
+    # Linux fallback without psutil
+    try:
+        with open(f"/proc/{pid or 'self'}/stat", "r") as f:
+            # The command name may contain spaces, fields resume after it
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None